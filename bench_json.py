@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк JSON-кодека: stdlib json против orjson на страницах Notion.
+
+Источник данных:
+    python bench_json.py mirror/<database_id>.jsonl   # записанное зеркало (JSONL)
+    python bench_json.py dump.json                    # ответ /query ({"results": [...]}) или список страниц
+    python bench_json.py                              # синтетические 1000 страниц «как в Notion»
+
+Печатает время dumps/loads для обоих кодеков и размер structure_cache.json
+в старом формате (indent=2) и в минифицированном.
+"""
+
+import sys
+import json
+import time
+import uuid
+import random
+from typing import Callable, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+REPEAT = 5
+SYNTHETIC_PAGES = 1000
+
+
+def _rich(text: str) -> list:
+    return [{"type": "text", "text": {"content": text, "link": None},
+             "annotations": {"bold": False, "italic": False, "strikethrough": False,
+                             "underline": False, "code": False, "color": "default"},
+             "plain_text": text, "href": None}]
+
+
+def synthetic_pages(n: int = SYNTHETIC_PAGES) -> List[dict]:
+    rnd = random.Random(42)
+    statuses = ["Не начато", "В работе", "Готово", "На паузе"]
+    pages = []
+    for i in range(1, n + 1):
+        pages.append({
+            "object": "page",
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "created_time": f"2025-09-{rnd.randint(1, 28):02d}T10:00:00.000Z",
+            "last_edited_time": f"2025-10-{rnd.randint(1, 28):02d}T12:{rnd.randint(0, 59):02d}:00.000Z",
+            "archived": False,
+            "properties": {
+                "ID (текст)": {"id": "title", "type": "title", "title": _rich(f"INTEL-{i:03d}")},
+                "Название задачи": {"id": "a%3Bb", "type": "rich_text",
+                                    "rich_text": _rich(f"Монтаж конструкций секции {i} — этаж {i % 17}")},
+                "Статус": {"id": "c%40d", "type": "status",
+                           "status": {"id": "x", "name": rnd.choice(statuses), "color": "blue"}},
+                "Срок ( Deadline)": {"id": "e%3Ef", "type": "date",
+                                     "date": {"start": f"2025-11-{rnd.randint(1, 30):02d}", "end": None, "time_zone": None}},
+                "Источник (Source)": {"id": "g%3Fh", "type": "rich_text", "rich_text": _rich("ГПР")},
+            },
+            "url": f"https://www.notion.so/page-{i}",
+        })
+    return pages
+
+
+def load_pages(path: str) -> List[dict]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".jsonl"):
+        return [json.loads(line) for line in raw.splitlines() if line.strip()]
+    data = json.loads(raw)
+    return data.get("results", []) if isinstance(data, dict) else data
+
+
+def _best(fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_codecs(pages: List[dict]) -> None:
+    std_dump = lambda: [json.dumps(p, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for p in pages]
+    blobs = std_dump()
+    std_load = lambda: [json.loads(b) for b in blobs]
+    size = sum(len(b) for b in blobs)
+
+    print(f"Страниц: {len(pages)}, объём JSON: {size / 1024:.0f} КБ (лучшее из {REPEAT})")
+    print(f"{'кодек':<8} {'dumps, мс':>10} {'loads, мс':>10}")
+    t_sd, t_sl = _best(std_dump), _best(std_load)
+    print(f"{'json':<8} {t_sd * 1000:>10.1f} {t_sl * 1000:>10.1f}")
+    if orjson is None:
+        print("orjson не установлен (pip install orjson) — сравнивать не с чем")
+        return
+    t_od = _best(lambda: [orjson.dumps(p) for p in pages])
+    t_ol = _best(lambda: [orjson.loads(b) for b in blobs])
+    print(f"{'orjson':<8} {t_od * 1000:>10.1f} {t_ol * 1000:>10.1f}")
+    print(f"Ускорение: dumps ×{t_sd / max(t_od, 1e-9):.1f}, loads ×{t_sl / max(t_ol, 1e-9):.1f}")
+
+
+def bench_structure_cache(pages: List[dict]) -> None:
+    """Кэш структуры — список путей a/b/c; берём названия задач как «пути» для оценки объёма."""
+    paths = []
+    for p in pages:
+        for prop in (p.get("properties") or {}).values():
+            if prop.get("type") == "rich_text" and prop.get("rich_text"):
+                paths.append("Project/" + prop["rich_text"][0].get("plain_text", ""))
+                break
+    data = {"root": "Project", "paths": paths}
+    old = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    new = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    print(f"structure_cache.json ({len(paths)} путей): indent=2 — {len(old)} Б, "
+          f"минифицированный — {len(new)} Б ({len(new) / max(len(old), 1):.0%})")
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = load_pages(sys.argv[1])
+        print(f"Данные: {sys.argv[1]}")
+    else:
+        pages = synthetic_pages()
+        print("Данные: синтетические страницы")
+    bench_codecs(pages)
+    bench_structure_cache(pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки горячих путей ботов и CLI на локальном стенде (notion_fake_server.py).
+
+Сценарии:
+  bulk_add          — notion_bulk_add: 1000 строк (проверка дублей + создание страниц)
+  update_from_file  — notion_update_from_file --pipeline: 1000 обновлений
+  structure_sync    — structure_sync.sync_structure на дереве из 5000 узлов
+  navigation        — cloud_photo_bot: _build_index + _kb_for_parent по всем уровням дерева
+  photo_upload      — cloud_photo_bot.ph3_comment: Cloudinary upload + запись в Notion, от начала до конца
+  report            — bot.cmd_report по индексу из зеркала (task_report): окна и фильтры, ответ из кэша
+  report_live       — bot.notion_query_recent: запасной путь /report без зеркала — запрос к Notion
+
+Стенд поднимается в этом же процессе, данные — во временной папке.
+Результаты дописываются в bench_results.jsonl с версией кода (git describe) —
+при следующем запуске печатается разница с последним замером другой версии.
+
+Запуск:
+    python benchmarks.py                       # все сценарии
+    python benchmarks.py report navigation     # выборочно
+    python benchmarks.py --latency 0.05 --repeat 3
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+from statistics import median
+from typing import Callable, Dict, List
+
+RESULTS_FILE = "bench_results.jsonl"
+DB_TASKS = "11111111111111111111111111111111"
+DB_JOURNAL = "22222222222222222222222222222222"
+
+SIZES = {
+    "bulk_add": 1000,
+    "update_from_file": 1000,
+    "structure_sync": 5000,
+    "navigation": 5000,
+    "photo_upload": 50,
+    "report": 50,
+    "report_live": 50,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_version() -> str:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def _prepare_env(base: str, workdir: str) -> None:
+    """Окружение до импорта модулей: они читают .env и настройки на уровне модуля."""
+    os.environ.update({
+        "NOTION_API_BASE": base + "/v1",
+        "NOTION_RPS": os.environ.get("NOTION_RPS", "0"),
+        "NOTION_TOKEN": "bench", "NOTION_TOKEN_SCHOOL65": "bench",
+        "NOTION_DATABASE_ID": DB_TASKS, "NOTION_TASKS_DB": DB_TASKS,
+        "NOTION_DATABASE_ID_SCHOOL65": DB_JOURNAL,
+        "NOTION_MIRROR_DIR": os.path.join(workdir, "mirror"),
+        "OUTBOX_DIR": os.path.join(workdir, "outbox"),
+        # photo_upload шлёт один и тот же кадр — без этого замер ушёл бы в поиск дублей, а не в загрузку
+        "PHOTO_DEDUP": "0", "PHOTO_INDEX": os.path.join(workdir, "photo_index.sqlite"),
+        "CLOUD_NAME": "bench", "CLOUD_API_KEY": "bench", "CLOUD_API_SECRET": "bench",
+        "CLOUD_API_BASE": base,
+        "STRUCTURE_FILE": os.path.join(workdir, "structure.txt"),
+        "TELEGRAM_BOT_TOKEN": "0:bench",
+    })
+
+
+def _write_structure(path: str, nodes: int) -> None:
+    """Дерево из nodes узлов: 10 корпусов × 10 разделов × остальное — листья."""
+    per_leaf = max(nodes // 100 - 1, 1)
+    lines = []
+    for a in range(10):
+        lines.append(f"Корпус {a + 1}/")
+        for b in range(10):
+            lines.append(f"  Раздел {a + 1}.{b + 1}/")
+            for c in range(per_leaf):
+                lines.append(f"    Узел {a + 1}.{b + 1}.{c + 1}/")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines[:nodes]) + "\n")
+
+
+def _create_databases(app) -> None:
+    """Схемы баз как на живом проекте: колонки заранее, чтобы filter_properties резолвились сразу."""
+    from notion_models import P, J
+    app.store.database(DB_TASKS, create=True)
+    app.update_database(DB_TASKS, {"properties": {
+        P["TITLE_ID"]: {"title": {}},
+        P["NAME"]: {"rich_text": {}},
+        P["STATUS"]: {"status": {"options": [{"name": "Not started"}, {"name": "In progress"}, {"name": "Done"}]}},
+        P["DEADLINE"]: {"date": {}},
+        P["SOURCE"]: {"select": {"options": []}},
+        P["OBJECT"]: {"select": {"options": []}},
+        "Приоритет": {"select": {"options": []}},
+        "Сложность (Size)": {"select": {"options": []}},
+        "Вложения": {"files": {}},
+    }})
+    app.store.database(DB_JOURNAL, create=True)
+    app.update_database(DB_JOURNAL, {"properties": {
+        "Name": {"title": {}},
+        J["SECTION"]: {"select": {"options": []}},
+        J["FILE"]: {"rich_text": {}},
+        J["URL"]: {"url": {}},
+        J["DATE"]: {"date": {}},
+        J["COMMENT"]: {"rich_text": {}},
+    }})
+
+
+# ---- заглушки Telegram для вызова хендлеров ----
+
+class _Message:
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.replies: List[str] = []
+
+    async def reply_text(self, text: str, **kwargs):
+        self.replies.append(text)
+
+
+class _Update:
+    def __init__(self, text: str = ""):
+        self.message = _Message(text)
+
+
+class _Context:
+    def __init__(self, **user_data):
+        self.user_data = dict(user_data)
+        self.args: List[str] = []
+
+
+# ---- сценарии: каждый возвращает функцию прогона (аргумент — номер повтора) ----
+
+def setup_bulk_add(n: int, workdir: str) -> Callable[[int], int]:
+    import notion_bulk_add
+
+    def run(rep: int) -> int:
+        objects = [None, "Спортзал", "Корпус А", "Корпус Б"]
+        items = [(f"Задача {rep}-{i} монтаж узла {i % 37}", objects[i % 4]) for i in range(n)]
+        ok, err = notion_bulk_add.add_items(items)
+        assert err == 0, f"ошибок создания: {err}"
+        return ok
+
+    return run
+
+
+def setup_update_from_file(n: int, workdir: str) -> Callable[[int], int]:
+    import notion_http
+    import notion_bulk_add
+    import notion_update_from_file as upd
+
+    have = sum(1 for _ in notion_http.iter_query(DB_TASKS, notion_bulk_add.HEAD, {}))
+    if have < n:
+        notion_bulk_add.add_items([(f"Исходная задача {i}", None) for i in range(n - have)])
+
+    path = os.path.join(workdir, "updates.txt")
+    statuses = ["In progress", "Done", "в работе"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, n + 1):
+            f.write(f"INTEL-{i:03d};STATUS={statuses[i % 3]};DEADLINE=2025-12-{i % 28 + 1:02d}\n")
+
+    def run(rep: int) -> int:
+        upd.main_pipeline(path, workers=upd.DEFAULT_WORKERS)
+        return n
+
+    return run
+
+
+def setup_structure_sync(n: int, workdir: str) -> Callable[[int], int]:
+    _write_structure(os.environ["STRUCTURE_FILE"], n)
+    import structure_sync
+
+    def run(rep: int) -> int:
+        return len(structure_sync.sync_structure()["paths"])
+
+    return run
+
+
+def _photo_bot():
+    # импорт cloud_photo_bot сам синхронизирует структуру — дерево должно уже лежать на месте
+    if not os.path.exists(os.environ["STRUCTURE_FILE"]):
+        _write_structure(os.environ["STRUCTURE_FILE"], SIZES["navigation"])
+    import cloud_photo_bot
+    return cloud_photo_bot
+
+
+def setup_navigation(n: int, workdir: str) -> Callable[[int], int]:
+    _write_structure(os.environ["STRUCTURE_FILE"], n)
+    import structure_sync
+    structure_sync.sync_structure()
+    bot = _photo_bot()
+
+    def run(rep: int) -> int:
+        _, index = bot.structure_load_index()
+        shown = 0
+        for parent in list(index):
+            bot._kb_for_parent(parent)
+            shown += 1
+        return shown
+
+    return run
+
+
+def setup_photo_upload(n: int, workdir: str) -> Callable[[int], int]:
+    import notion_outbox
+    bot = _photo_bot()
+    _, index = bot.structure_load_index()
+    sections = [p for p in index if p][:20] or ["Корпус 1"]
+    import photo_prep
+    if photo_prep.Image is not None:
+        # настоящий JPEG, чтобы в замер попала подготовка фото (уменьшение/пережатие)
+        photo = photo_prep.synthetic_photo(1, (2560, 1920))
+    else:
+        rnd = random.Random(1)
+        photo = b"\xff\xd8\xff\xe0" + bytes(rnd.getrandbits(8) for _ in range(200_000))
+
+    async def one(i: int) -> bool:
+        upd = _Update(text=f"комментарий {i}")
+        ctx = _Context(section_path=sections[i % len(sections)], photo_bytes=photo)
+        await bot.ph3_comment(upd, ctx)
+        return any(r.startswith("✓") for r in upd.message.replies)
+
+    def run(rep: int) -> int:
+        async def all_():
+            return [await one(i) for i in range(n)]
+        done = asyncio.run(all_())
+        assert all(done), "не все фото дошли до Notion"
+        # записи в Notion идут через очередь — ждём её, чтобы замер оставался «от начала до конца»
+        outbox = notion_outbox.get("pf-bot", bot.NOTION_HEADERS)
+        if outbox is not None:
+            assert outbox.flush(120), "очередь записей в Notion не разобрана"
+        return n
+
+    return run
+
+
+def _report_tasks(count: int = 100) -> None:
+    import notion_http
+    import notion_bulk_add
+    have = sum(1 for _ in notion_http.iter_query(DB_TASKS, notion_bulk_add.HEAD, {}, limit=count))
+    if have < count:
+        notion_bulk_add.add_items([(f"Задача для отчёта {i}", None) for i in range(count - have)])
+
+
+def setup_report(n: int, workdir: str) -> Callable[[int], int]:
+    _report_tasks()
+    import bot
+    # как в боте: зеркало синхронизировано, индекс загружен — замеряется только путь /report
+    bot.MIRROR.sync()
+    assert bot.REPORTS.ensure_loaded(bot.MIRROR), "зеркало базы задач не создано"
+    queries = [[], ["week"], ["overdue"], ["status=Not", "started"]]
+
+    def run(rep: int) -> int:
+        async def all_():
+            for i in range(n):
+                upd, ctx = _Update(), _Context()
+                ctx.args = queries[i % len(queries)]
+                await bot.cmd_report(upd, ctx)
+                assert upd.message.replies and "Всего задач" in upd.message.replies[0]
+        asyncio.run(all_())
+        return n
+
+    return run
+
+
+def setup_report_live(n: int, workdir: str) -> Callable[[int], int]:
+    _report_tasks()
+    import bot
+
+    def run(rep: int) -> int:
+        async def all_():
+            for _ in range(n):
+                pages = await bot.notion_query_recent(limit=10)
+                assert pages, "Notion не вернул задач"
+        asyncio.run(all_())
+        return n
+
+    return run
+
+
+SCENARIOS: Dict[str, Callable[[int, str], Callable[[int], int]]] = {
+    "bulk_add": setup_bulk_add,
+    "update_from_file": setup_update_from_file,
+    "structure_sync": setup_structure_sync,
+    "navigation": setup_navigation,
+    "photo_upload": setup_photo_upload,
+    "report": setup_report,
+    "report_live": setup_report_live,
+}
+
+
+# ---- прогон и хранение результатов ----
+
+def _previous(results_path: str, version: str) -> Dict[str, dict]:
+    """Последний замер каждого сценария, сделанный другой версией кода."""
+    prev: Dict[str, dict] = {}
+    if not os.path.exists(results_path):
+        return prev
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                if rec.get("version") != version:
+                    prev[rec["scenario"]] = rec
+    return prev
+
+
+def run_scenario(name: str, workdir: str, repeat: int, server) -> dict:
+    n = SIZES[name]
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = SCENARIOS[name](n, workdir)
+    times = []
+    requests_before = server.app.counters["requests"]
+    for rep in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            items = run(rep)
+            times.append(time.perf_counter() - t0)
+    calls = (server.app.counters["requests"] - requests_before) / repeat
+    best = min(times)
+    return {
+        "scenario": name,
+        "n": items,
+        "best_s": round(best, 4),
+        "median_s": round(median(times), 4),
+        "items_per_s": round(items / best, 1) if best else None,
+        "api_calls": round(calls),
+        "repeat": repeat,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Бенчмарки ботов и CLI на локальном стенде")
+    ap.add_argument("scenarios", nargs="*", help=f"Сценарии (по умолчанию все): {', '.join(SCENARIOS)}")
+    ap.add_argument("--repeat", type=int, default=1, help="Повторов каждого сценария")
+    ap.add_argument("--latency", type=float, default=0.0, help="Задержка ответа стенда, с")
+    ap.add_argument("--out", default=RESULTS_FILE, help=f"Файл результатов (по умолчанию {RESULTS_FILE})")
+    ap.add_argument("--no-save", action="store_true", help="Не дописывать результаты в файл")
+    args = ap.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        ap.error(f"неизвестные сценарии: {', '.join(unknown)}")
+
+    out_path = os.path.abspath(args.out)
+    version = _git_version()
+    workdir = tempfile.mkdtemp(prefix="pf-bench-")
+    port = _free_port()
+    _prepare_env(f"http://127.0.0.1:{port}", workdir)
+
+    # модули проекта импортируем только после настройки окружения
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)  # structure_cache.json и прочие файлы — во временной папке
+    import notion_fake_server as fake
+    store = fake.FakeStore(os.path.join(workdir, "store.sqlite"))
+    server, base = fake.start_in_thread(store, port=port, latency=args.latency)
+    _create_databases(server.app)
+
+    prev = _previous(out_path, version)
+    stamp = datetime.now().isoformat(timespec="seconds")
+    print(f"Версия: {version}; стенд: {base} (задержка {args.latency} с); данные: {workdir}")
+    print(f"{'сценарий':<18} {'n':>6} {'лучшее, с':>10} {'медиана, с':>11} {'шт/с':>9} {'вызовов':>8}  к прошлой версии")
+    for name in names:
+        rec = run_scenario(name, workdir, args.repeat, server)
+        rec.update(version=version, date=stamp, latency=args.latency)
+        old = prev.get(name)
+        delta = ""
+        if old and old.get("latency") == args.latency and old.get("best_s"):
+            delta = f"{(rec['best_s'] - old['best_s']) / old['best_s']:+.0%} ({old['version']})"
+        print(f"{name:<18} {rec['n']:>6} {rec['best_s']:>10.3f} {rec['median_s']:>11.3f} "
+              f"{rec['items_per_s'] or 0:>9.1f} {rec['api_calls']:>8}  {delta}")
+        if not args.no_save:
+            with open(out_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    server.shutdown()
+    if not args.no_save:
+        print(f"Результаты дописаны в {out_path}")
+
+
+if __name__ == "__main__":
+    main()
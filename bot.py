@@ -18,8 +18,7 @@ INTELLECTUM Bot — единый файл bot.py (обновлённый)
 # ===== 1. Импорты и базовая настройка логов =====
 import os
 import re
-import json
-import time
+import asyncio
 import logging
 from datetime import datetime, timedelta, date
 from typing import Dict, Any, Optional, List, Tuple
@@ -28,6 +27,18 @@ from urllib.parse import urlparse
 import requests
 from dotenv import load_dotenv
 
+import metrics
+import offline
+import deadline_reminders
+import projects
+import site_digest
+import task_report
+import tracing
+import notion_http
+import notion_outbox
+from notion_mirror import Mirror
+from notion_models import decode_task
+
 from telegram import (
     Update,
     ReplyKeyboardMarkup,
@@ -63,9 +74,11 @@ NOTION_HEADERS = {
 }
 
 # Сетевые параметры
-HTTP_TIMEOUT = 20
 RETRY_MAX = 4
 
+# Локальное зеркало базы задач: из него отвечаем, когда нет связи с Notion (offline.py)
+MIRROR = Mirror(DATABASE_ID, NOTION_HEADERS)
+
 
 # ===== 3. Имена колонок Notion (P[...] -> названия свойств) =====
 # Эти названия должны совпадать с вашими свойствами в базе Notion
@@ -80,6 +93,53 @@ P: Dict[str, str] = {
     "XAI_LOG":  os.getenv("PROP_XAI_LOG",  "XAI Log"),           # тип Rich text (опц.)
 }
 
+# /report: задачи зеркала в памяти со счётчиками, обновляются дельтами зеркала (task_report.py)
+REPORTS = task_report.TaskIndex(P)
+
+
+# ===== 3.1. Объекты (projects.py): своя база задач у каждого объекта, выбор — по чату =====
+class Site:
+    """База задач объекта и всё, что к ней привязано: зеркало, индекс /report, очередь, счётчик ID."""
+
+    def __init__(self, key: str, database_id: str, headers: Dict[str, str], outbox_name: str,
+                 mirror: Optional[Mirror] = None, reports: Optional[task_report.TaskIndex] = None):
+        self.key = key
+        self.database_id = database_id
+        self.headers = headers
+        self.outbox_name = outbox_name
+        self.mirror = mirror or Mirror(database_id, headers)
+        self.reports = reports or task_report.TaskIndex(P)
+        # Выданные, но, возможно, ещё не дошедшие до Notion номера (задачи стоят в очереди notion_outbox):
+        # без этого две быстрые /add подряд получили бы одинаковый ID.
+        self.last_issued_id = 0
+
+    def outbox(self) -> Optional[notion_outbox.Outbox]:
+        return notion_outbox.get(self.outbox_name, self.headers)
+
+    def __repr__(self) -> str:
+        return f"Site({self.key!r})"
+
+
+# база из .env (NOTION_DATABASE_ID/NOTION_TOKEN) — как раньше; объекты с той же базой делят её
+DEFAULT_SITE = Site(projects.default().key, DATABASE_ID, NOTION_HEADERS, "intel-bot", MIRROR, REPORTS)
+SITES: Dict[str, Site] = {DATABASE_ID: DEFAULT_SITE}  # id базы -> Site
+SITE_BY_PROJECT: Dict[str, Site] = {}
+for _p in projects.all_projects():
+    if not _p.tasks_db or _p.tasks_db == DATABASE_ID:
+        SITE_BY_PROJECT[_p.key] = DEFAULT_SITE
+    else:
+        SITE_BY_PROJECT[_p.key] = SITES.setdefault(
+            _p.tasks_db, Site(_p.key, _p.tasks_db, _p.headers, f"intel-bot-{_p.key}"))
+
+
+def site_for_chat(chat_id: Optional[int]) -> Site:
+    return SITE_BY_PROJECT.get(projects.for_chat(chat_id).key, DEFAULT_SITE)
+
+
+def _chat_site(update: Update) -> Site:
+    chat = getattr(update, "effective_chat", None)
+    return site_for_chat(chat.id if chat else None)
+
 
 # ===== 4. Константы, клавиатуры и разрешённые значения =====
 # Разрешённые статусы в вашей базе (проверьте в Notion)
@@ -99,22 +159,13 @@ ST1_WAIT_ID, ST2_WAIT_STATUS = range(4, 6)
 
 
 # ===== ВСПОМОГАТЕЛЬНОЕ: HTTP с ретраями к Notion =====
-def _request_with_retries(method: str, url: str, **kwargs) -> requests.Response:
-    """Простой экспоненциальный бэкофф для 429/5xx."""
-    for attempt in range(RETRY_MAX):
-        resp = requests.request(method, url, timeout=HTTP_TIMEOUT, **kwargs)
-        if resp.status_code < 429 or resp.status_code == 404:
-            return resp
-        if resp.status_code in (429, 500, 502, 503, 504):
-            delay = min(2 ** attempt, 10)
-            log.warning("Notion %s -> %s. Retry in %ss (attempt %s/%s)", method, resp.status_code, delay, attempt+1, RETRY_MAX)
-            time.sleep(delay)
-            continue
-        return resp
-    return resp
-
-
-# ===== 5. Вспомогательное: парсинг дат, безопасные извлечения из Notion =====
+def _request_with_retries(method: str, url: str, payload: Optional[dict] = None,
+                          site: Optional[Site] = None) -> requests.Response:
+    """Запрос к Notion через общий слой notion_http: бэкофф для 429/5xx, лимит частоты, быстрый JSON."""
+    return notion_http.request(method, url, (site or DEFAULT_SITE).headers, payload, retries=RETRY_MAX)
+
+
+# ===== 5. Вспомогательное: парсинг дат =====
 def _today_iso() -> str:
     return date.today().strftime("%Y-%m-%d")
 
@@ -145,96 +196,101 @@ def parse_deadline(s: Optional[str]) -> Optional[str]:
     return None
 
 
-def safe_text(prop: dict) -> str:
-    """Безопасно достаёт plain_text из rich_text / title."""
-    if not isinstance(prop, dict):
-        return ""
-    for key in ("title", "rich_text"):
-        arr = prop.get(key, [])
-        if isinstance(arr, list) and arr:
-            return arr[0].get("plain_text") or arr[0].get("text", {}).get("content", "")
-    return ""
-
-
-def safe_select_name(prop: dict) -> str:
-    if not isinstance(prop, dict):
-        return ""
-    sel = prop.get("select")
-    if isinstance(sel, dict):
-        return sel.get("name", "")
-    return ""
-
-
-def page_code_from_props(props: dict) -> str:
-    return safe_text(props.get(P["TITLE_ID"], {})) or "—"
-
-
 # ===== 6. Notion: низкоуровневые функции (поиск страницы, создание, обновление статуса, запрос последних) =====
 # ==== 6.1. Автонумерация: следующий ID в формате 3 цифры ====
-def notion_get_next_numeric_id() -> str:
+def notion_get_next_numeric_id(site: Optional[Site] = None) -> str:
     """
     Сканирует последние страницы базы и ищет максимальный числовой ID в колонке Title (P['TITLE_ID']).
     Возвращает следующий номер как строку с ведущими нулями: '001', '002', ...
     Если ничего не нашлось — вернёт '001'.
     """
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
+    site = site or DEFAULT_SITE
     payload = {
         "sorts": [{"timestamp": "last_edited_time", "direction": "descending"}],
-        "page_size": 50
     }
     try:
-        r = _request_with_retries("POST", url, headers=NOTION_HEADERS, data=json.dumps(payload))
-        if r.status_code != 200:
-            log.warning("Notion counter query failed: %s %s", r.status_code, r.text)
-            return "001"
-
-        max_num = 0
-        for item in r.json().get("results", []):
-            props = item.get("properties", {})
-            code = safe_text(props.get(P["TITLE_ID"], {})).strip()
-            if re.fullmatch(r"\d{1,}", code):
-                n = int(code)
-                if n > max_num:
-                    max_num = n
-        nxt = max_num + 1
-        return str(nxt).zfill(3)
+        pages = notion_http.iter_query(site.database_id, site.headers, payload,
+                                       filter_properties=[P["TITLE_ID"]], limit=50)
+        return _issue_numeric_id(_max_numeric_id(pages) + 1, site)
     except Exception as e:
-        log.warning("Counter error: %s", e)
-        return "001"
+        log.warning("Counter error: %s — номер по локальному зеркалу", e)
+        return _issue_numeric_id(_max_numeric_id(site.mirror.iter_pages()) + 1, site)
+
+
+def _max_numeric_id(pages) -> int:
+    max_num = 0
+    for item in pages:
+        code = (decode_task(item, P).code or "").strip()
+        if re.fullmatch(r"\d{1,}", code):
+            max_num = max(max_num, int(code))
+    return max_num
+
+
+def _issue_numeric_id(candidate: int, site: Optional[Site] = None) -> str:
+    site = site or DEFAULT_SITE
+    site.last_issued_id = max(candidate, site.last_issued_id + 1)
+    return str(site.last_issued_id).zfill(3)
 
 # ==== 6.2. Поиск страницы по коду, обновление статуса, создание страницы, запрос последних ====
-def notion_find_page_by_code(code: str) -> Optional[str]:
+def notion_find_page_by_code(code: str, site: Optional[Site] = None) -> Optional[str]:
     """
     Находит страницу по коду (например, 'INTEL-005' или '001') в колонке Title (P["TITLE_ID"]).
     Возвращает page_id или None.
     """
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
     payload = {
         "filter": {
             "property": P["TITLE_ID"],
             "title": {"equals": code}
         },
-        "page_size": 1
     }
-    r = _request_with_retries("POST", url, headers=NOTION_HEADERS, data=json.dumps(payload))
-    if r.status_code != 200:
-        log.warning("Notion query failed: %s %s", r.status_code, r.text)
-        return None
-    results = r.json().get("results", [])
-    if not results:
+    site = site or DEFAULT_SITE
+    try:
+        for item in notion_http.iter_query(site.database_id, site.headers, payload, limit=1):
+            return item.get("id")
         return None
-    return results[0].get("id")
+    except requests.RequestException as e:
+        log.warning("Notion query failed: %s — ищем в локальном зеркале", e)
+    page = site.mirror.find(lambda p: decode_task(p, P).code == code)
+    return page.get("id") if page else None
 
 
-def notion_update_status(page_id: str, new_status: str) -> Tuple[bool, str]:
+def _queue_page_patch(page_id: str, payload: dict, label: str, merge_files: Optional[str] = None,
+                      site: Optional[Site] = None) -> bool:
+    """
+    Офлайн: правка страницы уходит в очередь. Для проверки конфликта запоминаем last_edited_time
+    страницы из зеркала — если к отправке её успеют изменить в Notion, правка не затрёт чужую.
+    """
+    site = site or DEFAULT_SITE
+    outbox = site.outbox()
+    if outbox is None:
+        return False
+    seen = site.mirror.get(page_id) or {}
+    outbox.enqueue("PATCH", f"{notion_http.API}/pages/{page_id}", payload, label=label,
+                   expect_edited=None if merge_files else seen.get("last_edited_time"),
+                   merge_files=merge_files)
+    return True
+
+
+def notion_update_status(page_id: str, new_status: str, site: Optional[Site] = None,
+                         code: str = "") -> Tuple[bool, str]:
     """Обновляет статус страницы в Notion. new_status должен быть одним из ALLOWED_STATUSES."""
     if new_status not in ALLOWED_STATUSES:
         return False, f"Недопустимый статус: {new_status}"
 
-    url = f"https://api.notion.com/v1/pages/{page_id}"
+    site = site or DEFAULT_SITE
+    url = f"{notion_http.API}/pages/{page_id}"
     payload = {"properties": {P["STATUS"]: {"status": {"name": new_status}}}}
-    r = _request_with_retries("PATCH", url, headers=NOTION_HEADERS, data=json.dumps(payload))
+    try:
+        r = _request_with_retries("PATCH", url, payload, site)
+    except requests.RequestException as e:
+        # код задачи в метке: о конфликте правки прораб узнает из сообщения очереди
+        if _queue_page_patch(page_id, payload, f"{code or page_id}: статус → {new_status}", site=site):
+            return True, notion_outbox.QUEUED
+        return False, f"нет связи с Notion: {e}"
     if r.status_code in (200, 201):
+        page = notion_http.response_json(r)
+        if page.get("object") == "page":
+            site.reports.feed([page])  # /report увидит новый статус, не дожидаясь зеркала
         return True, "ok"
     return False, f"{r.status_code} {r.text}"
 
@@ -244,6 +300,7 @@ def notion_create_page(
     deadline_iso: Optional[str],
     object_text: Optional[str],
     source_name: Optional[str],
+    site: Optional[Site] = None,
 ) -> Tuple[bool, str]:
     """
     Создаёт задачу в базе по "умному" разбору заголовка.
@@ -282,11 +339,13 @@ def notion_create_page(
         # Иначе: ID временный, NAME = исходный текст
         return gen_tmp_id(), text, False
 
+    site = site or DEFAULT_SITE
     code, name_text, code_provided = split_id_and_name(title_raw)
 
     # Если пользователь НЕ дал готовый алфанумерический код — генерируем следующий числовой ID вида 001/002/003...
     if not code_provided:
-        code = notion_get_next_numeric_id()
+        with tracing.span("notion.next_id"):
+            code = notion_get_next_numeric_id(site)
 
     props: Dict[str, Any] = {
         P["TITLE_ID"]: {"title": [{"text": {"content": code}}]},
@@ -300,37 +359,50 @@ def notion_create_page(
     if source_name:
         props[P["SOURCE"]] = {"select": {"name": source_name}}
 
-    payload = {"parent": {"database_id": DATABASE_ID}, "properties": props}
-    r = _request_with_retries("POST", "https://api.notion.com/v1/pages", headers=NOTION_HEADERS, data=json.dumps(payload))
+    payload = {"parent": {"database_id": site.database_id}, "properties": props}
+    outbox = site.outbox()
+    if outbox is not None:
+        outbox.enqueue("POST", f"{notion_http.API}/pages", payload, label=f"task {code}",
+                       dedupe={"database_id": site.database_id,
+                               "filter": {"property": P["TITLE_ID"], "title": {"equals": code}}})
+        return True, notion_outbox.QUEUED
+    r = _request_with_retries("POST", f"{notion_http.API}/pages", payload, site)
     if r.status_code in (200, 201):
-        return True, r.json().get("id", "")
+        return True, notion_http.response_json(r).get("id", "")
     return False, f"{r.status_code} {r.text}"
 
 
-def notion_query_recent(limit: int = 10) -> List[dict]:
-    """Последние изменённые задачи (для /report)."""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
+def _created_text(info: str) -> str:
+    if info == notion_outbox.QUEUED:
+        return "✓ Задача принята и уйдёт в Notion в фоне."
+    return "✓ Задача добавлена в Notion."
+
+
+async def notion_query_recent(limit: int = 10, site: Optional[Site] = None) -> List[dict]:
+    """Последние изменённые задачи (для /report). Не блокирует event loop."""
+    site = site or DEFAULT_SITE
     payload = {
         "sorts": [{"timestamp": "last_edited_time", "direction": "descending"}],
-        "page_size": limit,
     }
-    r = _request_with_retries("POST", url, headers=NOTION_HEADERS, data=json.dumps(payload))
-    if r.status_code != 200:
-        log.warning("Notion query error: %s %s", r.status_code, r.text)
-        return []
-    return r.json().get("results", [])
+    fields = [P["TITLE_ID"], P["NAME"], P["STATUS"], P["DEADLINE"]]
+    try:
+        return [p async for p in notion_http.aiter_query(site.database_id, site.headers, payload,
+                                                         filter_properties=fields, limit=limit)]
+    except requests.RequestException as e:
+        log.warning("Notion query error: %s — отвечаем из локального зеркала", e)
+        return await asyncio.to_thread(site.mirror.recent, limit)
 
 # ===== 6.3. Вложения: хелперы и операция добавления ссылки =====
 
-def _get_existing_files(page_id: str) -> List[dict]:
+def _get_existing_files(page_id: str, site: Optional[Site] = None) -> List[dict]:
     """Возвращает текущие файлы из свойства P["ATTACH"] (Files & media)."""
     try:
-        url = f"https://api.notion.com/v1/pages/{page_id}"
-        r = _request_with_retries("GET", url, headers=NOTION_HEADERS)
+        url = f"{notion_http.API}/pages/{page_id}"
+        r = _request_with_retries("GET", url, site=site)
         if r.status_code != 200:
             log.warning("Notion retrieve page failed: %s %s", r.status_code, r.text)
             return []
-        props = r.json().get("properties", {})
+        props = notion_http.response_json(r).get("properties", {})
         files_prop = props.get(P["ATTACH"], {})
         return files_prop.get("files", []) or []
     except Exception as e:
@@ -348,7 +420,9 @@ def _nice_filename_from_url(url: str) -> str:
         return "link"
 
 
-def attach_link_to_task(text_id: str, url: str, name: Optional[str] = None) -> Tuple[bool, str]:
+@tracing.action("attach_link_to_task")
+def attach_link_to_task(text_id: str, url: str, name: Optional[str] = None,
+                        site: Optional[Site] = None) -> Tuple[bool, str]:
     """
     Добавляет внешнюю ссылку в свойство P["ATTACH"] задачи с заданным текстовым ID.
     - text_id: '001', '002', ... (или любой код, который хранится в колонке Title/ID)
@@ -356,7 +430,8 @@ def attach_link_to_task(text_id: str, url: str, name: Optional[str] = None) -> T
     - name: подпись (если None — сформируем из URL)
     """
     # 1) Найти страницу по коду
-    page_id = notion_find_page_by_code(text_id)
+    with tracing.span("notion.find_page", code=text_id):
+        page_id = notion_find_page_by_code(text_id, site)
     if not page_id:
         return False, f"Не нашёл задачу с ID {text_id}. Проверь номер (например, 001)."
 
@@ -365,12 +440,29 @@ def attach_link_to_task(text_id: str, url: str, name: Optional[str] = None) -> T
     new_file = {"name": file_name, "external": {"url": url}}
 
     # 3) Считать текущие файлы и добавить новый
-    existing = _get_existing_files(page_id)
-    updated_files = (existing or []) + [new_file]
-
-    # 4) Обновить страницу
-    payload = {"properties": {P["ATTACH"]: {"files": updated_files}}}
-    r = _request_with_retries("PATCH", f"https://api.notion.com/v1/pages/{page_id}", headers=NOTION_HEADERS, data=json.dumps(payload))
+    if offline.online():
+        with tracing.span("notion.get_files") as sp:
+            existing = _get_existing_files(page_id, site)
+            sp.set("files", len(existing))
+        updated_files = (existing or []) + [new_file]
+
+        # 4) Обновить страницу
+        payload = {"properties": {P["ATTACH"]: {"files": updated_files}}}
+        try:
+            with tracing.span("notion.update_files"):
+                r = _request_with_retries("PATCH", f"{notion_http.API}/pages/{page_id}", payload, site)
+        except requests.RequestException as e:
+            log.warning("Attach: %s — ставим в очередь", e)
+            r = None
+    else:
+        r = None
+    if r is None:
+        # без связи: текущий список файлов прочитаем уже при отправке и допишем к нему
+        payload = {"properties": {P["ATTACH"]: {"files": [new_file]}}}
+        if _queue_page_patch(page_id, payload, f"{text_id}: вложение {file_name}", merge_files=P["ATTACH"],
+                             site=site):
+            return True, f"📴 Нет связи — ссылка для задачи {text_id} сохранена и уйдёт в Notion при появлении сети."
+        return False, "Нет связи с Notion, попробуй позже."
     if r.status_code in (200, 201):
         return True, f"Готово! Ссылка добавлена в ‘{P['ATTACH']}’ задачи {text_id}."
     return False, f"Не удалось обновить ‘{P['ATTACH']}’: {r.status_code} {r.text}"
@@ -383,7 +475,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Команды:\n"
         "/add — добавить задачу (мастер или быстро: /add Текст | 2025-10-01 | Объект | Источник)\n"
         "/status — сменить статус задачи\n"
-        "/report — последние изменения\n"
+        "/report — последние изменения (или: today, week, overdue, object=...)\n"
         "/help — подсказка"
     )
 
@@ -397,7 +489,10 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "     Примеры:\n"
         "       /status INTEL-005 In progress\n"
         "       /status  (запустит диалог)\n"
-        "/report — последние задачи из Backlog"
+        "/report — последние изменения; окна и фильтры:\n"
+        "       /report today | tomorrow | week | overdue\n"
+        "       /report week object=Котельная status=In progress\n"
+        "/stats — метрики бота (для админа)"
     )
     await update.message.reply_text(text)
 
@@ -405,22 +500,31 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def cmd_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    pages = notion_query_recent(limit=10)
+    """/report [today|tomorrow|week|overdue] [object=...] [status=...] — из зеркала, ответ кэшируется до дельты."""
+    site = _chat_site(update)
+    query = " ".join(context.args or [])
+    if await asyncio.to_thread(site.reports.ensure_loaded, site.mirror):
+        try:
+            text = site.reports.render(query)
+        except ValueError as e:
+            text = (f"{e}. Примеры: /report today, /report week object=Котельная, "
+                    f"/report overdue, /report status=In progress")
+        await update.message.reply_text(text)
+        return
+
+    # зеркало ещё не собрано (первый запуск) — как раньше, последние изменения прямо из Notion
+    if query:
+        await update.message.reply_text("Отчёты по срокам появятся после первой синхронизации зеркала.")
+        return
+    pages = await notion_query_recent(limit=10, site=site)
     if not pages:
         await update.message.reply_text("Пока нет данных.")
         return
 
     lines = []
     for p in pages:
-        props = p.get("properties", {})
-        code = page_code_from_props(props)
-        name = safe_text(props.get(P["NAME"], {}))
-        status = safe_select_name(props.get(P["STATUS"], {})) or "—"
-        deadline = ""
-        if isinstance(props.get(P["DEADLINE"]), dict):
-            d = props[P["DEADLINE"]].get("date", {})
-            deadline = (d.get("start") or "")[:10]
-        lines.append(f"{code}: {name} | {status} | {deadline or '—'}")
+        t = decode_task(p, P)
+        lines.append(f"{t.code or '—'}: {t.name or ''} | {t.status or '—'} | {(t.deadline or '')[:10] or '—'}")
 
     await update.message.reply_text("Последние изменения:\n" + "\n".join(lines[:10]))
 
@@ -439,7 +543,7 @@ async def attach_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text_id = context.args[0].strip()
         url = context.args[1].strip()
         name = " ".join(context.args[2:]).strip() if len(context.args) > 2 else None
-        ok, msg = attach_link_to_task(text_id, url, name)
+        ok, msg = attach_link_to_task(text_id, url, name, _chat_site(update))
         await update.message.reply_text(msg)
     except Exception as e:
         await update.message.reply_text(f"Ошибка: {e}")
@@ -457,9 +561,9 @@ async def add_task_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             deadline_iso = parse_deadline(payload[1]) if len(payload) >= 2 else None
             object_text = payload[2] if len(payload) >= 3 else None
             source_name = payload[3] if len(payload) >= 4 else None
-            ok, info = notion_create_page(title, deadline_iso, object_text, source_name)
+            ok, info = notion_create_page(title, deadline_iso, object_text, source_name, _chat_site(update))
             if ok:
-                await update.message.reply_text("✓ Задача добавлена в Notion.")
+                await update.message.reply_text(_created_text(info))
             else:
                 await update.message.reply_text(f"✗ Ошибка создания: {info}")
             return ConversationHandler.END
@@ -483,6 +587,7 @@ async def add_task_object(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Источник (выбери кнопку или напиши, «-» если нет):", reply_markup=SOURCE_KBD)
     return ADD_SOURCE
 
+@tracing.action("add_task_source")
 async def add_task_source(update: Update, context: ContextTypes.DEFAULT_TYPE):
     src = update.message.text.strip()
     source_name = src if src in SOURCES else (None if src in ("-", "—") else src)
@@ -491,10 +596,11 @@ async def add_task_source(update: Update, context: ContextTypes.DEFAULT_TYPE):
     title = context.user_data.get("name", "")
     deadline_iso = context.user_data.get("deadline_iso")
     object_text = context.user_data.get("object")
-    ok, info = notion_create_page(title, deadline_iso, object_text, source_name)
+    with tracing.span("notion.create_page"):
+        ok, info = notion_create_page(title, deadline_iso, object_text, source_name, _chat_site(update))
 
     if ok:
-        await update.message.reply_text("✓ Задача добавлена в Notion.", reply_markup=ReplyKeyboardRemove())
+        await update.message.reply_text(_created_text(info), reply_markup=ReplyKeyboardRemove())
     else:
         await update.message.reply_text(f"✗ Ошибка создания: {info}", reply_markup=ReplyKeyboardRemove())
 
@@ -538,6 +644,7 @@ async def st2_got_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return await _apply_status(update, context, code, new_status)
 
 
+@tracing.action("apply_status")
 async def _apply_status(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str, new_status: str):
     if new_status not in ALLOWED_STATUSES:
         await update.message.reply_text(
@@ -546,7 +653,9 @@ async def _apply_status(update: Update, context: ContextTypes.DEFAULT_TYPE, code
         )
         return ConversationHandler.END
 
-    page_id = notion_find_page_by_code(code)
+    site = _chat_site(update)
+    with tracing.span("notion.find_page", code=code):
+        page_id = notion_find_page_by_code(code, site)
     if not page_id:
         await update.message.reply_text(
             f"Не нашёл задачу с ID {code}. Проверь, что в колонке «{P['TITLE_ID']}» есть такое значение.",
@@ -554,8 +663,14 @@ async def _apply_status(update: Update, context: ContextTypes.DEFAULT_TYPE, code
         )
         return ConversationHandler.END
 
-    ok, info = notion_update_status(page_id, new_status)
-    if ok:
+    with tracing.span("notion.update_status", status=new_status):
+        ok, info = notion_update_status(page_id, new_status, site, code)
+    if ok and info == notion_outbox.QUEUED:
+        await update.message.reply_text(
+            f"📴 Нет связи — статус {code} → «{new_status}» сохранён и уйдёт в Notion при появлении сети.",
+            reply_markup=ReplyKeyboardRemove()
+        )
+    elif ok:
         await update.message.reply_text(
             f"✓ Статус задачи {code} обновлён на «{new_status}».",
             reply_markup=ReplyKeyboardRemove()
@@ -609,9 +724,39 @@ def main():
     app.add_handler(CommandHandler("help", cmd_help))
     app.add_handler(CommandHandler("report", cmd_report))
     app.add_handler(CommandHandler("attach", attach_command))
+    app.add_handler(CommandHandler("stats", metrics.cmd_stats))
     app.add_handler(add_conv)
     app.add_handler(status_conv)
 
+    metrics.instrument_application(app, "intel-bot")
+    metrics.serve()
+    for site in SITES.values():
+        outbox = site.outbox()
+        if outbox is not None:
+            notion_outbox.notify(app, outbox)  # отклонённое Notion — сообщением в чат прораба
+            outbox.start()  # досылаем то, что осталось в очереди с прошлого запуска
+        site.mirror.on_change(site.reports.feed)
+        offline.keep_fresh(site.mirror)
+    offline.start()
+    offline.start_refresh(app)  # зеркала обновляются и при OFFLINE_MODE=off
+
+    # напоминания и сводка: каждый чат получает задачи базы своего объекта
+    reminder_chats = deadline_reminders.parse_chats(deadline_reminders.REMINDER_CHATS)
+    digest_chats = deadline_reminders.parse_chats(site_digest.DIGEST_CHATS)
+    for site in SITES.values():
+        mine = {c: o for c, o in reminder_chats.items() if site_for_chat(c) is site}
+        if mine:
+            state = None if site is DEFAULT_SITE else f"reminders_sent_{site.key}.json"
+            deadline_reminders.start(app, site.mirror, mine, P, state_path=state)
+        mine = {c: o for c, o in digest_chats.items() if site_for_chat(c) is site}
+        if mine:
+            # фото по разделам — из журнала того же объекта (cloud_photo_bot), его зеркало тоже держим свежим
+            project = projects.get(site.key)
+            journal = Mirror(project.journal_db, project.headers) if project.journal_db else None
+            if journal is not None:
+                offline.keep_fresh(journal)
+            site_digest.start(app, site.mirror, journal, mine, P)
+
     log.warning("Bot is starting...")
     app.run_polling()
 
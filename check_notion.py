@@ -1,5 +1,7 @@
 import os
-import requests
+
+import notion_http
+from notion_models import iter_tasks
 
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DATABASE_ID = os.getenv("NOTION_TASKS_DB")
@@ -10,78 +12,22 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-
-response = requests.post(url, headers=HEADERS, json={})
-
-print("Status:", response.status_code)
-
-data = response.json()
-
-print("Всего задач:", len(data["results"]))
-for page in data["results"]:
-    props = page["properties"]
-
-    # --- Title (главное поле). У тебя оно называется "ID (текст)" ---
-    if "ID (текст)" in props and props["ID (текст)"].get("type") == "title":
-        title_items = props["ID (текст)"]["title"]
-    else:
-        # На всякий случай: авто-поиск первого поля типа title
-        title_key = next((k for k, v in props.items() if v.get("type") == "title"), None)
-        title_items = props[title_key]["title"] if title_key else []
-
-    title = title_items[0]["plain_text"] if title_items else "(без названия)"
-
-    # --- Статус (поддержим и Status, и Select) ---
-    status_val = "-"
-    if "Статус" in props:
-        t = props["Статус"].get("type")
-        if t == "status" and props["Статус"]["status"]:
-            status_val = props["Статус"]["status"]["name"]
-        elif t == "select" and props["Статус"]["select"]:
-            status_val = props["Статус"]["select"]["name"]
-
-    # --- Дедлайн (если есть колонка Date) ---
-    deadline_val = "-"
-    for k, v in props.items():
-        if v.get("type") == "date":
-            if v["date"] and v["date"].get("start"):
-                deadline_val = v["date"]["start"]
-            break
-
-    print(f"- {title} | Статус: {status_val} | Дедлайн: {deadline_val}")
-
-with open("tasks_output.txt", "w", encoding="utf-8") as f:
-    f.write(f"Всего задач: {len(data['results'])}\n")
-    for page in data["results"]:
-        props = page["properties"]
-
-        # Title
-        if "ID (текст)" in props and props["ID (текст)"].get("type") == "title":
-            title_items = props["ID (текст)"]["title"]
-        else:
-            title_key = next((k for k, v in props.items() if v.get("type") == "title"), None)
-            title_items = props[title_key]["title"] if title_key else []
-
-        title = title_items[0]["plain_text"] if title_items else "(без названия)"
-
-        # Status
-        status_val = "-"
-        if "Статус" in props:
-            t = props["Статус"].get("type")
-            if t == "status" and props["Статус"]["status"]:
-                status_val = props["Статус"]["status"]["name"]
-            elif t == "select" and props["Статус"]["select"]:
-                status_val = props["Статус"]["select"]["name"]
-
-        # Deadline
-        deadline_val = "-"
-        for k, v in props.items():
-            if v.get("type") == "date":
-                if v["date"] and v["date"].get("start"):
-                    deadline_val = v["date"]["start"]
-                break
-
-        f.write(f"- {title} | Статус: {status_val} | Дедлайн: {deadline_val}\n")
-
-
+# Все задачи с пагинацией (раньше брали только первые 100).
+# Страницы сразу декодируем в компактные Task: колонки берутся из PROP_* в .env
+# (Title — "ID (текст)", Статус — Status или Select, Дедлайн — "Срок ( Deadline)").
+# Один проход: каждая задача сразу печатается и пишется в файл, список в памяти не копится;
+# итог дописывается в начало файла в конце. Сводка по объектам и фото — site_digest.py.
+lines = 0
+with open("tasks_output.txt.tmp", "w", encoding="utf-8") as f:
+    for t in iter_tasks(notion_http.iter_query(DATABASE_ID, HEADERS, {})):
+        line = f"- {t.code or '(без названия)'} | Статус: {t.status or '-'} | Дедлайн: {t.deadline or '-'}"
+        print(line)
+        f.write(line + "\n")
+        lines += 1
+
+print("Всего задач:", lines)
+with open("tasks_output.txt", "w", encoding="utf-8") as out, open("tasks_output.txt.tmp", "r", encoding="utf-8") as f:
+    out.write(f"Всего задач: {lines}\n")
+    for line in f:
+        out.write(line)
+os.remove("tasks_output.txt.tmp")
@@ -4,11 +4,27 @@ Pocket Foreman: Cloudinary -> Notion
 - Авто /sync при старте (чтение structure.txt, создание папок в Cloudinary, кэш)
 - Авто-приветствие + кнопка «📸 Добавить фото» без /start
 - /photo: выбрать раздел -> фото -> (опц.) комментарий -> Cloudinary -> запись в Notion
+- повторно присланное фото не загружается второй раз (photo_index.py)
+- превью для журнала: Cloudinary строит его при загрузке, ссылка — в колонку PROP_THUMB
+- фото перед загрузкой уменьшается и теряет EXIF (photo_prep.py); GPS и время съёмки пишутся в Notion.
+  Они есть только у фото, присланного файлом (документом): Telegram пережимает обычные фото и вырезает
+  EXIF, а кадры с камеры (camera.html) уходят в Cloudinary мимо бота — у таких записей GPS и времени нет
+- видео и документы (акты, чертежи): потоком из Telegram на диск и в Cloudinary частями с продолжением
+  после обрыва (large_upload.py), прогресс — в сообщении, которое бот обновляет; картинки документом
+  до PHOTO_DOC_MAX_MB идут как фото
+- камера (camera.html как Telegram WebApp, CAMERA_URL): фото грузятся в Cloudinary прямо из телефона
+  по подписанным ботом параметрам; боту приходят только public_id, он проверяет подпись и пишет Notion
+- несколько объектов в одном процессе (projects.py): объект выбирается по чату, у каждого своя
+  структура, кэш меню, корень в Cloudinary, база Notion и очередь записей
 """
 
 import os
 import io
 import json
+import time
+import uuid
+import asyncio
+from urllib.parse import urlencode
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
@@ -18,9 +34,20 @@ from structure_safe_sync import start_safe_sync
 
 
 from dotenv import load_dotenv
-import requests
 import cloudinary
+import cloudinary.exceptions
 import cloudinary.uploader
+import cloudinary.utils
+
+import metrics
+import offline
+import photo_prep
+import photo_index
+import large_upload
+import projects
+import tracing
+import notion_http
+import notion_outbox
 
 from telegram import (
     InlineKeyboardButton,
@@ -28,6 +55,7 @@ from telegram import (
     Update,
     KeyboardButton,
     ReplyKeyboardMarkup,
+    WebAppInfo,
 )
 from telegram.ext import (
     ApplicationBuilder,
@@ -53,7 +81,7 @@ logging.getLogger("cloudinary").setLevel(logging.WARNING)
 # ===== .env =====
 load_dotenv()
 
-# === Notion ===
+# === Notion (объект по умолчанию; остальные — в projects.json) ===
 NOTION_TOKEN = os.getenv("NOTION_TOKEN_SCHOOL65", "")
 DATABASE_ID  = os.getenv("NOTION_DATABASE_ID_SCHOOL65", "")
 
@@ -61,20 +89,33 @@ DATABASE_ID  = os.getenv("NOTION_DATABASE_ID_SCHOOL65", "")
 CLOUD_NAME     = os.getenv("CLOUD_NAME", "")
 CLOUD_API_KEY  = os.getenv("CLOUD_API_KEY", "")
 CLOUD_API_SECRET = os.getenv("CLOUD_API_SECRET", "")
+CLOUD_API_BASE = os.getenv("CLOUD_API_BASE", "")  # пусто — настоящий api.cloudinary.com
 CLOUD_ROOT     = os.getenv("CLOUD_ROOT", "Project")
 
 # === Telegram ===
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 
+# Bot API отдаёт ботам файлы до 20 МБ; с локальным Bot API сервером — больше
+TELEGRAM_FILE_LIMIT_MB = float(os.getenv("TELEGRAM_FILE_LIMIT_MB", "20"))
+
+# картинки, присланные документом, до этого размера идут как фото (photo_prep); больше — файлом как есть
+PHOTO_DOC_MAX_MB = float(os.getenv("PHOTO_DOC_MAX_MB", "20"))
+
+# === Камера (WebApp) ===
+CAMERA_URL   = os.getenv("CAMERA_URL", "")   # https-адрес camera.html; пусто — кнопки камеры нет
+CAMERA_TTL_S = int(os.getenv("CAMERA_TTL_S", "900"))  # сколько живут выданные параметры загрузки
+
 # === Колонки в Notion ===
 PROP_SECTION = os.getenv("PROP_SECTION", "Раздел")
 PROP_FILE    = os.getenv("PROP_FILE", "Файл / Фото")
 PROP_URL     = os.getenv("PROP_URL", "Ссылка OneDrive")  # сюда кладём ссылку Cloudinary
 PROP_DATE    = os.getenv("PROP_DATE", "Дата")
 PROP_COMMENT = os.getenv("PROP_COMMENT", "Комментарий")
-
-# === Кэш структуры ===
-STRUCTURE_CACHE = "structure_cache.json"
+# опционально: отдельные колонки для метаданных из EXIF (Date и Text); не заданы — пишем в комментарий
+PROP_TAKEN   = os.getenv("PROP_TAKEN", "")
+PROP_GPS     = os.getenv("PROP_GPS", "")
+# опционально: колонка Files & media для превью (карточки галереи в Notion показывают его, а не оригинал)
+PROP_THUMB   = os.getenv("PROP_THUMB", "")
 
 # ==== Главное меню (reply-клавиатура) ====
 BTN_ADD_PHOTO = "📸 Добавить фото"
@@ -98,6 +139,7 @@ cloudinary.config(
     api_key=CLOUD_API_KEY,
     api_secret=CLOUD_API_SECRET,
     secure=True,
+    upload_prefix=CLOUD_API_BASE or None,
 )
 
 # ===== Notion headers =====
@@ -108,27 +150,30 @@ NOTION_HEADERS = {
 }
 
 # ===== Состояния разговора =====
-PH1_WAIT_SECTION, PH2_WAIT_PHOTO, PH3_WAIT_COMMENT = range(100, 103)
+PH1_WAIT_SECTION, PH2_WAIT_PHOTO, PH3_WAIT_COMMENT, PH4_CONFIRM_DUP = range(100, 104)
 
 # ====== Синхронизация структуры при старте ======
 # делаем тут импорт, чтобы модуль был рядом с ботом
 from structure_sync import sync_structure
 
-try:
-    info = sync_structure()
-    log.info(f"✓ Структура синхронизирована при старте. Корень: {info['root']}, разделов: {len(info['paths'])}")
-except Exception as e:
-    log.warning(f"⚠️ Не удалось автоматически синхронизировать структуру: {e}")
+def _sync_project(project: projects.Project) -> Dict[str, Any]:
+    return sync_structure(project.structure, project.cloud_root, project.cache)
+
+for _p in projects.all_projects():
+    try:
+        info = _sync_project(_p)
+        log.info(f"✓ Структура «{_p.name}» синхронизирована при старте. Корень: {info['root']}, разделов: {len(info['paths'])}")
+    except Exception as e:
+        log.warning(f"⚠️ Не удалось автоматически синхронизировать структуру «{_p.name}»: {e}")
 
 # ====== Меню разделов: дерево из кэша ======
-# Файл structure_cache.json создаётся /sync. Формат:
+# Кэш структуры объекта (projects.Project.cache, по умолчанию structure_cache.json) создаётся /sync. Формат:
 # {"root": "Школа_65", "paths": ["Здание школы/Архитектурная часть/Фасады", ...]}
 
 from pathlib import Path
 
-STRUCTURE_CACHE_PATH = Path("structure_cache.json")
-STRUCT_ROOT = "Школа_65"     # если в кэше будет другой root — перезапишем ниже
-STRUCT_INDEX: Dict[str, List[str]] = {}  # parent_path -> [child_name, ...]
+# объект -> (mtime кэша, root, индекс parent_path -> [child_name, ...]); перечитываем, только когда кэш изменился
+STRUCT_INDEXES: Dict[str, Tuple[float, str, Dict[str, List[str]]]] = {}
 
 def _build_index(paths: List[str]) -> Dict[str, List[str]]:
     """
@@ -146,20 +191,40 @@ def _build_index(paths: List[str]) -> Dict[str, List[str]]:
             idx.setdefault(parent, set()).add(child)
     return {k: sorted(list(v)) for k, v in idx.items()}
 
-def structure_load_index():
-    global STRUCT_ROOT, STRUCT_INDEX
-    if STRUCTURE_CACHE_PATH.exists():
-        data  = json.loads(STRUCTURE_CACHE_PATH.read_text(encoding="utf-8"))
-        STRUCT_ROOT = data.get("root", STRUCT_ROOT)
-        paths = data.get("paths", [])
-        STRUCT_INDEX = _build_index(paths)
-    else:
-        STRUCT_INDEX = {}
-    return STRUCT_ROOT, STRUCT_INDEX
-
-def structure_children(parent_path: str) -> List[str]:
+def structure_load_index(project: Optional[projects.Project] = None) -> Tuple[str, Dict[str, List[str]]]:
+    """(root, индекс) структуры объекта (по умолчанию — объект по умолчанию)."""
+    project = project or projects.default()
+    cache = Path(project.cache)
+    try:
+        mtime = cache.stat().st_mtime
+    except FileNotFoundError:
+        STRUCT_INDEXES.pop(project.key, None)
+        return project.cloud_root, {}
+    hit = STRUCT_INDEXES.get(project.key)
+    if hit and hit[0] == mtime:
+        return hit[1], hit[2]
+    data = notion_http.loads(cache.read_bytes())
+    root = data.get("root", project.cloud_root)
+    index = _build_index(data.get("paths", []))
+    STRUCT_INDEXES[project.key] = (mtime, root, index)
+    return root, index
+
+def structure_children(parent_path: str, project: Optional[projects.Project] = None) -> List[str]:
     """Дети у данного 'parent_path' ('', 'A', 'A/B', ...)"""
-    return STRUCT_INDEX.get(parent_path, [])
+    return structure_load_index(project)[1].get(parent_path, [])
+
+def _project(context: ContextTypes.DEFAULT_TYPE) -> projects.Project:
+    """Объект текущего диалога (выбран по чату в photo_start)."""
+    return projects.get(context.user_data.get("project"))
+
+def _chat_project(update: Update) -> projects.Project:
+    chat = getattr(update, "effective_chat", None)
+    return projects.for_chat(chat.id if chat else None)
+
+def _folder(project: projects.Project, section_path: str) -> str:
+    """Папка раздела в Cloudinary: корень объекта + путь раздела."""
+    root = structure_load_index(project)[0]
+    return f"{root}/{section_path}" if root else section_path
 
 def format_path_for_notion(path_str: str) -> str:
     """Путь 'A/B/C' -> 'A / B / C' (как в колонке «Раздел» в Notion)"""
@@ -185,7 +250,168 @@ def _path_by_id(pid: str) -> str:
     return ID2PATH.get(pid, "")
 
 # ===== Notion =====
-def _notion_create_row(section: str, file_name: str, url: str, comment: Optional[str]) -> Tuple[bool, str]:
+def _outbox(project: Optional[projects.Project] = None) -> Optional[notion_outbox.Outbox]:
+    """Очередь бота (своя у каждого объекта — свой токен Notion); фото из спула — её же записи вида "photo"."""
+    project = project or projects.default()
+    name = "pf-bot" if project is projects.default() else f"pf-bot-{project.key}"
+    outbox = notion_outbox.get(name, project.headers)
+    if outbox is not None and "photo" not in outbox.handlers:
+        outbox.handle("photo", _upload_spooled)
+        outbox.handle("file", _upload_spooled_file)
+    return outbox
+
+
+_cloud_network_error = large_upload.retryable
+
+
+def _upload_spooled(job: dict) -> str:
+    """Обработчик очереди: фото из спула -> Cloudinary -> строка в Notion (тоже через очередь)."""
+    try:
+        data = offline.spool_read(job["spool"])
+    except FileNotFoundError:
+        raise notion_outbox.Reject(f"нет файла в спуле: {job['spool']}")
+    try:
+        with metrics.timed("cloudinary", "upload image", inflight="upload"):
+            # public_id задан заранее: повтор после обрыва перезапишет тот же файл, а не создаст второй
+            up = cloudinary.uploader.upload(data, folder=job["folder"], public_id=job["public_id"],
+                                            resource_type="image", overwrite=True,
+                                            eager=photo_index.eager_transformations(), eager_async=True)
+    except cloudinary.exceptions.Error as e:
+        if _cloud_network_error(e):
+            offline.mark_down(f"Cloudinary: {e}")
+            raise
+        raise notion_outbox.Reject(f"Cloudinary: {e}")
+    _remember_photo(up["secure_url"], up.get("public_id", job["public_id"]), job["section"], job.get("hashes"))
+    _notion_create_row(job["section"], job["file_name"], up["secure_url"], job["comment"],
+                       key=job["key"] + ":row", extra=job.get("extra"), project=projects.get(job.get("project")))
+    offline.spool_drop(job["spool"])
+    return up["secure_url"]
+
+
+def _upload_spooled_file(job: dict) -> str:
+    """Обработчик очереди: большой файл из спула -> Cloudinary частями (с места обрыва) -> строка в Notion."""
+    path = offline.spool_path(job["spool"])
+    if not os.path.exists(path):
+        raise notion_outbox.Reject(f"нет файла в спуле: {job['spool']}")
+    try:
+        with metrics.timed("cloudinary", f"upload {job['options']['resource_type']}", inflight="upload"):
+            up = large_upload.upload(path, **job["options"])
+    except Exception as e:
+        if large_upload.retryable(e):
+            offline.mark_down(f"Cloudinary: {e}")
+            raise
+        raise notion_outbox.Reject(f"Cloudinary: {e}")
+    _notion_create_row(job["section"], job["file_name"], up["secure_url"], job["comment"], key=job["key"] + ":row",
+                       project=projects.get(job.get("project")))
+    offline.spool_drop(job["spool"])
+    return up["secure_url"]
+
+
+def _spool_photo(prep: photo_prep.Prepared, folder: str, public_id: str, section: str,
+                 comment: Optional[str], extra: Optional[Dict[str, Any]],
+                 hashes: Optional[Dict[str, Any]] = None, project: Optional[projects.Project] = None) -> bool:
+    """Без связи: фото на диск, загрузка и запись в Notion — из очереди, когда сеть вернётся."""
+    project = project or projects.default()
+    outbox = _outbox(project)
+    if outbox is None:
+        return False
+    key = uuid.uuid4().hex
+    name = f"{key}.{prep.ext}"
+    offline.spool_put(name, prep.data)
+    job = {"key": key, "spool": name, "folder": folder, "public_id": public_id,
+           "section": section, "file_name": "Фото со стройки", "comment": comment, "extra": extra,
+           "hashes": hashes, "project": project.key}
+    outbox.enqueue("UPLOAD", "cloudinary", job, key=key, kind="photo", label=f"photo {public_id}")
+    return True
+
+
+def _remember_photo(url: str, public_id: str, section: str, hashes: Optional[Dict[str, Any]]) -> None:
+    """Загруженное фото — в индекс дублей и кэш превью."""
+    try:
+        index = photo_index.get()
+        index.add_derived(public_id, url)
+        if hashes:
+            index.add(url, public_id, section, **hashes)
+    except Exception as e:  # индекс — оптимизация, загрузку из-за него не роняем
+        log.warning("Индекс фото: не записано %s: %s", public_id, e)
+
+
+def _dup_text(hit: Dict[str, Any]) -> str:
+    when = datetime.fromtimestamp(hit["created"]).strftime("%d.%m.%Y %H:%M")
+    # в чат — ссылка на уменьшенную копию: на объекте её быстрее открыть, чем оригинал
+    preview = photo_index.derived(hit["url"], hit["public_id"]).get("preview", hit["url"])
+    return f"«{hit['section']}», {when}:\n{preview}"
+
+
+def _camera_link(section_path: str, folder: str) -> str:
+    """
+    Ссылка на camera.html с подписанными параметрами загрузки в папку раздела.
+    Подпись покрывает folder/timestamp/eager: загрузить можно только сюда; Cloudinary не примет
+    её позже чем через час, бот — позже CAMERA_TTL_S. Секрет на телефон не уходит.
+    """
+    params = cloudinary.utils.sign_request({
+        "folder": folder,
+        "timestamp": int(time.time()),
+        "eager": photo_index.eager_transformations(),
+        "eager_async": True,
+    }, {})
+    params.update(
+        cloud=CLOUD_NAME,
+        section=format_path_for_notion(section_path),
+        api=f"{CLOUD_API_BASE or 'https://api.cloudinary.com'}/v1_1/{CLOUD_NAME}/image/upload",
+    )
+    return f"{CAMERA_URL}?{urlencode(params)}"
+
+
+def _camera_items(items: List[Any], session: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Загрузки из camera.html: [(public_id, secure_url)] прошедших проверку и число отброшенных.
+    Подпись ответа Cloudinary (sha1 от public_id+version с нашим секретом) подделать нельзя;
+    ссылку строим сами, а не берём из WebApp.
+    """
+    ok, bad = [], 0
+    for it in items:
+        try:
+            public_id, version = str(it["public_id"]), int(it["version"])
+            genuine = cloudinary.utils.verify_api_response_signature(public_id, version, str(it["signature"]))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            genuine = False
+        fresh = genuine and session["ts"] - 60 <= version <= session["ts"] + CAMERA_TTL_S
+        # только папка раздела этой сессии: public_id без папки — чужая загрузка под нашим пресетом
+        in_folder = bool(session["folder"]) and public_id.startswith(session["folder"] + "/")
+        if not (genuine and fresh and in_folder):
+            bad += 1
+            continue
+        url, _ = cloudinary.utils.cloudinary_url(public_id, version=version, format=it.get("format") or "jpg",
+                                                 resource_type="image", secure=True)
+        ok.append((public_id, url))
+    return ok, bad
+
+
+def _photo_meta(prep: photo_prep.Prepared, comment: Optional[str]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """GPS и время съёмки из EXIF: в свои колонки (PROP_GPS/PROP_TAKEN), если заданы, иначе — в комментарий."""
+    extra: Dict[str, Any] = {}
+    rest = []
+    if prep.taken_at:
+        if PROP_TAKEN:
+            extra[PROP_TAKEN] = {"date": {"start": prep.taken_at}}
+        else:
+            rest.append(f"снято {prep.taken_at.replace('T', ' ')}")
+    if prep.gps:
+        gps = f"{prep.gps[0]:.6f}, {prep.gps[1]:.6f}"
+        if PROP_GPS:
+            extra[PROP_GPS] = {"rich_text": [{"text": {"content": gps}}]}
+        else:
+            rest.append(f"📍 {gps}")
+    if rest:
+        comment = f"{comment} ({'; '.join(rest)})" if comment else "; ".join(rest)
+    return comment, extra
+
+
+def _notion_create_row(section: str, file_name: str, url: str, comment: Optional[str],
+                       key: Optional[str] = None, extra: Optional[Dict[str, Any]] = None,
+                       project: Optional[projects.Project] = None) -> Tuple[bool, str]:
+    project = project or projects.default()
     today_iso = datetime.now().strftime("%Y-%m-%d")
     props: Dict[str, Any] = {
         PROP_SECTION: {"select": {"name": section}},
@@ -195,13 +421,26 @@ def _notion_create_row(section: str, file_name: str, url: str, comment: Optional
     }
     if comment:
         props[PROP_COMMENT] = {"rich_text": [{"text": {"content": comment}}]}
-
-    payload = {"parent": {"database_id": DATABASE_ID}, "properties": props}
-    r = requests.post("https://api.notion.com/v1/pages", headers=NOTION_HEADERS, json=payload)
+    if PROP_THUMB:
+        thumb = photo_index.derived(url).get("thumb")
+        if thumb:
+            props[PROP_THUMB] = {"files": [{"name": "превью", "type": "external", "external": {"url": thumb}}]}
+    if extra:
+        props.update(extra)
+
+    payload = {"parent": {"database_id": project.journal_db}, "properties": props}
+    outbox = _outbox(project)
+    if outbox is not None:
+        # фото уже в Cloudinary: ссылка уникальна, по ней и ищем дубль при повторе
+        outbox.enqueue("POST", f"{notion_http.API}/pages", payload, key=key, label=f"photo {file_name}",
+                       dedupe={"database_id": project.journal_db,
+                               "filter": {"property": PROP_URL, "url": {"equals": url}}})
+        return True, notion_outbox.QUEUED
+    r = notion_http.request("POST", f"{notion_http.API}/pages", project.headers, payload)
     if r.status_code in (200, 201):
         return True, "ok"
     try:
-        return False, r.json().get("message", r.text)
+        return False, notion_http.response_json(r).get("message", r.text)
     except Exception:
         return False, r.text
 
@@ -231,9 +470,10 @@ async def on_first_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===== /sync (для ручного вызова админом, но не требуется пользователю) =====
 async def cmd_sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("⏳ Синхронизация структуры…")
+    project = _chat_project(update)
+    await update.message.reply_text(f"⏳ Синхронизация структуры «{project.name}»…")
     try:
-        info = sync_structure()
+        info = await asyncio.to_thread(_sync_project, project)
         await update.message.reply_text(
             f"✓ Готово. Корень: {info['root']}\nРазделов: {len(info['paths'])}",
             reply_markup=main_menu()
@@ -242,7 +482,7 @@ async def cmd_sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"✗ Ошибка синхронизации: {e}")
 
 # ===== Клавиатуры для выбора разделов =====
-def _kb_for_parent(parent_path: str) -> InlineKeyboardMarkup:
+def _kb_for_parent(parent_path: str, project: Optional[projects.Project] = None) -> InlineKeyboardMarkup:
     """
     Клавиатура для уровня parent_path:
       - дочерние папки (2 в ряд),
@@ -250,7 +490,7 @@ def _kb_for_parent(parent_path: str) -> InlineKeyboardMarkup:
       - ✅ Выбрать здесь.
     В callback_data передаём только короткие id.
     """
-    children = structure_children(parent_path)
+    children = structure_children(parent_path, project)
     rows: List[List[InlineKeyboardButton]] = []
 
     row: List[InlineKeyboardButton] = []
@@ -281,33 +521,35 @@ async def photo_quick_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     # очищаем состояние и показываем корневые разделы
     context.user_data.clear()
-    context.user_data["cursor_path"] = ""
-    root, _ = structure_load_index()
+    project = _chat_project(update)
+    context.user_data.update(cursor_path="", project=project.key)
+    root, index = structure_load_index(project)
 
-    if not STRUCT_INDEX:
+    if not index:
         await query.edit_message_text("Похоже, список разделов пустой. Запусти /sync.")
         return
 
-    await query.edit_message_text(f"Выбери раздел проекта (корень: {root}):")
+    await query.edit_message_text(f"Выбери раздел проекта «{project.name}» (корень: {root}):")
     await query.message.reply_text(
         text="Навигация по разделам:",
-        reply_markup=_kb_for_parent("")
+        reply_markup=_kb_for_parent("", project)
     )
     return PH1_WAIT_SECTION
 
 # ===== /photo (вход через команду или reply-кнопку) =====
 async def photo_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    context.user_data["cursor_path"] = ""
-    root, _ = structure_load_index()
+    project = _chat_project(update)
+    context.user_data.update(cursor_path="", project=project.key)
+    root, index = structure_load_index(project)
 
-    if not STRUCT_INDEX:
+    if not index:
         await update.message.reply_text("Похоже, список разделов пустой. Нажми /sync, чтобы обновить структуру.")
         return ConversationHandler.END
 
     await update.message.reply_text(
-        f"Выбери раздел проекта (корень: {root}):",
-        reply_markup=_kb_for_parent("")
+        f"Выбери раздел проекта «{project.name}» (корень: {root}):",
+        reply_markup=_kb_for_parent("", project)
     )
     return PH1_WAIT_SECTION
 
@@ -333,13 +575,13 @@ async def photo_pick_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if act == "p":
         context.user_data["cursor_path"] = path
         text = f"Раздел: {format_path_for_notion(path) if path else 'Корень'}\nВыбери подраздел:"
-        await query.edit_message_text(text=text, reply_markup=_kb_for_parent(path))
+        await query.edit_message_text(text=text, reply_markup=_kb_for_parent(path, _project(context)))
         return PH1_WAIT_SECTION
 
     if act == "b":
         context.user_data["cursor_path"] = path
         text = f"Раздел: {format_path_for_notion(path) if path else 'Корень'}\nВыбери подраздел:"
-        await query.edit_message_text(text=text, reply_markup=_kb_for_parent(path))
+        await query.edit_message_text(text=text, reply_markup=_kb_for_parent(path, _project(context)))
         return PH1_WAIT_SECTION
 
     if act == "c":
@@ -349,32 +591,100 @@ async def photo_pick_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["section_path"] = path
         nice = format_path_for_notion(path)
         await query.edit_message_text(
-            f"✅ Раздел выбран:\n{nice}\n\nТеперь пришли фото одним сообщением (как изображение)."
+            f"✅ Раздел выбран:\n{nice}\n\nТеперь пришли фото одним сообщением (как изображение) "
+            f"или видео / файл (акт, чертёж, PDF)."
         )
+        if CAMERA_URL:
+            folder = _folder(_project(context), path)
+            context.user_data["camera"] = {"section_path": path, "folder": folder, "ts": int(time.time())}
+            kb = ReplyKeyboardMarkup([[KeyboardButton("📷 Камера", web_app=WebAppInfo(_camera_link(path, folder)))]],
+                                     resize_keyboard=True, one_time_keyboard=True)
+            await query.message.reply_text("…или сними несколько фото камерой — они уйдут в облако сразу с телефона.",
+                                           reply_markup=kb)
         return PH2_WAIT_PHOTO
 
     await query.answer("Неизвестная команда.", show_alert=True)
     return PH1_WAIT_SECTION
 
+@tracing.action("ph2_photo")
 async def ph2_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message.photo:
         await update.message.reply_text("Это не фото. Пришли изображение.")
         return PH2_WAIT_PHOTO
 
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
+    return await _take_photo(update.message, context, update.message.photo[-1])
+
+async def _take_photo(message, context: ContextTypes.DEFAULT_TYPE, photo):
+    """Фото или картинка документом: скачать в память и начать подготовку (photo_prep), пока пишут комментарий."""
+    # пересланное/повторно отправленное фото узнаём по file_unique_id ещё до скачивания
+    hit = photo_index.get().find(file_id=photo.file_unique_id)
+    if hit and hit["section"] == format_path_for_notion(context.user_data.get("section_path", "")):
+        await message.reply_text(f"Это фото уже загружено в {_dup_text(hit)}", reply_markup=main_menu())
+        context.user_data.clear()
+        return ConversationHandler.END
+    context.user_data["file_id"] = photo.file_unique_id
+
+    with tracing.span("telegram.get_file"):
+        file = await photo.get_file()
     bio = io.BytesIO()
-    await file.download_to_memory(out=bio)
+    with tracing.span("telegram.download", bytes=photo.file_size or 0):
+        await file.download_to_memory(out=bio)
     bio.seek(0)
 
     context.user_data["photo_bytes"] = bio.read()
-    await update.message.reply_text("Комментарий (опционально) или «-»:")
+    # пережатие идёт в пуле, пока человек пишет комментарий; результат заберёт ph3_comment
+    context.user_data["photo_prep"] = asyncio.ensure_future(photo_prep.aprepare(context.user_data["photo_bytes"]))
+    await message.reply_text("Комментарий (опционально) или «-»:")
     return PH3_WAIT_COMMENT
 
+@tracing.action("ph2_file")
+async def ph2_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Видео или документ: скачивание на диск начинается сразу, пока человек пишет комментарий."""
+    msg = update.message
+    media = msg.video or msg.document
+    size = media.file_size or 0
+    if size > TELEGRAM_FILE_LIMIT_MB * 2**20:
+        await msg.reply_text(f"Файл {size / 2**20:.0f} МБ — Telegram отдаёт ботам файлы "
+                             f"до {TELEGRAM_FILE_LIMIT_MB:.0f} МБ. Сожми его или пришли ссылку.")
+        return PH2_WAIT_PHOTO
+
+    name = getattr(media, "file_name", None) or ("video.mp4" if msg.video else "file")
+    mime = (getattr(media, "mime_type", None) or "").lower()
+    if msg.document and mime.startswith("image/") and size <= PHOTO_DOC_MAX_MB * 2**20:
+        # фото «файлом» — без пережатия Telegram и с EXIF: тот же путь, что у фото (уменьшение, GPS/время, дубли)
+        return await _take_photo(msg, context, media)
+    if msg.video or mime.startswith("video/"):
+        resource_type = "video"
+    elif mime.startswith("image/"):
+        resource_type = "image"
+    else:
+        resource_type = "raw"
+    ext = os.path.splitext(name)[1][:10].lower()
+    with tracing.span("telegram.get_file"):
+        tg_file = await media.get_file()
+    # свой файл на каждую отправку: тот же файл, присланный дважды (или двумя людьми), не затрёт спул
+    # ещё не досланной очереди
+    path = offline.spool_path(f"{media.file_unique_id}-{uuid.uuid4().hex[:12]}{ext}")
+
+    progress = {"stage": "download", "done": 0, "total": size}
+    context.user_data.update(
+        file_meta={"name": name, "size": size, "ext": ext, "resource_type": resource_type, "path": path},
+        file_progress=progress,
+        file_download=asyncio.ensure_future(asyncio.to_thread(
+            large_upload.download, tg_file.file_path, path, size,
+            lambda done, total: progress.update(done=done, total=total))),
+    )
+    await msg.reply_text("Комментарий (опционально) или «-»:")
+    return PH3_WAIT_COMMENT
+
+@tracing.action("ph3_comment")
 async def ph3_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     comment_raw = (update.message.text or "").strip()
     comment = None if comment_raw in ("-", "—", "") else comment_raw
 
+    if context.user_data.get("file_meta"):
+        return await _file_large(update.message, context, comment)
+
     section_path = context.user_data.get("section_path", "")
     photo_bytes  = context.user_data.get("photo_bytes")
 
@@ -386,36 +696,246 @@ async def ph3_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Раздел потерян. Попробуй /photo заново.")
         return ConversationHandler.END
 
+    # Подготовка: уменьшение/пережатие, EXIF -> метаданные
+    with tracing.span("photo.prepare", bytes=len(photo_bytes)) as sp:
+        pending = context.user_data.get("photo_prep")
+        prep = await pending if pending is not None else await photo_prep.aprepare(photo_bytes)
+        sp.set("bytes_out", len(prep.data))
+    comment, extra = _photo_meta(prep, comment)
+    context.user_data.update(prep=prep, comment=comment, extra=extra)
+
+    # Дубли: тот же файл — не грузим; похожий кадр — спрашиваем
+    with tracing.span("photo.dedup") as sp:
+        hit = photo_index.get().find(sha256=prep.sha256, phash=prep.phash, file_id=context.user_data.get("file_id"))
+        sp.set("hit", bool(hit))
+    if hit and not hit["exact"]:
+        kb = InlineKeyboardMarkup([[InlineKeyboardButton("📤 Всё равно загрузить", callback_data="dup|upload"),
+                                    InlineKeyboardButton("✖️ Не загружать", callback_data="dup|skip")]])
+        await update.message.reply_text(f"Похожее фото уже загружено в {_dup_text(hit)}\nЗагрузить это?",
+                                        reply_markup=kb)
+        return PH4_CONFIRM_DUP
+    if hit and hit["section"] == format_path_for_notion(section_path):
+        await update.message.reply_text(f"Это фото уже загружено в {_dup_text(hit)}", reply_markup=main_menu())
+        context.user_data.clear()
+        return ConversationHandler.END
+    return await _file_photo(update.message, context, reuse_url=hit["url"] if hit else None)
+
+@tracing.action("ph4_duplicate")
+async def ph4_duplicate_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=None)
+    if query.data != "dup|upload" or not context.user_data.get("prep"):
+        await query.message.reply_text("Ок, не загружаю.", reply_markup=main_menu())
+        context.user_data.clear()
+        return ConversationHandler.END
+    return await _file_photo(query.message, context)
+
+@tracing.action("camera_data")
+async def camera_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Фото, загруженные camera.html напрямую в Cloudinary: проверка и строки в Notion."""
+    session = context.user_data.get("camera")
+    if not session or time.time() - session["ts"] > CAMERA_TTL_S:
+        await update.message.reply_text("Камера: сессия устарела, выбери раздел заново — /photo",
+                                        reply_markup=main_menu())
+        context.user_data.clear()
+        return ConversationHandler.END
+    try:
+        payload = json.loads(update.message.web_app_data.data)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        payload = {}
+    items, bad = _camera_items(payload.get("items") or [], session)
+    comment = str(payload.get("comment") or "").strip() or None
+    section = format_path_for_notion(session["section_path"])
+    project = _project(context)
+    queued = failed = 0
+    for public_id, url in items:
+        _remember_photo(url, public_id, section, None)
+        with tracing.span("notion.create_row"):
+            ok, info = _notion_create_row(section=section, file_name="Фото со стройки", url=url, comment=comment,
+                                          project=project)
+        if not ok:
+            failed += 1
+        elif info == notion_outbox.QUEUED:
+            queued += 1
+    lines = []
+    if items:
+        lines.append(f"✓ Фото с камеры: {len(items)} в «{section}»" + (" (записи в Notion уйдут в фоне)" if queued else ""))
+    if failed:
+        lines.append(f"⚠️ Notion не принял записей: {failed}")
+    if bad:
+        lines.append(f"⚠️ Отброшено (подпись не сошлась или устарела): {bad}")
+    if not lines:
+        lines.append("Камера ничего не прислала.")
+    await update.message.reply_text("\n".join(lines), reply_markup=main_menu())
+    context.user_data.clear()
+    return ConversationHandler.END
+
+async def _show_progress(status, progress: Dict[str, Any], every: float = 3.0) -> None:
+    """Обновляет сообщение status по словарю progress, пока задачу не отменят."""
+    shown = ""
+    labels = {"download": "⏬ Скачиваю из Telegram", "upload": "⏫ Загружаю в Cloudinary"}
+    while True:
+        await asyncio.sleep(every)
+        total = progress.get("total") or 0
+        pct = f" {progress['done'] * 100 // total}%" if total else ""
+        text = f"{labels.get(progress['stage'], '…')}{pct} ({progress['done'] / 2**20:.1f} из {total / 2**20:.1f} МБ)"
+        if text != shown:
+            try:
+                await status.edit_text(text)
+                shown = text
+            except Exception as e:  # «message is not modified», флуд-лимит и т.п. — прогресс не критичен
+                log.debug("progress: %s", e)
+
+async def _file_large(message, context: ContextTypes.DEFAULT_TYPE, comment: Optional[str]):
+    """Видео/документ: докачать с Telegram -> Cloudinary частями -> строка в Notion."""
+    meta, progress = context.user_data["file_meta"], context.user_data["file_progress"]
+    section_path = context.user_data.get("section_path", "")
+    project = _project(context)
+    folder = _folder(project, section_path)
+    leaf = section_path.split("/")[-1]
+    # у raw-файлов расширение — часть public_id, иначе скачается файл без расширения
+    public_id = f"{leaf}_{datetime.now().strftime('%Y%m%d_%H%M%S')}" + (meta["ext"] if meta["resource_type"] == "raw" else "")
+    options = {"folder": folder, "public_id": public_id, "resource_type": meta["resource_type"],
+               "filename": meta["name"]}
+    section_for_notion = format_path_for_notion(section_path)
+
+    status = await message.reply_text("⏬ Скачиваю из Telegram…")
+    ticker = asyncio.create_task(_show_progress(status, progress))
+    url = None
+    try:
+        try:
+            with tracing.span("telegram.download", bytes=meta["size"]):
+                path = await context.user_data["file_download"]
+        except Exception as e:
+            log.warning("Файл %s не скачан: %s", meta["name"], type(e).__name__)
+            await message.reply_text("✗ Не удалось скачать файл из Telegram, пришли его ещё раз.", reply_markup=main_menu())
+            context.user_data.clear()
+            return ConversationHandler.END
+
+        if offline.online():
+            progress.update(stage="upload", done=0, total=meta["size"])
+            try:
+                with tracing.span("cloudinary.upload_large", bytes=meta["size"]), \
+                        metrics.timed("cloudinary", f"upload {meta['resource_type']}", inflight="upload"):
+                    up = await asyncio.to_thread(large_upload.upload, path,
+                                                 lambda done, total: progress.update(done=done, total=total), **options)
+                url = up["secure_url"]
+            except Exception as e:
+                if not large_upload.retryable(e):
+                    await message.reply_text(f"✗ Ошибка загрузки в Cloudinary: {e}", reply_markup=main_menu())
+                    offline.spool_drop(os.path.basename(path))
+                    large_upload.forget(path)
+                    context.user_data.clear()
+                    return ConversationHandler.END
+                offline.mark_down(f"Cloudinary: {e}")
+    finally:
+        ticker.cancel()
+
+    if url is None:
+        # уже принятые Cloudinary части не теряются: очередь продолжит с того же места
+        outbox = _outbox(project)
+        if outbox is None:
+            await status.edit_text("✗ Нет связи с Cloudinary, попробуй позже.")
+        else:
+            key = uuid.uuid4().hex
+            job = {"key": key, "spool": os.path.basename(path), "options": options,
+                   "section": section_for_notion, "file_name": meta["name"], "comment": comment,
+                   "project": project.key}
+            outbox.enqueue("UPLOAD", "cloudinary", job, key=key, kind="file", label=f"file {meta['name']}")
+            sent = large_upload.pending(path)
+            await status.edit_text(f"📴 Нет связи — файл сохранён ({sent / 2**20:.1f} из {meta['size'] / 2**20:.1f} МБ "
+                                   f"уже в облаке), догрузится и попадёт в Notion при появлении сети.")
+        await message.reply_text("Готово. Что дальше?", reply_markup=main_menu())
+        context.user_data.clear()
+        return ConversationHandler.END
+
+    offline.spool_drop(os.path.basename(path))
+    with tracing.span("notion.create_row"):
+        ok, info = _notion_create_row(section=section_for_notion, file_name=meta["name"], url=url, comment=comment,
+                                      project=project)
+    if ok and info == notion_outbox.QUEUED:
+        await status.edit_text(f"✓ Файл «{meta['name']}» загружен в Cloudinary, запись в Notion уйдёт в фоне.")
+    elif ok:
+        await status.edit_text(f"✓ Файл «{meta['name']}» загружен в Cloudinary и добавлен в Notion.")
+    else:
+        await status.edit_text(f"⚠️ Файл загружен, но Notion вернул ошибку: {info}")
+    await message.reply_text("Готово. Что дальше?", reply_markup=main_menu())
+    context.user_data.clear()
+    return ConversationHandler.END
+
+async def _file_photo(message, context: ContextTypes.DEFAULT_TYPE, reuse_url: Optional[str] = None):
+    """Cloudinary (или ссылка на уже загруженную копию) -> строка в Notion -> ответ в чат."""
+    prep: photo_prep.Prepared = context.user_data["prep"]
+    comment, extra = context.user_data.get("comment"), context.user_data.get("extra")
+    section_path = context.user_data["section_path"]
+    hashes = {"sha256": prep.sha256, "phash": prep.phash, "file_id": context.user_data.get("file_id")}
+
     # Загрузка в Cloudinary
-    folder = f"{STRUCT_ROOT}/{section_path}" if STRUCT_ROOT else section_path
+    project = _project(context)
+    folder = _folder(project, section_path)
     leaf = section_path.split("/")[-1]
     public_id = f"{leaf}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    try:
-        up = cloudinary.uploader.upload(
-            photo_bytes,
-            folder=folder,
-            public_id=public_id,
-            resource_type="image",
-        )
-        url = up["secure_url"]
-    except Exception as e:
-        await update.message.reply_text(f"✗ Ошибка загрузки в Cloudinary: {e}")
+    section_for_notion = format_path_for_notion(section_path)
+    url = reuse_url
+    if url is None and offline.online():
+        try:
+            with tracing.span("cloudinary.upload", bytes=len(prep.data)), \
+                    metrics.timed("cloudinary", "upload image", inflight="upload"):
+                up = cloudinary.uploader.upload(
+                    prep.data,
+                    folder=folder,
+                    public_id=public_id,
+                    resource_type="image",
+                    eager=photo_index.eager_transformations(),
+                    eager_async=True,
+                )
+            url = up["secure_url"]
+            _remember_photo(url, up.get("public_id", public_id), section_for_notion, hashes)
+        except Exception as e:
+            if not (isinstance(e, cloudinary.exceptions.Error) and _cloud_network_error(e)):
+                await message.reply_text(f"✗ Ошибка загрузки в Cloudinary: {e}")
+                return ConversationHandler.END
+            offline.mark_down(f"Cloudinary: {e}")
+    if url is None:
+        with tracing.span("offline.spool", bytes=len(prep.data)):
+            spooled = _spool_photo(prep, folder, public_id, section_for_notion, comment, extra, hashes, project)
+        if spooled:
+            await message.reply_text("📴 Нет связи — фото сохранено и уйдёт в Cloudinary и Notion при появлении сети.")
+        else:
+            await message.reply_text("✗ Нет связи с Cloudinary, попробуй позже.")
+        await message.reply_text("Готово. Что дальше?", reply_markup=main_menu())
+        context.user_data.clear()
         return ConversationHandler.END
 
     # Запись в Notion
-    section_for_notion = format_path_for_notion(section_path)
-    ok, info = _notion_create_row(
-        section=section_for_notion,
-        file_name="Фото со стройки",
-        url=url,
-        comment=comment,
-    )
-    if ok:
-        await update.message.reply_text("✓ Фото загружено в Cloudinary и добавлено в Notion.")
+    with tracing.span("notion.create_row"):
+        ok, info = _notion_create_row(
+            section=section_for_notion,
+            file_name="Фото со стройки",
+            url=url,
+            comment=comment,
+            extra=extra,
+            project=project,
+        )
+    if ok and info == notion_outbox.QUEUED:
+        done = "запись в Notion уйдёт в фоне"
+    elif ok:
+        done = "запись добавлена в Notion"
     else:
-        await update.message.reply_text(f"⚠️ Фото загружено, но Notion вернул ошибку: {info}")
+        done = f"но Notion вернул ошибку: {info}"
+    if reuse_url:
+        await message.reply_text(f"{'✓' if ok else '⚠️'} Это фото уже было в Cloudinary — взял ту же ссылку, {done}.")
+    elif info == notion_outbox.QUEUED:
+        await message.reply_text("✓ Фото загружено в Cloudinary, запись в Notion уйдёт в фоне.")
+    elif ok:
+        await message.reply_text("✓ Фото загружено в Cloudinary и добавлено в Notion.")
+    else:
+        await message.reply_text(f"⚠️ Фото загружено, но Notion вернул ошибку: {info}")
 
-    await update.message.reply_text("Готово. Что дальше?", reply_markup=main_menu())
+    await message.reply_text("Готово. Что дальше?", reply_markup=main_menu())
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -427,19 +947,20 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 def main():
     if not BOT_TOKEN:
         raise RuntimeError("Нет TELEGRAM_BOT_TOKEN в .env")
-    if not NOTION_TOKEN or not DATABASE_ID:
-        raise RuntimeError("Нет NOTION_TOKEN_SCHOOL65 / NOTION_DATABASE_ID_SCHOOL65 в .env")
-
-    # загрузим индекс структуры один раз при старте
-    root, _ = structure_load_index()
-    old_root, paths = root, []  # для печати
+    for project in projects.all_projects():
+        if not project.notion_token or not project.journal_db:
+            raise RuntimeError(f"Объект {project.key}: нет токена Notion / journal_db "
+                               f"(для объекта из .env — NOTION_TOKEN_SCHOOL65 / NOTION_DATABASE_ID_SCHOOL65)")
 
     print("=======================================")
     print("INTELLECTUM — Pocket Foreman (Cloudinary → Notion)")
-    print(f"Подключено к базе: Школа 65 — Уральск")
-    print(f"Notion база ID: {DATABASE_ID[:8]}...{DATABASE_ID[-5:]}")
     print(f"Cloudinary: {cloudinary.config().cloud_name}")
-    print(f"Корень Cloudinary: {root}")
+    for project in projects.all_projects():
+        # загрузим индекс структуры один раз при старте
+        root, _ = structure_load_index(project)
+        db = project.journal_db
+        print(f"Объект: {project.name} — Notion база ID: {db[:8]}...{db[-5:]}, корень Cloudinary: {root}, "
+              f"чатов: {len(project.chats)}" + (" + все остальные" if project is projects.default() else ""))
     print("=======================================")
 
     # ---- Автонаблюдение за изменениями structure.txt ----
@@ -487,8 +1008,11 @@ def main():
         ],
         states={
             PH1_WAIT_SECTION: [CallbackQueryHandler(photo_pick_cb, pattern=r"^(p|b|c)\|")],
-            PH2_WAIT_PHOTO:   [MessageHandler(filters.PHOTO, ph2_photo)],
+            PH2_WAIT_PHOTO:   [MessageHandler(filters.PHOTO, ph2_photo),
+                               MessageHandler(filters.VIDEO | filters.Document.ALL, ph2_file),
+                               MessageHandler(filters.StatusUpdate.WEB_APP_DATA, camera_data)],
             PH3_WAIT_COMMENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, ph3_comment)],
+            PH4_CONFIRM_DUP:  [CallbackQueryHandler(ph4_duplicate_cb, pattern=r"^dup\|")],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         name="photo_conv",
@@ -501,14 +1025,25 @@ def main():
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("sync", cmd_sync))
+    app.add_handler(CommandHandler("stats", metrics.cmd_stats))
 
     # СНАЧАЛА диалог /photo и инлайн-кнопка "go"
     app.add_handler(photo_conv)
     app.add_handler(CallbackQueryHandler(photo_quick_start, pattern=r"^go$"))
+    # данные камеры вне диалога (диалог уже закончился) — ответим, что сессия устарела
+    app.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, camera_data))
 
     # ПОТОМ общий обработчик любого текста (меню)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, ensure_menu))
 
+    metrics.instrument_application(app, "pf-bot")
+    metrics.serve()
+    for project in projects.all_projects():
+        outbox = _outbox(project)
+        if outbox is not None:
+            notion_outbox.notify(app, outbox)  # отклонённое Notion/Cloudinary — сообщением в чат
+            outbox.start()  # досылаем то, что осталось в очереди с прошлого запуска
+    offline.start()
 
     
     log.info("Pocket Foreman (Cloudinary -> Notion) is starting...")
@@ -3,13 +3,35 @@
 Создаёт дерево папок в локальном OneDrive по структуре из structure.txt.
 Отступ = 2 пробела на уровень, каждая папка заканчивается слешем /.
 Корневая папка проекта: "Школа 65".
+
+Каждое обращение к папке внутри OneDrive будит клиент синхронизации, поэтому:
+- созданные папки записываются в манифест (FOLDERS_MANIFEST, рядом со скриптом, не в OneDrive)
+  вместе с хэшем структуры; structure.txt не менялся — повторный запуск ничего не трогает
+- structure.txt изменился — создаются только папки, которых нет в манифесте, в пуле потоков
+  (FOLDER_WORKERS); makedirs вызывается только для «листьев», родители создаются по пути
+- папки, убранные из structure.txt, не удаляются
+
+Запуск:
+    python create_folders_from_structure.py [--force]   # --force — проверить все папки заново
 """
 
 import os
 import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
 
 PROJECT_ROOT_NAME = "Школа 65"
-STRUCTURE_FILE = "structure.txt"
+STRUCTURE_FILE = os.getenv("STRUCTURE_FILE", "structure.txt")
+FOLDERS_MANIFEST = os.getenv("FOLDERS_MANIFEST", "folders_manifest.json")
+FOLDER_WORKERS = int(os.getenv("FOLDER_WORKERS", "8"))
 
 def find_onedrive_root() -> str:
     """Пытается найти локальную папку OneDrive в Windows по переменной окружения."""
@@ -69,7 +91,79 @@ def iter_paths_from_structure(project_root: str, filename: str):
             prev_level = level
             yield os.path.join(project_root, *names_stack)
 
+def structure_hash(paths: List[str]) -> str:
+    return hashlib.sha1("\n".join(paths).encode("utf-8")).hexdigest()
+
+def load_manifest(project_root: str) -> Dict:
+    """Запись манифеста для корня проекта: {"hash": ..., "folders": [относительные пути]}."""
+    try:
+        with open(FOLDERS_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f).get(project_root) or {}
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(project_root: str, h: str, folders: List[str]) -> None:
+    try:
+        with open(FOLDERS_MANIFEST, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[project_root] = {"hash": h, "folders": sorted(folders)}
+    tmp = FOLDERS_MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, FOLDERS_MANIFEST)
+
+def leaves(paths: List[str]) -> List[str]:
+    """Пути, не являющиеся родителем другого пути из списка: makedirs создаст родителей сам."""
+    parents = set()
+    for p in paths:
+        head = os.path.dirname(p)
+        while head and head not in parents:
+            parents.add(head)
+            head = os.path.dirname(head)
+    return [p for p in paths if p not in parents]
+
+def materialize(project_root: str, paths: List[str], force: bool = False,
+                workers: int = FOLDER_WORKERS) -> Tuple[int, int, List[Tuple[str, Exception]]]:
+    """
+    Создаёт недостающие папки из paths (абсолютные пути внутри project_root).
+    Возвращает (создано/проверено, пропущено по манифесту, ошибки).
+    """
+    rel = [os.path.relpath(p, project_root) for p in paths]
+    h = structure_hash(rel)
+    manifest = {} if force else load_manifest(project_root)
+    if manifest.get("hash") == h and os.path.isdir(project_root):
+        return 0, len(rel), []
+
+    done = set(manifest.get("folders") or [])
+    missing = [r for r in dict.fromkeys(rel) if r not in done]
+    targets = leaves(missing)
+    os.makedirs(project_root, exist_ok=True)
+
+    def make(r: str):
+        try:
+            os.makedirs(os.path.join(project_root, r), exist_ok=True)
+            return None
+        except OSError as e:
+            return r, e
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="mkdir") as pool:
+        errors = [e for e in pool.map(make, targets) if e]
+
+    created = missing
+    if errors:  # часть не создалась — в манифест только то, что реально есть на диске
+        created = [r for r in missing if os.path.isdir(os.path.join(project_root, r))]
+    wanted = set(rel)
+    # в манифест — только то, что есть в текущей структуре и действительно создано
+    save_manifest(project_root, h if not errors else "", [r for r in done | set(created) if r in wanted])
+    return len(missing), len(rel) - len(missing), errors
+
 def main():
+    ap = argparse.ArgumentParser(description="Дерево папок в OneDrive по structure.txt")
+    ap.add_argument("--force", action="store_true", help="не доверять манифесту, проверить все папки")
+    args = ap.parse_args()
+
     try:
         onedrive_root = find_onedrive_root()
     except Exception as e:
@@ -77,17 +171,22 @@ def main():
         sys.exit(1)
 
     project_root = os.path.join(onedrive_root, PROJECT_ROOT_NAME)
-    os.makedirs(project_root, exist_ok=True)
     print(f"✓ Корневая папка проекта: {project_root}")
 
-    total = 0
-    for path in iter_paths_from_structure(project_root, STRUCTURE_FILE):
-        os.makedirs(path, exist_ok=True)
-        total += 1
-        if total % 50 == 0:
-            print(f"... создано/проверено папок: {total}")
+    t0 = time.perf_counter()
+    paths = list(iter_paths_from_structure(project_root, STRUCTURE_FILE))
+    made, skipped, errors = materialize(project_root, paths, force=args.force)
+    dt = time.perf_counter() - t0
 
-    print(f"✓ Готово. Всего обработано папок: {total}")
+    for r, e in errors[:10]:
+        print(f"✗ {r}: {e}")
+    if errors:
+        print(f"✗ Не создано папок: {len(errors)} — при следующем запуске попробуем снова")
+    if not made and not errors:
+        print(f"✓ Структура не менялась, все {skipped} папок уже созданы ({dt:.2f} с)")
+        return
+    print(f"✓ Готово за {dt:.2f} с: создано/проверено {made}, уже были по манифесту {skipped} "
+          f"(потоков {FOLDER_WORKERS})")
     print("Подожди немного — OneDrive сам синхронизирует структуру в облако.")
 
 if __name__ == "__main__":
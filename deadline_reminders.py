@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Напоминания о сроках задач (колонка «Срок ( Deadline)») — сводкой в чаты Telegram.
+
+- сроки берутся из локального зеркала базы задач (notion_mirror), не из Notion: при старте — один
+  проход по файлу, дальше — только страницы из дельт зеркала (Mirror.on_change); дельты, пришедшие
+  до конца начальной загрузки, копятся и применяются поверх неё (как в task_report.TaskIndex)
+- ближайшие напоминания — в куче (heapq) по времени; JobQueue бота будит ровно к вершине кучи,
+  без опроса. Срок у задачи поменяли/закрыли — старая запись в куче не удаляется, а пропускается
+  при извлечении (сверка с текущим сроком задачи); когда мёртвых записей становится много, куча
+  пересобирается. Десятки тысяч задач — это только память под кортежи и O(log n) на изменение
+- всё, что наступает в пределах REMINDER_BATCH_S, уходит одним сообщением на чат
+- отправленные напоминания запоминаются (REMINDER_STATE): после перезапуска не повторяются,
+  а пропущенные, пока бот лежал, досылаются, если опоздание не больше REMINDER_GRACE_H
+
+Настройки:
+    REMINDER_CHATS=-1001111,-1002222:Спортзал|Корпус А   чаты; после «:» — только эти объекты
+    REMINDER_LEAD_HOURS=24,0     за сколько часов до срока напоминать (0 — в сам срок)
+    REMINDER_TIME=09:00          время для сроков без времени (только дата)
+    REMINDER_BATCH_S=60
+    REMINDER_GRACE_H=12
+    TASK_DONE_STATUSES=Done,Готово,Выполнено    статусы, по которым не напоминаем (notion_models)
+    REMINDER_STATE=reminders_sent.json
+
+Проверка на зеркале (что и когда будет отправлено):
+    python deadline_reminders.py [часов вперёд]
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from notion_models import DONE_STATUSES, P, Task, iter_tasks
+
+log = logging.getLogger("reminders")
+
+load_dotenv()
+
+REMINDER_CHATS = os.getenv("REMINDER_CHATS", "")
+REMINDER_LEAD_HOURS = [float(x) for x in os.getenv("REMINDER_LEAD_HOURS", "24,0").split(",") if x.strip()]
+REMINDER_TIME = os.getenv("REMINDER_TIME", "09:00")
+REMINDER_BATCH_S = float(os.getenv("REMINDER_BATCH_S", "60"))
+REMINDER_GRACE_H = float(os.getenv("REMINDER_GRACE_H", "12"))
+REMINDER_STATE = os.getenv("REMINDER_STATE", "reminders_sent.json")
+
+Entry = Tuple[float, int, str, float]  # (когда напомнить, seq, id страницы, за сколько часов)
+
+
+def parse_chats(spec: str) -> Dict[int, Optional[Set[str]]]:
+    """'-100111,-100222:Спортзал|Корпус А' -> {чат: объекты или None — все}."""
+    out: Dict[int, Optional[Set[str]]] = {}
+    for part in spec.split(","):
+        chat, _, objs = part.strip().partition(":")
+        if chat.strip():
+            out[int(chat)] = {o.strip() for o in objs.split("|") if o.strip()} or None
+    return out
+
+
+def deadline_ts(value: Optional[str], day_time: str = REMINDER_TIME) -> Optional[float]:
+    """Срок Notion ('2025-10-20' или ISO со временем) -> unix-время; дата без времени — day_time по местному."""
+    if not value:
+        return None
+    try:
+        if "T" not in value:
+            h, m = (int(x) for x in day_time.split(":"))
+            return datetime.strptime(value[:10], "%Y-%m-%d").replace(hour=h, minute=m).timestamp()
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class DeadlineReminders:
+    """Куча ближайших напоминаний. Потокобезопасна: дельты зеркала приходят из фонового потока offline."""
+
+    def __init__(self, chats: Dict[int, Optional[Set[str]]], leads: Iterable[float] = REMINDER_LEAD_HOURS,
+                 props_map: Optional[Dict[str, str]] = None, state_path: Optional[str] = REMINDER_STATE):
+        self.chats = chats
+        self.leads = sorted(set(leads), reverse=True)
+        self.props_map = props_map or P
+        self.state_path = state_path
+        self.heap: List[Entry] = []
+        self.tasks: Dict[str, Tuple[float, Task]] = {}  # id страницы -> (срок, задача) — только живые
+        self.sent: Dict[str, float] = self._load_state()  # "id:срок:часы" -> срок
+        self.lock = threading.Lock()
+        self._seq = 0
+        self._loading: Optional[List[dict]] = []  # дельты до/во время load(); None — загрузка прошла
+
+    # ---- состояние ----
+
+    def _load_state(self) -> Dict[str, float]:
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self) -> None:
+        if not self.state_path:
+            return
+        cutoff = time.time() - 30 * 86400  # сроки старше месяца больше не всплывут
+        with self.lock:
+            self.sent = {k: v for k, v in self.sent.items() if v >= cutoff}
+            data = dict(self.sent)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.state_path)
+
+    @staticmethod
+    def _key(page_id: str, due: float, lead: float) -> str:
+        return f"{page_id}:{int(due)}:{lead:g}"
+
+    # ---- наполнение ----
+
+    def _entries(self, task: Task, due: float, now: float) -> List[Entry]:
+        out = []
+        for lead in self.leads:
+            at = due - lead * 3600
+            if at < now - REMINDER_GRACE_H * 3600 or self._key(task.id, due, lead) in self.sent:
+                continue
+            self._seq += 1
+            out.append((at, self._seq, task.id, lead))
+        return out
+
+    def _live(self, task: Task, page: dict) -> Optional[float]:
+        if page.get("archived") or page.get("in_trash"):
+            return None
+        if (task.status or "").lower() in DONE_STATUSES:
+            return None
+        return deadline_ts(task.deadline)
+
+    def load(self, pages: Iterable[dict]) -> int:
+        """
+        Начальная загрузка (весь файл зеркала): куча строится за O(n).
+        Дельты, пришедшие до конца чтения, применяются поверх.
+        """
+        now = time.time()
+        with self.lock:
+            if self._loading is None:
+                self._loading = []
+        pages = list(pages)
+        with self.lock:
+            self.tasks.clear()
+            heap: List[Entry] = []
+            for page, task in zip(pages, iter_tasks(pages, self.props_map)):
+                due = self._live(task, page)
+                if due is None:
+                    continue
+                self.tasks[task.id] = (due, task)
+                heap += self._entries(task, due, now)
+            heapq.heapify(heap)
+            self.heap = heap
+            pending, self._loading = self._loading or [], None
+            self._apply(pending, now)
+            return len(self.tasks)
+
+    def feed(self, pages: List[dict]) -> bool:
+        """Дельта зеркала. True — вершина кучи сдвинулась раньше (надо перезапланировать пробуждение)."""
+        with self.lock:
+            if self._loading is not None:
+                self._loading.extend(pages)  # загрузка ещё не закончилась — применится в load()
+                return False
+            top = self.heap[0][0] if self.heap else None
+            self._apply(pages, time.time())
+            return bool(self.heap) and (top is None or self.heap[0][0] < top)
+
+    def _apply(self, pages: List[dict], now: float) -> None:
+        """Под self.lock."""
+        for page, task in zip(pages, iter_tasks(pages, self.props_map)):
+            due = self._live(task, page)
+            old = self.tasks.get(task.id)
+            if due is None:
+                self.tasks.pop(task.id, None)  # записи в куче отпадут при извлечении
+                continue
+            self.tasks[task.id] = (due, task)
+            if old is None or old[0] != due:
+                for e in self._entries(task, due, now):
+                    heapq.heappush(self.heap, e)
+        if len(self.heap) > 2 * len(self.tasks) * max(len(self.leads), 1) + 1000:
+            self.heap = [e for e in self.heap if self._valid(e)]
+            heapq.heapify(self.heap)
+
+    # ---- извлечение ----
+
+    def _valid(self, e: Entry) -> bool:
+        cur = self.tasks.get(e[2])
+        return cur is not None and abs(cur[0] - e[3] * 3600 - e[0]) < 1
+
+    def next_at(self) -> Optional[float]:
+        """Время ближайшего живого напоминания (мёртвые записи с вершины выбрасываются)."""
+        with self.lock:
+            while self.heap and not self._valid(self.heap[0]):
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: float) -> List[Tuple[Task, float, float]]:
+        """Всё, что наступает до now + REMINDER_BATCH_S: [(задача, срок, за сколько часов)]."""
+        out, seen = [], set()
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now + REMINDER_BATCH_S:
+                e = heapq.heappop(self.heap)
+                if not self._valid(e):
+                    continue
+                due, task = self.tasks[e[2]]
+                key = self._key(task.id, due, e[3])
+                if key in self.sent:
+                    continue
+                self.sent[key] = due
+                if task.id in seen:
+                    continue  # два порога одной задачи в одной сводке (бот лежал) — одна строка
+                seen.add(task.id)
+                out.append((task, due, e[3]))
+        return out
+
+    def digests(self, items: List[Tuple[Task, float, float]]) -> Dict[int, str]:
+        """Одно сообщение на чат: задачи по возрастанию срока."""
+        out: Dict[int, str] = {}
+        for chat, objects in self.chats.items():
+            mine = sorted((it for it in items if objects is None or (it[0].obj or "") in objects),
+                          key=lambda it: it[1])
+            if not mine:
+                continue
+            lines = ["⏰ Сроки задач:"]
+            today = datetime.now().date()
+            for task, due, lead in mine:
+                when = datetime.fromtimestamp(due)
+                day = when.strftime("%d.%m") + ("" if when.strftime("%H:%M") == REMINDER_TIME else when.strftime(" %H:%M"))
+                days = (when.date() - today).days
+                label = ("срок прошёл" if due < time.time() - REMINDER_BATCH_S else
+                         "срок сегодня" if days <= 0 else "срок завтра" if days == 1 else f"через {days} дн.")
+                code = f"{task.code} " if task.code else ""
+                obj = f" [{task.obj}]" if task.obj else ""
+                lines.append(f"• {code}{task.name or '(без названия)'}{obj} — {label} ({day})")
+            out[chat] = "\n".join(lines)
+        return out
+
+
+def start(app, mirror, chats: Dict[int, Optional[Set[str]]], props_map: Optional[Dict[str, str]] = None,
+          state_path: Optional[str] = None) -> DeadlineReminders:
+    """
+    Подключает напоминания к JobQueue бота: одна задача run_once на время вершины кучи,
+    перепланируется, когда дельта зеркала приносит срок раньше. У каждой базы задач — свой state_path.
+    """
+    rem = DeadlineReminders(chats, props_map=props_map, state_path=state_path or REMINDER_STATE)
+    job = {"job": None, "at": None}
+    loop: Dict[str, asyncio.AbstractEventLoop] = {}
+
+    def schedule() -> None:
+        at = rem.next_at()
+        if at == job["at"] and job["job"] is not None:
+            return
+        if job["job"] is not None:
+            job["job"].schedule_removal()
+            job["job"] = None
+        job["at"] = at
+        if at is not None:
+            job["job"] = app.job_queue.run_once(fire, max(at - time.time(), 0), name="deadline-reminders")
+
+    async def fire(context) -> None:
+        job["job"] = job["at"] = None
+        items = rem.pop_due(time.time())
+        for chat, text in rem.digests(items).items():
+            try:
+                await context.bot.send_message(chat_id=chat, text=text)
+            except Exception as e:  # чат недоступен — не повторяем: иначе сводка ушла бы остальным дважды
+                log.warning("Напоминание в чат %s не отправлено: %s", chat, e)
+        if items:
+            await asyncio.to_thread(rem.save_state)
+        schedule()
+
+    def on_pages(pages: List[dict]) -> None:  # поток обновления зеркала
+        # до конца init() дельты копятся в rem и применяются поверх загрузки — ничего не теряется
+        if not rem.feed(pages):
+            return
+        lp = loop.get("loop")
+        if lp is None or lp.is_closed():
+            return  # init() ещё не дошёл до schedule() — запланирует сам
+        try:
+            lp.call_soon_threadsafe(schedule)
+        except RuntimeError:  # цикл уже остановлен
+            pass
+
+    async def init(context) -> None:
+        loop["loop"] = asyncio.get_running_loop()
+        n = await asyncio.to_thread(lambda: rem.load(mirror.iter_pages()))
+        at = rem.next_at()
+        log.info("Напоминания: задач со сроком %s, ближайшее — %s", n,
+                 datetime.fromtimestamp(at).strftime("%d.%m %H:%M") if at else "нет")
+        schedule()
+
+    mirror.on_change(on_pages)
+    app.job_queue.run_once(init, 1.0, name="deadline-reminders-init")
+    return rem
+
+
+def main():
+    from notion_mirror import Mirror
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 48
+    mirror = Mirror(os.getenv("NOTION_DATABASE_ID", ""), {})
+    if not mirror.exists():
+        print("Зеркало базы задач не найдено — запусти бота или notion_mirror")
+        sys.exit(1)
+    chats = parse_chats(REMINDER_CHATS) or {0: None}
+    rem = DeadlineReminders(chats, state_path=None)
+    t0 = time.perf_counter()
+    n = rem.load(mirror.iter_pages())
+    print(f"Задач со сроком: {n}, записей в куче: {len(rem.heap)} ({(time.perf_counter() - t0) * 1000:.0f} мс)")
+    items = rem.pop_due(time.time() + hours * 3600)
+    for chat, text in rem.digests(items).items():
+        print(f"\n— чат {chat} —\n{text}")
+
+
+if __name__ == "__main__":
+    main()
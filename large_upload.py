@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Большие файлы (видео, акты, чертежи): потоком из Telegram на диск, потом в Cloudinary частями.
+
+- download(): файл пишется на диск кусками по мере скачивания — в памяти не больше одного куска;
+  недокачанный .part докачивается с места обрыва (HTTP Range)
+- upload(): загрузка частями по UPLOAD_CHUNK_MB (как cloudinary.uploader.upload_large), но с
+  продолжением: состояние (X-Unique-Upload-Id и сколько байт принято) лежит рядом с файлом в
+  <файл>.upload.json, сбой сети по части повторяется, а после падения/офлайна загрузка
+  продолжается с той же части, а не с начала
+- progress(done, total) — для сообщений пользователю; вызывается из рабочего потока
+
+Функции блокирующие — из бота их зовут через asyncio.to_thread.
+
+Настройки:
+    UPLOAD_CHUNK_MB=6       размер части (у Cloudinary не меньше 5 МБ, кроме последней)
+    UPLOAD_RETRIES=4        повторов одной части при сбое сети
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from dotenv import load_dotenv
+
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+
+log = logging.getLogger("large-upload")
+
+load_dotenv()
+
+UPLOAD_CHUNK_MB = float(os.getenv("UPLOAD_CHUNK_MB", "6"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "4"))
+
+DOWNLOAD_CHUNK = 1024 * 1024
+
+Progress = Optional[Callable[[int, int], None]]
+
+
+def retryable(e: BaseException) -> bool:
+    """Сбой сети/сервиса Cloudinary (повторять), а не отказ по существу (400/401/404...)."""
+    if isinstance(e, OSError):  # SDK пробрасывает socket.error как есть
+        return True
+    return type(e) in (cloudinary.exceptions.Error, cloudinary.exceptions.GeneralError,
+                       cloudinary.exceptions.RateLimited)
+
+
+def download(url: str, path: str, size: int = 0, progress: Progress = None, retries: int = UPLOAD_RETRIES,
+             timeout: float = 60) -> str:
+    """Скачивает url в path потоком. Обрыв — повтор с места обрыва (и в следующем вызове тоже)."""
+    for attempt in range(retries + 1):
+        try:
+            return _download_once(url, path, size, progress, timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            # в тексте ошибки requests бывает полный url, а в url Telegram — токен бота
+            log.warning("Скачивание прервалось (%s), повтор %s", type(e).__name__, attempt + 1)
+            time.sleep(min(2 ** attempt, 30))
+    return path
+
+
+def _download_once(url: str, path: str, size: int, progress: Progress, timeout: float) -> str:
+    part = path + ".part"
+    have = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={have}-"} if have else {}
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        if have and r.status_code != 206:  # сервер не умеет Range — качаем заново
+            have = 0
+        total = size or (have + int(r.headers.get("Content-Length") or 0))
+        with open(part, "ab" if have else "wb") as f:
+            for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                f.write(chunk)
+                have += len(chunk)
+                if progress:
+                    progress(have, total)
+    os.replace(part, path)
+    return path
+
+
+def _state_path(path: str) -> str:
+    return path + ".upload.json"
+
+
+def _load_state(path: str) -> Dict[str, Any]:
+    try:
+        with open(_state_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    tmp = _state_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(path))
+
+
+def pending(path: str) -> int:
+    """Сколько байт файла уже принято Cloudinary по незавершённой загрузке (0 — не начиналась)."""
+    return int(_load_state(path).get("offset", 0))
+
+
+def forget(path: str) -> None:
+    """Удаляет состояние незавершённой загрузки — файл больше не будем догружать."""
+    try:
+        os.remove(_state_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def upload(path: str, progress: Progress = None, chunk_mb: float = UPLOAD_CHUNK_MB,
+           retries: int = UPLOAD_RETRIES, **options: Any) -> dict:
+    """
+    Загрузка файла в Cloudinary частями с продолжением. options — как у cloudinary.uploader.upload
+    (folder, public_id, resource_type...). Возвращает ответ Cloudinary по последней части.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return cloudinary.uploader.upload(path, **options)
+    chunk_size = max(int(chunk_mb * 1024 * 1024), 5 * 1024 * 1024)
+    options.setdefault("resource_type", "raw")
+    name = options.pop("filename", os.path.basename(path))
+
+    state = _load_state(path)
+    if state.get("size") != size:
+        state = {"upload_id": cloudinary.utils.random_public_id(), "offset": 0, "size": size}
+    elif state["offset"]:
+        log.info("%s: продолжаем загрузку с %.1f МБ из %.1f", name, state["offset"] / 2**20, size / 2**20)
+    if state.get("public_id"):
+        options["public_id"] = state["public_id"]
+
+    with open(path, "rb") as f:
+        f.seek(state["offset"])
+        while True:
+            chunk = f.read(chunk_size)
+            start = state["offset"]
+            end = start + len(chunk) - 1
+            headers = {"Content-Range": f"bytes {start}-{end}/{size}", "X-Unique-Upload-Id": state["upload_id"]}
+            for attempt in range(retries + 1):
+                try:
+                    res = cloudinary.uploader.upload_large_part((name, chunk), http_headers=headers, **options)
+                    break
+                except Exception as e:
+                    if not retryable(e) or attempt == retries:
+                        _save_state(path, state)  # следующий вызов продолжит с этой части
+                        raise
+                    log.warning("%s: часть %s-%s не ушла (%s), повтор %s", name, start, end, e, attempt + 1)
+                    time.sleep(min(2 ** attempt, 30))
+            state["offset"] = end + 1
+            if res.get("public_id") and not options.get("public_id"):
+                options["public_id"] = state["public_id"] = res["public_id"]
+            if progress:
+                progress(state["offset"], size)
+            if state["offset"] >= size:
+                forget(path)
+                return res
+            _save_state(path, state)
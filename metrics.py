@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики горячих путей ботов в формате Prometheus (без внешних зависимостей).
+
+Что собираем:
+- pf_http_request_seconds{service,endpoint}         — гистограмма задержек Notion/Cloudinary по эндпоинтам
+- pf_http_responses_total{service,endpoint,code}    — ответы по кодам
+- pf_http_retries_total{service,reason}              — ретраи (429 / 5xx / network)
+- pf_http_throttled_total{service}                   — все ответы 429
+- pf_handler_seconds{bot,handler,state}              — длительность хендлеров Telegram по состояниям диалогов
+- pf_handler_errors_total{bot,handler}               — исключения в хендлерах
+- pf_inflight{kind}                                  — запросы/загрузки «в полёте»
+- pf_queue_depth{queue}                              — глубина очередей (опрашивается при выдаче)
+
+Выдача: GET http://127.0.0.1:METRICS_PORT/metrics (METRICS_PORT=0 — не поднимать),
+и сводка текстом для админ-команды /stats.
+"""
+
+import os
+import re
+import time
+import bisect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import offline
+
+log = logging.getLogger("metrics")
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", "0"))  # 0 — /stats никому не отвечает
+
+# секунды: от быстрых ответов Notion до медленных загрузок фото
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_STARTED = time.time()
+_lock = threading.Lock()
+
+# чат апдейта, который сейчас обрабатывается (ставит track): очередь записей запоминает, кому
+# сообщить, если запись так и не дойдёт до Notion
+origin_chat: contextvars.ContextVar = contextvars.ContextVar("pf_origin_chat", default=None)
+
+
+def current_chat() -> Optional[int]:
+    return origin_chat.get()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**kw) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_: str):
+        self.name, self.help = name, help_
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, n: float = 1, **labels) -> None:
+        key = _labels(**labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for key, v in list(self.values.items()):
+            yield self.name, key, v
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_: str):
+        self.name, self.help = name, help_
+        self.values: Dict[Labels, float] = {}
+        self.functions: Dict[Labels, Callable[[], float]] = {}
+
+    def add(self, n: float = 1, **labels) -> None:
+        key = _labels(**labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def set(self, v: float, **labels) -> None:
+        with _lock:
+            self.values[_labels(**labels)] = v
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """Значение снимается в момент выдачи (например, размер очереди)."""
+        with _lock:
+            self.functions[_labels(**labels)] = fn
+
+    def get(self, **labels) -> float:
+        key = _labels(**labels)
+        fn = self.functions.get(key)
+        if fn is not None:
+            try:
+                return float(fn())
+            except Exception:
+                return float("nan")
+        return self.values.get(key, 0)
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for key, v in list(self.values.items()):
+            yield self.name, key, v
+        for key in list(self.functions):
+            yield self.name, key, self.get(**dict(key))
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.name, self.help = name, help_
+        self.buckets = buckets
+        self.values: Dict[Labels, List[float]] = {}  # [по корзинам..., +Inf, sum]
+
+    def observe(self, seconds: float, **labels) -> None:
+        key = _labels(**labels)
+        i = bisect.bisect_left(self.buckets, seconds)
+        with _lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += seconds
+
+    def count(self, key: Labels) -> int:
+        return int(sum(self.values[key][:-1]))
+
+    def quantile(self, q: float, key: Labels) -> float:
+        """Оценка квантиля по корзинам (линейно внутри корзины) — как histogram_quantile в Prometheus."""
+        row = self.values.get(key)
+        if not row:
+            return 0.0
+        total = sum(row[:-1])
+        rank = q * total
+        acc, lower = 0.0, 0.0
+        for i, upper in enumerate(self.buckets):
+            if acc + row[i] >= rank and row[i]:
+                return lower + (upper - lower) * (rank - acc) / row[i]
+            acc += row[i]
+            lower = upper
+        return self.buckets[-1]
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for key, row in list(self.values.items()):
+            acc = 0.0
+            for upper, n in zip(self.buckets, row):
+                acc += n
+                yield self.name + "_bucket", key + (("le", f"{upper:g}"),), acc
+            acc += row[len(self.buckets)]
+            yield self.name + "_bucket", key + (("le", "+Inf"),), acc
+            yield self.name + "_sum", key, row[-1]
+            yield self.name + "_count", key, acc
+
+
+HTTP_SECONDS = Histogram("pf_http_request_seconds", "Задержка HTTP-запроса к внешнему API")
+HTTP_RESPONSES = Counter("pf_http_responses_total", "Ответы внешних API по кодам")
+HTTP_RETRIES = Counter("pf_http_retries_total", "Повторы запросов к внешним API")
+HTTP_THROTTLED = Counter("pf_http_throttled_total", "Ответы 429 от внешних API")
+HANDLER_SECONDS = Histogram("pf_handler_seconds", "Длительность хендлера Telegram")
+HANDLER_ERRORS = Counter("pf_handler_errors_total", "Исключения в хендлерах Telegram")
+INFLIGHT = Gauge("pf_inflight", "Операции в процессе выполнения")
+QUEUE_DEPTH = Gauge("pf_queue_depth", "Глубина очередей")
+
+REGISTRY = (HTTP_SECONDS, HTTP_RESPONSES, HTTP_RETRIES, HTTP_THROTTLED,
+            HANDLER_SECONDS, HANDLER_ERRORS, INFLIGHT, QUEUE_DEPTH)
+
+
+# ---- запись ----
+
+_ID_RE = re.compile(r"/[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}(?=/|$)")
+
+
+def endpoint(method: str, url: str) -> str:
+    """'POST https://api.notion.com/v1/databases/<id>/query?...' -> 'POST /databases/{id}/query'."""
+    path = re.sub(r"^[a-z]+://[^/]+", "", url).split("?", 1)[0]
+    path = re.sub(r"^/v1(?=/)", "", path)
+    return f"{method.upper()} {_ID_RE.sub('/{id}', path)}"
+
+
+def observe_http(service: str, method: str, url: str, seconds: float, code: Optional[int]) -> None:
+    ep = endpoint(method, url)
+    HTTP_SECONDS.observe(seconds, service=service, endpoint=ep)
+    HTTP_RESPONSES.inc(service=service, endpoint=ep, code=code if code is not None else "error")
+    if code == 429:
+        HTTP_THROTTLED.inc(service=service)
+
+
+def retry(service: str, reason: str) -> None:
+    HTTP_RETRIES.inc(service=service, reason=reason)
+
+
+@contextmanager
+def timed(service: str, operation: str, inflight: Optional[str] = None):
+    """Замер вызова SDK (Cloudinary и т.п.): задержка, код ok/error и счётчик «в полёте»."""
+    if inflight:
+        INFLIGHT.add(1, kind=inflight)
+    t0 = time.perf_counter()
+    code: object = "ok"
+    try:
+        yield
+    except Exception:
+        code = "error"
+        raise
+    finally:
+        ep = operation
+        HTTP_SECONDS.observe(time.perf_counter() - t0, service=service, endpoint=ep)
+        HTTP_RESPONSES.inc(service=service, endpoint=ep, code=code)
+        if inflight:
+            INFLIGHT.add(-1, kind=inflight)
+
+
+def track(fn: Callable, bot: str, state: str = "-") -> Callable:
+    """Оборачивает async-хендлер: длительность по (бот, хендлер, состояние диалога) и ошибки."""
+    if getattr(fn, "_pf_tracked", False):
+        return fn
+    name = getattr(fn, "__name__", "handler")
+
+    @functools.wraps(fn)
+    async def wrapper(update, context):
+        t0 = time.perf_counter()
+        chat = getattr(update, "effective_chat", None)
+        token = origin_chat.set(chat.id if chat else None)
+        try:
+            return await fn(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(bot=bot, handler=name)
+            raise
+        finally:
+            origin_chat.reset(token)
+            HANDLER_SECONDS.observe(time.perf_counter() - t0, bot=bot, handler=name, state=state)
+
+    wrapper._pf_tracked = True
+    return wrapper
+
+
+def instrument_application(app, bot: str) -> None:
+    """
+    Оборачивает все уже зарегистрированные хендлеры приложения (включая состояния ConversationHandler)
+    и добавляет глубину очереди апдейтов. Вызывать в main() после add_handler(...).
+    """
+    from telegram.ext import ConversationHandler
+
+    def wrap(handler, state: str) -> None:
+        if isinstance(handler, ConversationHandler):
+            for h in handler.entry_points:
+                wrap(h, "entry")
+            for st, hs in handler.states.items():
+                for h in hs:
+                    wrap(h, str(st))
+            for h in handler.fallbacks:
+                wrap(h, "fallback")
+        elif hasattr(handler, "callback"):
+            handler.callback = track(handler.callback, bot, state)
+
+    for handlers in app.handlers.values():
+        for h in handlers:
+            wrap(h, "-")
+    QUEUE_DEPTH.set_function(app.update_queue.qsize, queue=f"{bot}:updates")
+
+
+# ---- выдача ----
+
+def render() -> str:
+    """Текст в формате Prometheus exposition 0.0.4."""
+    out: List[str] = []
+    for m in REGISTRY:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        for name, labels, v in m.samples():
+            out.append(f"{name}{_fmt_labels(labels)} {v:g}")
+    out.append("# HELP pf_uptime_seconds Время работы процесса")
+    out.append("# TYPE pf_uptime_seconds gauge")
+    out.append(f"pf_uptime_seconds {time.time() - _STARTED:.0f}")
+    return "\n".join(out) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Поднимает /metrics в фоновом потоке (один раз на процесс). port=0 — выключено."""
+    global _server
+    if _server is not None or not port:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        log.warning("metrics: не удалось занять %s:%s (%s)", host, port, e)
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+    log.info("metrics: http://%s:%s/metrics", host, port)
+    return _server
+
+
+def summary(top: int = 8) -> str:
+    """Короткая сводка для /stats: где уходит время."""
+    lines = [f"⏱ Аптайм: {(time.time() - _STARTED) / 3600:.1f} ч; {offline.status_text()}"]
+
+    rows = sorted(HTTP_SECONDS.values, key=lambda k: -HTTP_SECONDS.count(k))[:top]
+    if rows:
+        lines.append("\nВнешние API (запросов · p50 · p95):")
+        for key in rows:
+            d = dict(key)
+            lines.append(f"  {d['service']} {d['endpoint']}: {HTTP_SECONDS.count(key)} · "
+                         f"{HTTP_SECONDS.quantile(0.5, key):.2f} с · {HTTP_SECONDS.quantile(0.95, key):.2f} с")
+
+    retries: Dict[str, float] = {}
+    for key, v in HTTP_RETRIES.values.items():
+        d = dict(key)
+        retries[f"{d['service']}/{d['reason']}"] = v
+    throttled = sum(HTTP_THROTTLED.values.values())
+    lines.append(f"\nРетраи: {', '.join(f'{k}: {v:g}' for k, v in sorted(retries.items())) or '0'}; 429: {throttled:g}")
+
+    rows = sorted(HANDLER_SECONDS.values, key=lambda k: -HANDLER_SECONDS.quantile(0.95, k))[:top]
+    if rows:
+        lines.append("\nХендлеры (вызовов · p50 · p95):")
+        for key in rows:
+            d = dict(key)
+            lines.append(f"  {d['handler']} [{d['state']}]: {HANDLER_SECONDS.count(key)} · "
+                         f"{HANDLER_SECONDS.quantile(0.5, key):.2f} с · {HANDLER_SECONDS.quantile(0.95, key):.2f} с")
+    errors = sum(HANDLER_ERRORS.values.values())
+    if errors:
+        lines.append(f"Ошибок в хендлерах: {errors:g}")
+
+    gauges = [(f"{dict(k)['kind']}", INFLIGHT.get(**dict(k))) for k in list(INFLIGHT.values)]
+    gauges += [(f"очередь {dict(k)['queue']}", QUEUE_DEPTH.get(**dict(k)))
+               for k in list(QUEUE_DEPTH.values) + list(QUEUE_DEPTH.functions)]
+    if gauges:
+        lines.append("\nСейчас: " + ", ".join(f"{n}: {v:g}" for n, v in gauges))
+
+    import notion_outbox  # здесь, а не наверху: notion_outbox сам импортирует metrics
+    boxes = notion_outbox.all_outboxes()
+    if boxes:
+        lines.append("\nОчереди Notion (ждут · не записано · конфликтов):")
+        for ob in boxes:
+            lines.append(f"  {ob.name}: {ob.count('pending')} · {ob.count('failed')} · {ob.count('conflict')}")
+    return "\n".join(lines)
+
+
+async def cmd_stats(update, context):
+    """/stats — сводка метрик, только в чате ADMIN_CHAT_ID (не задан — команда выключена)."""
+    chat = update.effective_chat
+    if not ADMIN_CHAT_ID or chat is None or chat.id != ADMIN_CHAT_ID:
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+    await update.message.reply_text(summary())
@@ -3,9 +3,13 @@
 # Вход: tasks_to_add.txt — по одной задаче в строке. Формат:
 #  "Название задачи"   или   "Название задачи @Объект"
 
-import os, re, json, sys
+import os, re, sys, argparse
 from dotenv import load_dotenv
-import requests
+
+import notion_http
+import notion_plan
+from notion_mirror import Mirror
+from notion_models import P, iter_tasks
 
 load_dotenv()
 
@@ -18,6 +22,8 @@ P_NAME     = os.getenv("PROP_NAME", "Название задачи")
 P_STATUS   = os.getenv("PROP_STATUS", "Статус")
 P_OBJECT   = os.getenv("PROP_OBJECT", "Объект")  # Select
 
+PROPS_MAP = dict(P, TITLE_ID=P_TITLE_ID, NAME=P_NAME, STATUS=P_STATUS, OBJECT=P_OBJECT)
+
 HEAD = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
     "Notion-Version": "2022-06-28",
@@ -27,6 +33,9 @@ HEAD = {
 INPUT_FILE = "tasks_to_add.txt"
 DEFAULT_STATUS = "Not started"
 
+# Лимит Notion: не больше 100 условий в одном составном фильтре
+OR_CHUNK = 100
+
 def norm(s: str) -> str:
     return re.sub(r"\s+", " ", s or "").strip().lower()
 
@@ -45,68 +54,47 @@ def parse_line(line: str):
         return name, obj
     return raw, None
 
-def notion_paginate(url: str, payload: dict):
-    """Итератор по всем страницам результатов /query."""
-    start_cursor = None
-    while True:
-        body = dict(payload)
-        if start_cursor:
-            body["start_cursor"] = start_cursor
-        r = requests.post(url, headers=HEAD, data=json.dumps(body))
-        r.raise_for_status()
-        data = r.json()
-        for item in data.get("results", []):
-            yield item
-        if not data.get("has_more"):
-            break
-        start_cursor = data.get("next_cursor")
-
-def fetch_existing_pairs_and_max():
-    """Возвращает (set((name_norm, object_norm)), max_intel_number)."""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    payload = {
-        "page_size": 100,
-        "filter": {"property": P_STATUS, "status": {"does_not_equal": ""}},  # просто любой запрос
-        "sorts": [{"property": P_TITLE_ID, "direction": "ascending"}],
-    }
+def existing_pairs_and_max(pages):
+    """По страницам базы возвращает (set((name_norm, object_norm)), max_intel_number)."""
     pairs = set()
     max_no = 0
 
-    # Если базы многостраничные — заберём все
-    for page in notion_paginate(url, payload):
-        props = page.get("properties", {})
-        # ID (текст)
-        tval = ""
-        tarr = props.get(P_TITLE_ID, {}).get("title", [])
-        if tarr:
-            tval = tarr[0].get("plain_text") or tarr[0].get("text", {}).get("content", "")
-
-        m = re.search(r"INTEL-(\d+)", tval or "")
+    for task in iter_tasks(pages, PROPS_MAP):
+        m = re.search(r"INTEL-(\d+)", task.code or "")
         if m:
-            try:
-                n = int(m.group(1))
-                if n > max_no:
-                    max_no = n
-            except:
-                pass
-
-        # Название
-        name = ""
-        narr = props.get(P_NAME, {}).get("rich_text", [])
-        if narr:
-            name = narr[0].get("plain_text") or narr[0].get("text", {}).get("content", "")
-
-        # Объект (select)
-        obj_name = ""
-        sel = props.get(P_OBJECT, {}).get("select")
-        if isinstance(sel, dict):
-            obj_name = sel.get("name") or ""
-
-        pairs.add((norm(name), norm(obj_name)))
+            n = int(m.group(1))
+            if n > max_no:
+                max_no = n
+
+        pairs.add((norm(task.name), norm(task.obj)))
 
     return pairs, max_no
 
-def create_page(next_no: int, name: str, obj: str|None):
+def fetch_existing_pairs_and_max(items):
+    """
+    Возвращает (set((name_norm, object_norm)), max_intel_number), не выкачивая всю базу:
+    - дубли ищем только среди кандидатов из файла: пачки `or`-фильтров по «Название задачи»
+      (contains — как и norm(), без учёта регистра; точное сравнение делаем локально);
+    - в ответе только нужные колонки (filter_properties);
+    - max INTEL — полный постраничный обход страниц с Title «INTEL-…», но только с колонкой Title:
+      сортировка Notion по Title строковая («INTEL-999» выше «INTEL-1000»), а последние созданные —
+      не обязательно последние по номеру (импорт старых задач), так что выборка «первые 100» врёт.
+    Трафик на дубли зависит от размера входного файла; на номер — одна колонка по задачам INTEL.
+    """
+    names = list(dict.fromkeys(name.strip() for name, _ in items if name.strip()))
+    pages = []
+    for i in range(0, len(names), OR_CHUNK):
+        chunk = names[i:i + OR_CHUNK]
+        payload = {"filter": {"or": [{"property": P_NAME, "rich_text": {"contains": n}} for n in chunk]}}
+        pages.extend(notion_http.iter_query(DATABASE_ID, HEAD, payload, filter_properties=[P_NAME, P_OBJECT]))
+    pairs, _ = existing_pairs_and_max(pages)
+
+    intel = {"property": P_TITLE_ID, "title": {"starts_with": "INTEL-"}}
+    _, max_no = existing_pairs_and_max(notion_http.iter_query(DATABASE_ID, HEAD, {"filter": intel},
+                                                              filter_properties=[P_TITLE_ID]))
+    return pairs, max_no
+
+def page_payload(next_no: int, name: str, obj: str|None) -> dict:
     intel_id = f"INTEL-{next_no:03d}"
     properties = {
         P_TITLE_ID: {"title": [{"text": {"content": intel_id}}]},
@@ -116,19 +104,18 @@ def create_page(next_no: int, name: str, obj: str|None):
     if obj:
         properties[P_OBJECT] = {"select": {"name": obj}}
 
-    payload = {
+    return {
         "parent": {"database_id": DATABASE_ID},
         "properties": properties,
     }
-    r = requests.post("https://api.notion.com/v1/pages", headers=HEAD, data=json.dumps(payload))
-    return r
 
-def main():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Не найден файл ввода: {INPUT_FILE}")
-        sys.exit(1)
+def create_page(next_no: int, name: str, obj: str|None):
+    payload = page_payload(next_no, name, obj)
+    r = notion_http.request("POST", f"{notion_http.API}/pages", HEAD, payload)
+    return r
 
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+def read_items(path: str):
+    with open(path, "r", encoding="utf-8") as f:
         lines = [ln.strip() for ln in f if ln.strip()]
 
     # Парсим
@@ -137,21 +124,28 @@ def main():
         name, obj = parse_line(ln)
         if name:
             items.append((name, obj))
+    return items
 
-    existing_pairs, max_intel = fetch_existing_pairs_and_max()
-
-    print(f"Разрешённый статус по умолчанию: {DEFAULT_STATUS}")
-    print(f"Файл ввода: {INPUT_FILE}")
-    print(f"В базе найдено: max INTEL = {max_intel:03d}, уникальных по (Название+Объект) = {len(existing_pairs)}")
-
+def split_new_items(items, existing_pairs):
+    """Возвращает (to_add, skipped): дубли по (Название+Объект) отбрасываем, в т.ч. внутри файла."""
+    seen = set(existing_pairs)
     to_add = []
     skipped = 0
     for name, obj in items:
         key = (norm(name), norm(obj or ""))
-        if key in existing_pairs:
+        if key in seen:
             skipped += 1
             continue
+        seen.add(key)
         to_add.append((name, obj))
+    return to_add, skipped
+
+def add_items(items):
+    """Проверка дублей и создание страниц для новых (name, obj). Возвращает (успешно, с ошибками)."""
+    existing_pairs, max_intel = fetch_existing_pairs_and_max(items)
+    print(f"В базе найдено: max INTEL = {max_intel:03d}, совпадений по (Название+Объект) с файлом = {len(existing_pairs)}")
+
+    to_add, skipped = split_new_items(items, existing_pairs)
 
     print(f"Буду добавлять {len(to_add)} строк(и); пропущено дублей: {skipped}\n")
 
@@ -170,6 +164,62 @@ def main():
         else:
             print(f"  × Ошибка: {r.status_code} {r.text}")
             err += 1
+    return ok, err
+
+def plan(plan_path: str):
+    """--plan: считаем операции по локальному зеркалу и сохраняем план, ничего не записывая."""
+    items = read_items(INPUT_FILE)
+    mirror = Mirror(DATABASE_ID, HEAD)
+    stats = notion_http.Stats()
+    received = mirror.sync(stats=stats)
+    existing_pairs, max_intel = existing_pairs_and_max(mirror.iter_pages())
+    to_add, skipped = split_new_items(items, existing_pairs)
+
+    ops = []
+    next_no = max_intel
+    for name, obj in to_add:
+        next_no += 1
+        suffix = f" @{obj}" if obj else ""
+        ops.append(notion_plan.op("POST", "/pages", page_payload(next_no, name, obj),
+                                  f"INTEL-{next_no:03d} — «{name}{suffix}»"))
+
+    p = notion_plan.save(plan_path, "notion_bulk_add", DATABASE_ID, ops, workers=1, extra_calls=stats.requests)
+    print(f"Зеркало обновлено (получено страниц: {received}); max INTEL = {max_intel:03d}")
+    print(f"К добавлению: {len(to_add)}; пропущено дублей: {skipped}")
+    print(notion_plan.summary(p))
+    print(f"План сохранён: {plan_path}. Выполнить: python notion_bulk_add.py --apply {plan_path}")
+
+def apply(plan_path: str):
+    """--apply: выполняем сохранённый план без пересчёта."""
+    p = notion_plan.load(plan_path, "notion_bulk_add")
+    print(notion_plan.summary(p))
+    ok, err, stats = notion_plan.apply(p, HEAD)
+    print(f"\n— Готово. Успешно: {ok}, с ошибками: {err}")
+    print(stats.report(ok))
+
+def main():
+    ap = argparse.ArgumentParser(description="Пакетное добавление задач в Notion из tasks_to_add.txt")
+    ap.add_argument("--plan", metavar="PLAN.json", help="Только посчитать операции и сохранить план")
+    ap.add_argument("--apply", metavar="PLAN.json", help="Выполнить сохранённый план")
+    args = ap.parse_args()
+
+    if args.apply:
+        apply(args.apply)
+        return
+
+    if not os.path.exists(INPUT_FILE):
+        print(f"Не найден файл ввода: {INPUT_FILE}")
+        sys.exit(1)
+
+    if args.plan:
+        plan(args.plan)
+        return
+
+    items = read_items(INPUT_FILE)
+
+    print(f"Разрешённый статус по умолчанию: {DEFAULT_STATUS}")
+    print(f"Файл ввода: {INPUT_FILE}")
+    ok, err = add_items(items)
 
     print(f"\n— Готово. Успешно: {ok}, с ошибками: {err}")
     print("Напоминание: очисти tasks_to_add.txt, чтобы не отправить повторно.")
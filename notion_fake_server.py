@@ -0,0 +1,1032 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный стенд вместо Notion, Cloudinary и OneDrive — нагрузочные прогоны без расхода квоты.
+
+Notion (база URL — NOTION_API_BASE=http://127.0.0.1:8787/v1):
+  POST  /v1/databases/{id}/query   — filter (and/or, свойства, timestamp), sorts, курсоры, filter_properties
+  GET   /v1/databases/{id}         — схема
+  PATCH /v1/databases/{id}         — изменение свойств (опции select/status)
+  POST  /v1/pages                  — создание строки (неизвестные колонки и опции select добавляются в схему)
+  GET   /v1/pages/{id}
+  PATCH /v1/pages/{id}             — properties / archived
+
+Cloudinary (CLOUD_API_BASE=http://127.0.0.1:8787):
+  POST  /v1_1/{cloud}/{image|video|raw|auto}/upload   (и по частям: Content-Range + X-Unique-Upload-Id)
+  POST  /v1_1/{cloud}/folders/{path}
+
+Microsoft Graph, OneDrive (GRAPH_API_BASE=http://127.0.0.1:8787/v1.0):
+  POST  /v1.0/$batch                                — до 20 запросов, каждый отвечает своим статусом
+  POST  /v1.0/me/drive/items/{id}/children          — папка; conflictBehavior fail | rename | replace
+  GET   /v1.0/me/drive/items/{id}:/{path}:          — элемент по пути от папки
+  GET   /v1.0/me/drive/items/{id}/children
+
+Настройки стенда: задержка ответа (+ случайный разброс), лимит частоты с ответом 429 и Retry-After,
+случайные 429 с заданной вероятностью. Данные хранятся в SQLite и переживают перезапуск;
+базу можно засеять записанным зеркалом (notion_mirror: mirror/<id>.jsonl + .meta.json).
+
+Запуск:
+    python notion_fake_server.py --latency 0.3 --rps 3
+    python notion_fake_server.py --seed mirror/<database_id>.jsonl
+    python notion_fake_server.py --reset
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import notion_http
+from notion_models import prop_value
+
+FAKE_HOST = os.getenv("FAKE_HOST", "127.0.0.1")
+FAKE_PORT = int(os.getenv("FAKE_PORT", "8787"))
+FAKE_STORE = os.getenv("FAKE_STORE", "fake_store.sqlite")
+
+MAX_PAGE_SIZE = 100
+
+_ANNOTATIONS = {"bold": False, "italic": False, "strikethrough": False,
+                "underline": False, "code": False, "color": "default"}
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _short_id() -> str:
+    return uuid.uuid4().hex[:4]
+
+
+class ApiError(Exception):
+    """Ошибка в формате Notion: {"object": "error", "status": ..., "code": ..., "message": ...}."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+# ============================================================
+# Хранилище
+# ============================================================
+
+class FakeStore:
+    """
+    Страницы и схемы держим в памяти (запросы фильтруются на лету),
+    каждую запись сразу пишем в SQLite — после перезапуска данные на месте.
+    """
+
+    def __init__(self, path: str = FAKE_STORE):
+        self.path = path
+        self.lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS databases (id TEXT PRIMARY KEY, data BLOB);
+            CREATE TABLE IF NOT EXISTS pages (id TEXT PRIMARY KEY, database_id TEXT, seq INTEGER, data BLOB);
+            CREATE TABLE IF NOT EXISTS assets (public_id TEXT PRIMARY KEY, data BLOB);
+            CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS drive_items (id TEXT PRIMARY KEY, parent TEXT, name TEXT);
+            """
+        )
+        self.databases: Dict[str, dict] = {}
+        self.pages: Dict[str, dict] = {}
+        self.order: Dict[str, List[str]] = {}  # database_id -> id страниц в порядке создания
+        self._seq = 0
+        for db_id, data in self._db.execute("SELECT id, data FROM databases"):
+            self.databases[db_id] = notion_http.loads(data)
+        for pid, db_id, seq, data in self._db.execute("SELECT id, database_id, seq, data FROM pages ORDER BY seq"):
+            self.pages[pid] = notion_http.loads(data)
+            self.order.setdefault(db_id, []).append(pid)
+            self._seq = max(self._seq, seq)
+
+    def reset(self) -> None:
+        with self.lock:
+            for table in ("databases", "pages", "assets", "folders", "drive_items"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.commit()
+            self.databases.clear()
+            self.pages.clear()
+            self.order.clear()
+            self._seq = 0
+
+    # ---- базы ----
+
+    def database(self, db_id: str, create: bool = False) -> dict:
+        key = _norm_id(db_id)
+        with self.lock:
+            db = self.databases.get(key)
+            if db is None:
+                if not create:
+                    raise ApiError(404, "object_not_found", f"Could not find database with ID: {db_id}.")
+                now = _now_iso()
+                db = {"object": "database", "id": key, "created_time": now, "last_edited_time": now,
+                      "title": [_text_item("Fake database")], "properties": {}}
+                self.save_database(db)
+            return db
+
+    def save_database(self, db: dict) -> None:
+        with self.lock:
+            self.databases[db["id"]] = db
+            self._db.execute("INSERT OR REPLACE INTO databases VALUES (?, ?)", (db["id"], notion_http.dumps(db)))
+            self._db.commit()
+
+    # ---- страницы ----
+
+    def page(self, page_id: str) -> dict:
+        page = self.pages.get(_norm_id(page_id))
+        if page is None:
+            raise ApiError(404, "object_not_found", f"Could not find page with ID: {page_id}.")
+        return page
+
+    def save_page(self, page: dict, commit: bool = True) -> None:
+        db_id = page["parent"]["database_id"]
+        with self.lock:
+            if page["id"] not in self.pages:
+                self._seq += 1
+                self.order.setdefault(db_id, []).append(page["id"])
+            self.pages[page["id"]] = page
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, COALESCE((SELECT seq FROM pages WHERE id = ?), ?), ?)",
+                (page["id"], db_id, page["id"], self._seq, notion_http.dumps(page)),
+            )
+            if commit:
+                self._db.commit()
+
+    def commit(self) -> None:
+        with self.lock:
+            self._db.commit()
+
+    def database_pages(self, db_id: str) -> List[dict]:
+        with self.lock:
+            ids = list(self.order.get(_norm_id(db_id), []))
+        return [self.pages[i] for i in ids]
+
+    # ---- Cloudinary ----
+
+    def save_asset(self, asset: dict) -> None:
+        with self.lock:
+            self._db.execute("INSERT OR REPLACE INTO assets VALUES (?, ?)", (asset["public_id"], notion_http.dumps(asset)))
+            self._db.commit()
+
+    def add_folder(self, path: str) -> bool:
+        with self.lock:
+            cur = self._db.execute("INSERT OR IGNORE INTO folders VALUES (?)", (path,))
+            self._db.commit()
+            return cur.rowcount > 0
+
+    # ---- OneDrive ----
+
+    def drive_child(self, parent: str, name: str) -> Optional[str]:
+        """id элемента name в папке parent (имена в OneDrive без учёта регистра)."""
+        with self.lock:
+            row = self._db.execute("SELECT id FROM drive_items WHERE parent = ? AND name = ? COLLATE NOCASE",
+                                   (parent, name)).fetchone()
+        return row[0] if row else None
+
+    def drive_exists(self, item_id: str) -> bool:
+        if item_id == "root":
+            return True
+        with self.lock:
+            return self._db.execute("SELECT 1 FROM drive_items WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def drive_children(self, parent: str) -> List[Tuple[str, str]]:
+        with self.lock:
+            return self._db.execute("SELECT id, name FROM drive_items WHERE parent = ? ORDER BY name",
+                                    (parent,)).fetchall()
+
+    def add_drive_item(self, parent: str, name: str) -> str:
+        item_id = uuid.uuid4().hex[:16].upper()
+        with self.lock:
+            self._db.execute("INSERT INTO drive_items VALUES (?, ?, ?)", (item_id, parent, name))
+            self._db.commit()
+        return item_id
+
+
+def _norm_id(value: str) -> str:
+    """Notion принимает id и с дефисами, и без — храним в каноническом виде с дефисами."""
+    raw = value.replace("-", "")
+    if len(raw) == 32 and re.fullmatch(r"[0-9a-fA-F]{32}", raw):
+        return str(uuid.UUID(raw))
+    return value
+
+
+# ============================================================
+# Свойства: формат записи -> формат чтения
+# ============================================================
+
+_WRITE_KINDS = ("title", "rich_text", "select", "status", "multi_select", "date", "url", "number",
+                "checkbox", "email", "phone_number", "files", "relation", "people")
+
+
+def _text_item(content: str) -> dict:
+    return {"type": "text", "text": {"content": content, "link": None},
+            "annotations": dict(_ANNOTATIONS), "plain_text": content, "href": None}
+
+
+def _prop_kind(value: dict) -> str:
+    kind = value.get("type")
+    if kind:
+        return kind
+    for k in _WRITE_KINDS:
+        if k in value:
+            return k
+    raise ApiError(400, "validation_error", f"Unsupported property value: {list(value)}")
+
+
+def _schema_prop(db: dict, name: str, kind: str) -> dict:
+    """Колонка схемы; неизвестную создаём (удобно для пустого стенда)."""
+    props = db["properties"]
+    meta = props.get(name)
+    if meta is None:
+        pid = "title" if kind == "title" else _short_id()
+        meta = props[name] = {"id": pid, "name": name, "type": kind, kind: {}}
+        if kind in ("select", "status", "multi_select"):
+            meta[kind] = {"options": []}
+    elif meta["type"] != kind:
+        raise ApiError(400, "validation_error", f"{name} is expected to be {meta['type']}.")
+    return meta
+
+
+def _option(meta: dict, name: str, strict: bool) -> dict:
+    options = meta[meta["type"]].setdefault("options", [])
+    for o in options:
+        if o["name"] == name:
+            return {"id": o["id"], "name": o["name"], "color": o.get("color", "default")}
+    if strict and options:
+        raise ApiError(400, "validation_error", f"Invalid status option. Status option \"{name}\" does not exist.")
+    o = {"id": _short_id(), "name": name, "color": "default"}
+    options.append(o)
+    return dict(o)
+
+
+def _read_value(kind: str, value: Any, meta: dict) -> Any:
+    if kind in ("title", "rich_text"):
+        out = []
+        for item in value or []:
+            content = item.get("plain_text") or item.get("text", {}).get("content", "")
+            out.append(_text_item(content))
+        return out
+    if kind in ("select", "status"):
+        if not value:
+            return None
+        return _option(meta, value["name"], strict=(kind == "status"))
+    if kind == "multi_select":
+        return [_option(meta, v["name"], strict=False) for v in value or []]
+    if kind == "date":
+        if not value:
+            return None
+        return {"start": value.get("start"), "end": value.get("end"), "time_zone": value.get("time_zone")}
+    return value
+
+
+def _write_props(db: dict, page: dict, props: Dict[str, Any]) -> bool:
+    """Записывает props в страницу. Возвращает True, если схема базы изменилась."""
+    before = notion_http.dumps(db["properties"])
+    for name, value in (props or {}).items():
+        if not isinstance(value, dict):
+            raise ApiError(400, "validation_error", f"body.properties.{name} should be an object.")
+        kind = _prop_kind(value)
+        meta = _schema_prop(db, name, kind)
+        page["properties"][name] = {"id": meta["id"], "type": kind, kind: _read_value(kind, value.get(kind), meta)}
+    return notion_http.dumps(db["properties"]) != before
+
+
+# ============================================================
+# Фильтры и сортировки /query
+# ============================================================
+
+_TEXT_KINDS = ("title", "rich_text", "url", "email", "phone_number")
+
+
+def _match_text(value: Optional[str], cond: Dict[str, Any]) -> bool:
+    v = (value or "")
+    low = v.lower()
+    for op, arg in cond.items():
+        a = str(arg).lower() if arg is not None else ""
+        if op == "equals" and v != arg:
+            return False
+        if op == "does_not_equal" and v == arg:
+            return False
+        if op == "contains" and a not in low:
+            return False
+        if op == "does_not_contain" and a in low:
+            return False
+        if op == "starts_with" and not low.startswith(a):
+            return False
+        if op == "ends_with" and not low.endswith(a):
+            return False
+        if op == "is_empty" and v:
+            return False
+        if op == "is_not_empty" and not v:
+            return False
+    return True
+
+
+def _match_date(value: Optional[str], cond: Dict[str, Any]) -> bool:
+    for op, arg in cond.items():
+        if op == "is_empty":
+            if value:
+                return False
+            continue
+        if op == "is_not_empty":
+            if not value:
+                return False
+            continue
+        if not value:
+            return False
+        # ISO-строки сравниваем по общей длине: дата против даты-времени — по дню
+        n = min(len(value), len(arg))
+        v, a = value[:n], arg[:n]
+        if op == "equals" and v != a:
+            return False
+        if op == "before" and not v < a:
+            return False
+        if op == "after" and not v > a:
+            return False
+        if op == "on_or_before" and not v <= a:
+            return False
+        if op == "on_or_after" and not v >= a:
+            return False
+        if op not in ("equals", "before", "after", "on_or_before", "on_or_after"):
+            raise ApiError(400, "validation_error", f"Unsupported date filter: {op}")
+    return True
+
+
+def _match_number(value: Any, cond: Dict[str, Any]) -> bool:
+    for op, arg in cond.items():
+        if op == "is_empty":
+            ok = value is None
+        elif op == "is_not_empty":
+            ok = value is not None
+        elif value is None:
+            ok = False
+        elif op == "equals":
+            ok = value == arg
+        elif op == "does_not_equal":
+            ok = value != arg
+        elif op == "greater_than":
+            ok = value > arg
+        elif op == "less_than":
+            ok = value < arg
+        elif op == "greater_than_or_equal_to":
+            ok = value >= arg
+        elif op == "less_than_or_equal_to":
+            ok = value <= arg
+        else:
+            raise ApiError(400, "validation_error", f"Unsupported number filter: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _find_prop(page: dict, key: str) -> Optional[dict]:
+    """Свойство по имени или по id (в фильтрах Notion допускает оба)."""
+    props = page.get("properties") or {}
+    if key in props:
+        return props[key]
+    for p in props.values():
+        if unquote(p.get("id", "")) == unquote(key):
+            return p
+    return None
+
+
+def _match(page: dict, flt: Dict[str, Any]) -> bool:
+    if not flt:
+        return True
+    if "and" in flt:
+        return all(_match(page, f) for f in flt["and"])
+    if "or" in flt:
+        return any(_match(page, f) for f in flt["or"])
+    if "timestamp" in flt:
+        ts = flt["timestamp"]
+        return _match_date(page.get(ts), flt.get(ts) or {})
+
+    kind = next((k for k in flt if k != "property"), None)
+    cond = flt.get(kind) or {}
+    prop = _find_prop(page, flt.get("property", ""))
+    value = prop_value(prop)
+    if kind in _TEXT_KINDS:
+        return _match_text(value, cond)
+    if kind in ("select", "status"):
+        return _match_text(value, {op: a for op, a in cond.items() if op in ("equals", "does_not_equal", "is_empty", "is_not_empty")})
+    if kind == "multi_select":
+        names = [o.get("name") for o in (prop or {}).get("multi_select") or []]
+        if "contains" in cond:
+            return cond["contains"] in names
+        if "does_not_contain" in cond:
+            return cond["does_not_contain"] not in names
+        return bool(names) == ("is_not_empty" in cond)
+    if kind == "date":
+        return _match_date(value, cond)
+    if kind == "number":
+        return _match_number(value, cond)
+    if kind == "checkbox":
+        return bool(value) == cond.get("equals", not cond.get("does_not_equal", False))
+    raise ApiError(400, "validation_error", f"Unsupported filter type: {kind}")
+
+
+def _sorted(pages: List[dict], sorts: List[Dict[str, Any]]) -> List[dict]:
+    out = list(pages)
+    for s in reversed(sorts or []):
+        desc = s.get("direction") == "descending"
+        if "timestamp" in s:
+            key = lambda p, ts=s["timestamp"]: (p.get(ts) is None, p.get(ts) or "")
+        else:
+            def key(p, name=s.get("property", "")):
+                v = prop_value(_find_prop(p, name))
+                return (v is None, v if v is not None else "")
+        # пустые значения Notion всегда ставит в конец — и при убывании тоже
+        filled = [p for p in out if not key(p)[0]]
+        empty = [p for p in out if key(p)[0]]
+        out = sorted(filled, key=key, reverse=desc) + empty
+    return out
+
+
+def _project(page: dict, ids: Optional[set]) -> dict:
+    if not ids:
+        return page
+    out = dict(page)
+    out["properties"] = {n: p for n, p in page["properties"].items() if unquote(p.get("id", "")) in ids}
+    return out
+
+
+# ============================================================
+# Логика API
+# ============================================================
+
+def _response_signature(public_id: str, version: int) -> str:
+    """Как у Cloudinary: sha1("public_id=...&version=..." + api_secret) — клиенты проверяют подлинность ответа."""
+    secret = os.getenv("CLOUD_API_SECRET", "")
+    return hashlib.sha1(f"public_id={public_id}&version={version}{secret}".encode("utf-8")).hexdigest()
+
+
+class FakeApp:
+    def __init__(self, store: FakeStore, latency: float = 0.0, jitter: float = 0.0,
+                 rps: float = 0.0, burst: Optional[float] = None, fail_rate: float = 0.0):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.rps = rps
+        self.burst = burst or max(rps, 1.0)
+        self.fail_rate = fail_rate
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"requests": 0, "throttled": 0}
+        self._chunks: Dict[str, Dict[str, Any]] = {}  # X-Unique-Upload-Id -> принятые части (в памяти)
+        self.graph = FakeGraph(self)
+
+    # ---- поведение «как у настоящего сервиса» ----
+
+    def admit(self) -> Optional[float]:
+        """None — запрос пропускаем; иначе число секунд для Retry-After (ответ 429)."""
+        with self._lock:
+            self.counters["requests"] += 1
+            if self.fail_rate and random.random() < self.fail_rate:
+                self.counters["throttled"] += 1
+                return 1.0
+            if self.rps <= 0:
+                return None
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rps)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            self.counters["throttled"] += 1
+            return max((1 - self._tokens) / self.rps, 0.1)
+
+    def delay(self) -> None:
+        d = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if d > 0:
+            time.sleep(d)
+
+    # ---- Notion ----
+
+    def query(self, db_id: str, body: dict, filter_properties: List[str]) -> dict:
+        self.store.database(db_id)
+        page_size = min(int(body.get("page_size") or MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        try:
+            start = int(body.get("start_cursor") or 0)
+        except ValueError:
+            raise ApiError(400, "validation_error", "body.start_cursor should be a valid cursor.")
+
+        pages = [p for p in self.store.database_pages(db_id) if not p.get("archived")]
+        flt = body.get("filter")
+        if flt:
+            pages = [p for p in pages if _match(p, flt)]
+        pages = _sorted(pages, body.get("sorts"))
+
+        chunk = pages[start:start + page_size]
+        more = start + page_size < len(pages)
+        ids = {unquote(i) for i in filter_properties} if filter_properties else None
+        return {
+            "object": "list",
+            "results": [_project(p, ids) for p in chunk],
+            # курсор стенда — смещение в выборке (у Notion он непрозрачный)
+            "next_cursor": str(start + page_size) if more else None,
+            "has_more": more,
+            "type": "page_or_database",
+            "page_or_database": {},
+        }
+
+    def create_page(self, body: dict) -> dict:
+        parent = body.get("parent") or {}
+        db_id = parent.get("database_id")
+        if not db_id:
+            raise ApiError(400, "validation_error", "body.parent.database_id should be defined.")
+        db = self.store.database(db_id, create=True)
+        now = _now_iso()
+        page = {
+            "object": "page",
+            "id": str(uuid.uuid4()),
+            "created_time": now,
+            "last_edited_time": now,
+            "archived": False,
+            "in_trash": False,
+            "parent": {"type": "database_id", "database_id": db["id"]},
+            "properties": {},
+        }
+        page["url"] = "https://www.notion.so/" + page["id"].replace("-", "")
+        with self.store.lock:
+            if _write_props(db, page, body.get("properties")):
+                self.store.save_database(db)
+            self.store.save_page(page)
+        return page
+
+    def update_page(self, page_id: str, body: dict) -> dict:
+        with self.store.lock:
+            page = self.store.page(page_id)
+            page = notion_http.loads(notion_http.dumps(page))  # копия: при ошибке валидации не портим исходник
+            db = self.store.database(page["parent"]["database_id"])
+            changed = _write_props(db, page, body.get("properties"))
+            for flag in ("archived", "in_trash"):
+                if flag in body:
+                    page[flag] = bool(body[flag])
+            page["last_edited_time"] = _now_iso()
+            if changed:
+                self.store.save_database(db)
+            self.store.save_page(page)
+        return page
+
+    def update_database(self, db_id: str, body: dict) -> dict:
+        with self.store.lock:
+            db = self.store.database(db_id)
+            for name, spec in (body.get("properties") or {}).items():
+                if spec is None:
+                    db["properties"].pop(name, None)
+                    continue
+                kind = spec.get("type") or next((k for k in spec if k not in ("name", "id")), None)
+                if kind is None:
+                    continue
+                meta = db["properties"].get(name) or {"id": _short_id(), "name": name, "type": kind}
+                cfg = dict(spec.get(kind) or {})
+                if "options" in cfg:
+                    # переданный список заменяет прежний; у известных опций сохраняем id и цвет
+                    known = {o["name"]: o for o in (meta.get(kind) or {}).get("options", [])}
+                    opts = []
+                    for o in cfg["options"]:
+                        old = known.get(o["name"], {})
+                        opts.append({"id": old.get("id") or o.get("id") or _short_id(), "name": o["name"],
+                                     "color": o.get("color") or old.get("color", "default")})
+                    cfg["options"] = opts
+                meta["type"] = kind
+                meta[kind] = cfg
+                new_name = spec.get("name")
+                if new_name and new_name != name:
+                    db["properties"].pop(name, None)
+                    meta["name"] = new_name
+                    name = new_name
+                db["properties"][name] = meta
+            if "title" in body:
+                db["title"] = [_text_item(t.get("text", {}).get("content", "")) for t in body["title"]]
+            db["last_edited_time"] = _now_iso()
+            self.store.save_database(db)
+        return db
+
+    # ---- Cloudinary ----
+
+    def upload(self, base_url: str, cloud: str, resource_type: str, fields: Dict[str, Any]) -> dict:
+        data = fields.get("file") or b""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        fmt = _guess_format(data)
+        if resource_type == "auto":
+            resource_type = "image" if fmt in ("jpg", "png", "gif", "webp") else "raw"
+        folder = (fields.get("folder") or "").strip("/")
+        public_id = fields.get("public_id") or uuid.uuid4().hex[:20]
+        if folder:
+            public_id = f"{folder}/{public_id}"
+        version = int(time.time())
+        # у raw расширение — часть public_id, к ссылке его не дописывают
+        path = f"{cloud}/{resource_type}/upload/v{version}/{public_id}" + (f".{fmt}" if fmt and resource_type != "raw" else "")
+        asset = {
+            "asset_id": uuid.uuid4().hex,
+            "public_id": public_id,
+            "version": version,
+            "signature": _response_signature(public_id, version),
+            "format": fmt,
+            "resource_type": resource_type,
+            "created_at": _now_iso(),
+            "bytes": len(data),
+            "type": "upload",
+            "etag": hashlib.md5(data).hexdigest(),
+            "folder": folder,
+            "url": f"{base_url}/res/{path}",
+            "secure_url": f"{base_url}/res/{path}",
+            "original_filename": fields.get("filename") or "file",
+        }
+        self.store.save_asset(asset)
+        if folder:
+            self.store.add_folder(folder)
+        return asset
+
+    def upload_chunk(self, base_url: str, cloud: str, resource_type: str, fields: Dict[str, Any],
+                     upload_id: str, content_range: str) -> dict:
+        """Загрузка частями: части копятся по upload_id; когда пришли все байты — обычный upload()."""
+        m = re.match(r"bytes (\d+)-(\d+)/(\d+)", content_range)
+        if not m:
+            raise ApiError(400, "invalid_request", f"Bad Content-Range: {content_range}")
+        start, end, total = (int(x) for x in m.groups())
+        data = fields.get("file") or b""
+        if len(data) != end - start + 1:
+            raise ApiError(400, "invalid_request", "Content-Range does not match chunk size")
+        with self._lock:
+            up = self._chunks.setdefault(upload_id, {"parts": {}, "public_id": fields.get("public_id")
+                                                     or uuid.uuid4().hex[:20]})
+            up["parts"][start] = data  # повтор той же части после обрыва просто перезаписывает её
+            received = sum(len(p) for p in up["parts"].values())
+            if received < total:
+                return {"done": False, "bytes": received, "public_id": up["public_id"]}
+            del self._chunks[upload_id]
+        fields = dict(fields, file=b"".join(p for _, p in sorted(up["parts"].items())), public_id=up["public_id"])
+        return self.upload(base_url, cloud, resource_type, fields)
+
+    def create_folder(self, path: str) -> dict:
+        path = path.strip("/")
+        self.store.add_folder(path)
+        return {"success": True, "path": path, "name": path.rsplit("/", 1)[-1]}
+
+
+class GraphError(Exception):
+    """Ошибка в формате Graph: {"error": {"code": ..., "message": ...}}."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def body(self) -> dict:
+        return {"error": {"code": self.code, "message": self.message}}
+
+
+GRAPH_BATCH_LIMIT = 20
+
+
+class FakeGraph:
+    """OneDrive в объёме, нужном для дерева папок: создание, поиск по пути, $batch."""
+
+    _ROUTES = [
+        ("POST", re.compile(r"^/me/drive/items/([^/:]+)/children$"), "create_child"),
+        ("GET", re.compile(r"^/me/drive/items/([^/:]+)/children$"), "children"),
+        ("GET", re.compile(r"^/me/drive/items/([^/:]+):/(.+?):?$"), "by_path"),
+    ]
+
+    def __init__(self, app: "FakeApp"):
+        self.app = app
+        self.store = app.store
+
+    def _item(self, item_id: str, name: str, parent: str) -> dict:
+        return {"id": item_id, "name": name, "folder": {"childCount": len(self.store.drive_children(item_id))},
+                "parentReference": {"id": parent}}
+
+    def _parent(self, item_id: str) -> None:
+        if not self.store.drive_exists(item_id):
+            raise GraphError(404, "itemNotFound", "The resource could not be found.")
+
+    def create_child(self, parent: str, body: dict) -> Tuple[int, dict]:
+        self._parent(parent)
+        name = (body.get("name") or "").strip()
+        if not name or re.search(r'[\\/:*?"<>|]', name):
+            raise GraphError(400, "invalidRequest", f"Invalid name: {name!r}")
+        behavior = body.get("@microsoft.graph.conflictBehavior", "replace")
+        with self.store.lock:  # проверка и вставка — атомарно, как у настоящего OneDrive
+            existing = self.store.drive_child(parent, name)
+            if existing:
+                if behavior == "fail":
+                    raise GraphError(409, "nameAlreadyExists", "The specified item name already exists.")
+                if behavior == "replace":
+                    return 200, self._item(existing, name, parent)
+                base, n = name, 1
+                while self.store.drive_child(parent, name):
+                    name = f"{base} {n}"
+                    n += 1
+            return 201, self._item(self.store.add_drive_item(parent, name), name, parent)
+
+    def children(self, parent: str, body: dict) -> Tuple[int, dict]:
+        self._parent(parent)
+        return 200, {"value": [self._item(i, n, parent) for i, n in self.store.drive_children(parent)]}
+
+    def by_path(self, parent: str, path: str, body: dict) -> Tuple[int, dict]:
+        self._parent(parent)
+        current, name = parent, ""
+        for name in [p for p in path.split("/") if p]:
+            parent, current = current, self.store.drive_child(current, name)
+            if current is None:
+                raise GraphError(404, "itemNotFound", "The resource could not be found.")
+        return 200, self._item(current, name, parent)
+
+    def call(self, method: str, path: str, body: Optional[dict]) -> Tuple[int, dict]:
+        for m, pattern, name in self._ROUTES:
+            match = pattern.match(path) if m == method else None
+            if match:
+                try:
+                    return getattr(self, name)(*match.groups(), body or {})
+                except GraphError as e:
+                    return e.status, e.body()
+        return 400, GraphError(400, "invalidRequest", f"Unsupported: {method} {path}").body()
+
+    def batch(self, body: dict) -> Tuple[int, dict]:
+        reqs = body.get("requests") or []
+        if len(reqs) > GRAPH_BATCH_LIMIT:
+            return 400, GraphError(400, "invalidRequest", f"Batch is limited to {GRAPH_BATCH_LIMIT} requests").body()
+        out = []
+        for r in reqs:
+            retry = self.app.admit()  # Graph ограничивает каждый запрос внутри $batch отдельно
+            if retry is not None:
+                out.append({"id": r.get("id"), "status": 429, "headers": {"Retry-After": f"{retry:.2f}"},
+                            "body": GraphError(429, "activityLimitReached", "Throttled").body()})
+                continue
+            status, obj = self.call(r.get("method", "GET").upper(), unquote(urlsplit(r.get("url", "")).path),
+                                    r.get("body"))
+            out.append({"id": r.get("id"), "status": status, "headers": {"Content-Type": "application/json"},
+                        "body": obj})
+        random.shuffle(out)  # порядок ответов в $batch не гарантирован
+        return 200, {"responses": out}
+
+
+def _guess_format(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"GIF8":
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[4:8] == b"ftyp":
+        return "mp4"
+    if data[:4] == b"%PDF":
+        return "pdf"
+    return ""
+
+
+def _parse_form(content_type: str, body: bytes) -> Dict[str, Any]:
+    """multipart/form-data или x-www-form-urlencoded -> {поле: значение}; file остаётся байтами."""
+    if content_type.startswith("multipart/"):
+        msg = BytesParser(policy=policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        fields: Dict[str, Any] = {}
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if name == "file":
+                fields["file"] = payload
+                fields["filename"] = part.get_filename()
+            elif name:
+                fields[name] = payload.decode("utf-8", "replace")
+        return fields
+    return {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+
+
+# ============================================================
+# HTTP
+# ============================================================
+
+_ROUTES: List[Tuple[str, "re.Pattern", str]] = [
+    ("POST", re.compile(r"^/v1/databases/([^/]+)/query$"), "r_query"),
+    ("GET", re.compile(r"^/v1/databases/([^/]+)$"), "r_get_database"),
+    ("PATCH", re.compile(r"^/v1/databases/([^/]+)$"), "r_patch_database"),
+    ("POST", re.compile(r"^/v1/pages$"), "r_create_page"),
+    ("GET", re.compile(r"^/v1/pages/([^/]+)$"), "r_get_page"),
+    ("PATCH", re.compile(r"^/v1/pages/([^/]+)$"), "r_patch_page"),
+    ("POST", re.compile(r"^/v1_1/([^/]+)/(image|video|raw|auto)/upload$"), "r_upload"),
+    ("POST", re.compile(r"^/v1_1/([^/]+)/folders/(.+)$"), "r_folder"),
+    ("POST", re.compile(r"^/v1\.0/\$batch$"), "r_graph_batch"),
+    ("POST", re.compile(r"^/v1\.0(/me/drive/.+)$"), "r_graph"),
+    ("GET", re.compile(r"^/v1\.0(/me/drive/.+)$"), "r_graph"),
+    ("GET", re.compile(r"^/_stats$"), "r_stats"),
+]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "FakeNotion/1.0"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # иначе keep-alive + delayed ACK дают ~40 мс на каждый ответ
+
+    @property
+    def app(self) -> FakeApp:
+        return self.server.app  # type: ignore[attr-defined]
+
+    def log_message(self, fmt, *args):  # тихо: на нагрузке лог в stderr — сам по себе узкое место
+        if self.server.verbose:  # type: ignore[attr-defined]
+            super().log_message(fmt, *args)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def _send(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = notion_http.dumps(obj)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        self.query_params = parse_qs(url.query)
+        self.raw_body = raw
+
+        for m, pattern, name in _ROUTES:
+            match = pattern.match(url.path) if m == method else None
+            if not match:
+                continue
+            if name != "r_stats":
+                retry = self.app.admit()
+                if retry is not None:
+                    self._send(429, {"object": "error", "status": 429, "code": "rate_limited",
+                                     "message": "You have been rate limited. Please try again in a few minutes."},
+                               {"Retry-After": f"{retry:.2f}"})
+                    return
+                self.app.delay()
+            try:
+                status, obj = getattr(self, name)(*[unquote(g) for g in match.groups()])
+            except ApiError as e:
+                status, obj = e.status, {"object": "error", "status": e.status, "code": e.code, "message": e.message}
+            except ValueError as e:
+                status, obj = 400, {"object": "error", "status": 400, "code": "invalid_json", "message": str(e)}
+            self._send(status, obj)
+            return
+        self._send(404, {"object": "error", "status": 404, "code": "invalid_request_url",
+                         "message": f"Invalid request URL: {method} {url.path}"})
+
+    def _json(self) -> dict:
+        return notion_http.loads(self.raw_body) if self.raw_body else {}
+
+    # ---- маршруты ----
+
+    def r_query(self, db_id):
+        return 200, self.app.query(db_id, self._json(), self.query_params.get("filter_properties", []))
+
+    def r_get_database(self, db_id):
+        return 200, self.app.store.database(db_id)
+
+    def r_patch_database(self, db_id):
+        return 200, self.app.update_database(db_id, self._json())
+
+    def r_create_page(self):
+        return 200, self.app.create_page(self._json())
+
+    def r_get_page(self, page_id):
+        return 200, self.app.store.page(page_id)
+
+    def r_patch_page(self, page_id):
+        return 200, self.app.update_page(page_id, self._json())
+
+    def r_upload(self, cloud, resource_type):
+        fields = _parse_form(self.headers.get("Content-Type", ""), self.raw_body)
+        base = f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+        upload_id, rng = self.headers.get("X-Unique-Upload-Id"), self.headers.get("Content-Range")
+        if upload_id and rng:
+            return 200, self.app.upload_chunk(base, cloud, resource_type, fields, upload_id, rng)
+        return 200, self.app.upload(base, cloud, resource_type, fields)
+
+    def r_folder(self, cloud, path):
+        return 200, self.app.create_folder(path)
+
+    def r_graph_batch(self):
+        return self.app.graph.batch(self._json())
+
+    def r_graph(self, path):
+        return self.app.graph.call(self.command, path, self._json())
+
+    def r_stats(self):
+        store = self.app.store
+        return 200, dict(self.app.counters, databases=len(store.databases), pages=len(store.pages))
+
+
+def make_server(store: FakeStore, host: str = FAKE_HOST, port: int = FAKE_PORT,
+                verbose: bool = False, **app_options) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.app = FakeApp(store, **app_options)  # type: ignore[attr-defined]
+    server.verbose = verbose  # type: ignore[attr-defined]
+    return server
+
+
+def start_in_thread(store: FakeStore, port: int = 0, **app_options) -> Tuple[ThreadingHTTPServer, str]:
+    """Поднимает стенд в фоновом потоке (порт 0 — любой свободный). Возвращает (сервер, базовый URL)."""
+    server = make_server(store, "127.0.0.1", port, **app_options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, real_port = server.server_address[:2]
+    return server, f"http://{host}:{real_port}"
+
+
+# ============================================================
+# Засев записанным зеркалом
+# ============================================================
+
+def seed_from_mirror(store: FakeStore, pages_path: str, database_id: Optional[str] = None) -> int:
+    """Заливает mirror/<id>.jsonl (и схему из <id>.meta.json рядом). Возвращает число страниц."""
+    meta_path = re.sub(r"\.jsonl$", ".meta.json", pages_path)
+    meta: Dict[str, Any] = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, "rb") as f:
+            meta = notion_http.loads(f.read())
+    db_id = database_id or meta.get("database_id") or os.path.basename(pages_path).split(".")[0]
+    db = store.database(db_id, create=True)
+    if meta.get("schema"):
+        db["properties"] = meta["schema"]
+        store.save_database(db)
+
+    n = 0
+    with open(pages_path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            page = notion_http.loads(line)
+            page["parent"] = {"type": "database_id", "database_id": db["id"]}
+            store.save_page(page, commit=False)
+            n += 1
+    store.commit()
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Локальный стенд Notion + Cloudinary + OneDrive для нагрузочных прогонов")
+    ap.add_argument("--host", default=FAKE_HOST)
+    ap.add_argument("--port", type=int, default=FAKE_PORT)
+    ap.add_argument("--store", default=FAKE_STORE, help=f"Файл SQLite (по умолчанию {FAKE_STORE})")
+    ap.add_argument("--latency", type=float, default=0.0, help="Задержка каждого ответа, с")
+    ap.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке, до N с")
+    ap.add_argument("--rps", type=float, default=0.0, help="Лимит запросов/с (сверх — 429 с Retry-After); 0 — без лимита")
+    ap.add_argument("--burst", type=float, default=None, help="Допустимый всплеск запросов (по умолчанию = --rps)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Доля случайных ответов 429 (0..1)")
+    ap.add_argument("--seed", metavar="MIRROR.jsonl", help="Засеять базу записанным зеркалом")
+    ap.add_argument("--database-id", help="Под каким id засеять (по умолчанию — из .meta.json)")
+    ap.add_argument("--reset", action="store_true", help="Очистить хранилище перед запуском")
+    ap.add_argument("--verbose", action="store_true", help="Печатать каждый запрос")
+    args = ap.parse_args()
+
+    store = FakeStore(args.store)
+    if args.reset:
+        store.reset()
+        print("Хранилище очищено")
+    if args.seed:
+        n = seed_from_mirror(store, args.seed, args.database_id)
+        print(f"Засеяно страниц: {n}")
+
+    server = make_server(store, args.host, args.port, verbose=args.verbose, latency=args.latency,
+                         jitter=args.jitter, rps=args.rps, burst=args.burst, fail_rate=args.fail_rate)
+    base = f"http://{args.host}:{args.port}"
+    print(f"Стенд запущен: {base} (баз: {len(store.databases)}, страниц: {len(store.pages)})")
+    print(f"  NOTION_API_BASE={base}/v1")
+    print(f"  CLOUD_API_BASE={base}")
+    print(f"  GRAPH_API_BASE={base}/v1.0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Остановлено")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
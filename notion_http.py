@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Общий HTTP-слой для Notion API.
+- ретраи 429/5xx с учётом Retry-After
+- ограничение частоты (по умолчанию 3 запроса/сек — лимит Notion на интеграцию); у каждого токена
+  (объекта из projects.py) свой лимит и свои keep-alive соединения — объекты не тормозят друг друга
+- счётчики запросов / ретраев / 429 для отчёта о пропускной способности
+- постраничный обход /query с предзагрузкой следующей страницы (sync и async)
+- выполнение задач с ограниченным параллелизмом
+- кодек JSON: orjson, если установлен, иначе stdlib (dumps/loads/response_json)
+- метрики каждого запроса (задержка по эндпоинту, ретраи, 429) — см. metrics.py
+- спан трассы на запрос, если идёт трассируемое действие — см. tracing.py
+- без связи (offline.py) запрос сразу падает с ConnectionError — вызывающий код уходит в офлайн-ветку
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from dotenv import load_dotenv
+
+import metrics
+import offline
+import tracing
+
+try:  # быстрый кодек — опционально (pip install orjson)
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger("notion-http")
+
+load_dotenv()
+
+# База URL API: для прогонов на локальном стенде (notion_fake_server.py) — http://127.0.0.1:8787/v1
+API = os.getenv("NOTION_API_BASE", "https://api.notion.com/v1").rstrip("/")
+NOTION_VERSION = "2022-06-28"
+
+# Сетевые параметры
+HTTP_TIMEOUT = 30
+RETRY_MAX = 5
+NOTION_RPS = float(os.getenv("NOTION_RPS", "3"))
+
+
+# ---- кодек JSON ----
+
+def dumps(obj: Any) -> bytes:
+    """Компактный JSON в UTF-8 (без пробелов и \\u-экранирования кириллицы)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_json(resp: requests.Response) -> Any:
+    """Замена resp.json(): парсим сырые байты тем же кодеком."""
+    return loads(resp.content)
+
+
+def make_headers(token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "Notion-Version": NOTION_VERSION,
+    }
+
+
+class RateLimiter:
+    """Раздаёт «слоты» не чаще rps в секунду — общий на все потоки."""
+
+    def __init__(self, rps: float = NOTION_RPS):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Stats:
+    """Счётчики одного прогона (потокобезопасные)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0  # сколько раз получили 429
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def report(self, pages: int) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"Страниц: {pages} за {elapsed:.1f} с ({pages / elapsed:.2f} стр/с); "
+            f"запросов: {self.requests}, ретраев: {self.retries}, 429: {self.throttled}, ошибок: {self.errors}"
+        )
+
+
+DEFAULT_LIMITER = RateLimiter()
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(headers: Dict[str, str]) -> RateLimiter:
+    """Лимит Notion считается на интеграцию — свой RateLimiter на каждый токен."""
+    key = headers.get("Authorization", "")
+    with _limiters_lock:
+        lim = _limiters.get(key)
+        if lim is None:
+            lim = _limiters[key] = RateLimiter(NOTION_RPS)
+        return lim
+
+
+# requests.Session не стоит делить между потоками — держим по одной на поток и токен
+_local = threading.local()
+
+
+def _session(key: str = "") -> requests.Session:
+    sessions = getattr(_local, "sessions", None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    s = sessions.get(key)
+    if s is None:
+        s = sessions[key] = requests.Session()
+    return s
+
+
+def _retry_delay(resp: Optional[requests.Response], attempt: int) -> float:
+    if resp is not None:
+        ra = resp.headers.get("Retry-After")
+        if ra:
+            try:
+                return max(float(ra), 0.0)
+            except ValueError:
+                pass
+    return min(2 ** attempt, 10)
+
+
+def request(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    payload: Optional[Dict[str, Any]] = None,
+    stats: Optional[Stats] = None,
+    limiter: Optional[RateLimiter] = DEFAULT_LIMITER,
+    retries: int = RETRY_MAX,
+) -> requests.Response:
+    """
+    Запрос к Notion с ретраями 429/5xx и сетевых ошибок. Возвращает последний ответ.
+    limiter по умолчанию — лимит токена из headers (limiter_for); None — без ограничения.
+    """
+    body = dumps(payload) if payload is not None else None
+    if limiter is DEFAULT_LIMITER:
+        limiter = limiter_for(headers)
+    with tracing.span("notion " + metrics.endpoint(method, url)) as sp:
+        resp = _request(method, url, headers, body, stats, limiter, retries, sp)
+        if resp is not None:
+            sp.set("http.status_code", resp.status_code)
+    return resp
+
+
+def _request(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    body: Optional[bytes],
+    stats: Optional[Stats],
+    limiter: Optional[RateLimiter],
+    retries: int,
+    sp: Any,
+) -> requests.Response:
+    resp: Optional[requests.Response] = None
+    for attempt in range(retries):
+        if not offline.online():
+            raise requests.ConnectionError("offline: нет связи с API")
+        sp.set("attempts", attempt + 1)
+        if limiter:
+            limiter.wait()
+        if stats:
+            stats.add("requests")
+        metrics.INFLIGHT.add(1, kind="notion")
+        t0 = time.perf_counter()
+        try:
+            resp = _session(headers.get("Authorization", "")).request(method, url, headers=headers, data=body,
+                                                                       timeout=HTTP_TIMEOUT)
+        except requests.RequestException as e:
+            metrics.INFLIGHT.add(-1, kind="notion")
+            metrics.observe_http("notion", method, url, time.perf_counter() - t0, None)
+            if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                offline.mark_down(f"Notion: {type(e).__name__}")
+            if attempt == retries - 1 or not offline.online():
+                if stats:
+                    stats.add("errors")
+                raise
+            if stats:
+                stats.add("retries")
+            metrics.retry("notion", "network")
+            time.sleep(_retry_delay(None, attempt))
+            continue
+        metrics.INFLIGHT.add(-1, kind="notion")
+        metrics.observe_http("notion", method, url, time.perf_counter() - t0, resp.status_code)
+        offline.mark_up()
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            if resp.status_code == 429 and stats:
+                stats.add("throttled")
+            if attempt == retries - 1:
+                break
+            if stats:
+                stats.add("retries")
+            metrics.retry("notion", "429" if resp.status_code == 429 else "5xx")
+            delay = _retry_delay(resp, attempt)
+            log.warning("Notion %s -> %s. Retry in %ss (attempt %s/%s)", method, resp.status_code, delay, attempt + 1, retries)
+            time.sleep(delay)
+            continue
+        break
+
+    if stats and resp is not None and resp.status_code >= 400:
+        stats.add("errors")
+    return resp
+
+
+# ---- постраничный обход /query ----
+
+_prop_ids: Dict[str, Dict[str, str]] = {}  # database_id -> {имя свойства: id}
+_prop_ids_lock = threading.Lock()
+
+
+def property_ids(database_id: str, headers: Dict[str, str], names: Iterable[str]) -> List[str]:
+    """
+    Имена свойств -> их id (filter_properties в API принимает id).
+    Схема запрашивается один раз на базу и кэшируется на время жизни процесса.
+    """
+    with _prop_ids_lock:
+        ids = _prop_ids.get(database_id)
+    if ids is None:
+        r = request("GET", f"{API}/databases/{database_id}", headers)
+        r.raise_for_status()
+        ids = {name: meta.get("id", name) for name, meta in response_json(r).get("properties", {}).items()}
+        with _prop_ids_lock:
+            _prop_ids[database_id] = ids
+    return [ids[n] for n in names if n in ids]
+
+
+def _query_url(database_id: str, headers: Dict[str, str], filter_properties: Optional[Iterable[str]]) -> str:
+    url = f"{API}/databases/{database_id}/query"
+    if filter_properties:
+        # id свойств в схеме Notion уже URL-кодированы — подставляем как есть
+        pids = property_ids(database_id, headers, filter_properties)
+        if pids:
+            url += "?" + "&".join(f"filter_properties={pid}" for pid in pids)
+    return url
+
+
+def _fetch_page(url: str, headers: Dict[str, str], body: Dict[str, Any], stats: Optional[Stats]) -> dict:
+    r = request("POST", url, headers, body, stats=stats)
+    r.raise_for_status()
+    return response_json(r)
+
+
+def _first_body(payload: Optional[Dict[str, Any]], limit: Optional[int]) -> Dict[str, Any]:
+    body = dict(payload or {})
+    body.setdefault("page_size", 100)
+    if limit is not None:
+        body["page_size"] = max(1, min(body["page_size"], limit))
+    return body
+
+
+def _next_body(body: Dict[str, Any], data: dict, left: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Тело запроса следующей страницы или None, если дальше идти не нужно."""
+    if not data.get("has_more") or (left is not None and left <= 0):
+        return None
+    nxt = dict(body)
+    nxt["start_cursor"] = data.get("next_cursor")
+    if left is not None:
+        nxt["page_size"] = max(1, min(nxt["page_size"], left))
+    return nxt
+
+
+def iter_query(
+    database_id: str,
+    headers: Dict[str, str],
+    payload: Optional[Dict[str, Any]] = None,
+    stats: Optional[Stats] = None,
+    filter_properties: Optional[Iterable[str]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Итератор по всем страницам результатов /databases/{id}/query.
+    Следующая страница запрашивается в фоне сразу после получения текущей,
+    пока потребитель обрабатывает текущую — сеть и обработка перекрываются.
+    filter_properties — имена свойств, которые нужны в ответе (остальные Notion не пришлёт).
+    limit — вернуть не больше limit записей.
+    """
+    url = _query_url(database_id, headers, filter_properties)
+    body = _first_body(payload, limit)
+    left = limit
+
+    ex = ThreadPoolExecutor(max_workers=1)
+    try:
+        # copy_context: спаны запросов из фонового потока попадают в трассу текущего действия
+        fut = ex.submit(contextvars.copy_context().run, _fetch_page, url, headers, body, stats)
+        while fut is not None:
+            data = fut.result()
+            results = data.get("results", [])
+            if left is not None:
+                results = results[:left]
+                left -= len(results)
+            body = _next_body(body, data, left)
+            fut = ex.submit(contextvars.copy_context().run, _fetch_page, url, headers, body, stats) if body else None
+            for item in results:
+                yield item
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_query(
+    database_id: str,
+    headers: Dict[str, str],
+    payload: Optional[Dict[str, Any]] = None,
+    stats: Optional[Stats] = None,
+    filter_properties: Optional[Iterable[str]] = None,
+    limit: Optional[int] = None,
+) -> AsyncIterator[dict]:
+    """То же, что iter_query, для async-кода (хендлеров бота): HTTP идёт в потоке, event loop не блокируется."""
+    url = await asyncio.to_thread(_query_url, database_id, headers, filter_properties)
+    body = _first_body(payload, limit)
+    left = limit
+
+    task: Optional[asyncio.Task] = asyncio.ensure_future(asyncio.to_thread(_fetch_page, url, headers, body, stats))
+    try:
+        while task is not None:
+            data = await task
+            results = data.get("results", [])
+            if left is not None:
+                results = results[:left]
+                left -= len(results)
+            body = _next_body(body, data, left)
+            task = asyncio.ensure_future(asyncio.to_thread(_fetch_page, url, headers, body, stats)) if body else None
+            for item in results:
+                yield item
+    finally:
+        if task is not None:
+            task.cancel()
+
+
+def run_bounded(fn: Callable[[Any], Any], items: List[Any], workers: int) -> List[Any]:
+    """Выполняет fn(item) для всех items не более чем в workers потоков; порядок результатов сохраняется."""
+    if workers <= 1:
+        return [fn(it) for it in items]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(fn, items))
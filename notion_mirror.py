@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное зеркало базы Notion: страницы + схема.
+- mirror/<database_id>.jsonl      — по одной странице (JSON) в строке
+- mirror/<database_id>.meta.json  — схема базы и отметка последней синхронизации
+Первая синхронизация — полный постраничный обход, дальше — дельта по last_edited_time.
+Зеркало читается потоково, без загрузки всей базы в память.
+Боты читают из него, когда нет связи с Notion (см. offline.py).
+Подписчики (on_change) получают страницы каждой дельты — без повторного чтения всего файла.
+"""
+
+import os
+import json
+import heapq
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+import notion_http
+
+MIRROR_DIR = os.getenv("NOTION_MIRROR_DIR", "mirror")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class Mirror:
+    def __init__(self, database_id: str, headers: Dict[str, str], directory: str = MIRROR_DIR):
+        self.database_id = database_id
+        self.headers = headers
+        self.directory = directory
+        key = database_id.replace("-", "")
+        self.pages_path = os.path.join(directory, f"{key}.jsonl")
+        self.meta_path = os.path.join(directory, f"{key}.meta.json")
+        self._listeners: List[Callable[[List[dict]], None]] = []
+
+    def on_change(self, fn: Callable[[List[dict]], None]) -> None:
+        """fn(страницы) после каждой синхронизации с изменениями; архивные тоже (archived/in_trash)."""
+        self._listeners.append(fn)
+
+    # ---- чтение ----
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def meta(self) -> Dict:
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def schema(self) -> Dict[str, dict]:
+        """properties базы из последней синхронизации схемы."""
+        return self.meta().get("schema", {})
+
+    def iter_pages(self) -> Iterator[dict]:
+        if not os.path.exists(self.pages_path):
+            return
+        with open(self.pages_path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield notion_http.loads(line)
+
+    def get(self, page_id: str) -> Optional[dict]:
+        for page in self.iter_pages():
+            if page.get("id") == page_id:
+                return page
+        return None
+
+    def find(self, match: Callable[[dict], bool]) -> Optional[dict]:
+        for page in self.iter_pages():
+            if match(page):
+                return page
+        return None
+
+    def recent(self, limit: int = 10) -> List[dict]:
+        """Последние изменённые страницы — как sorts по last_edited_time descending."""
+        return heapq.nlargest(limit, self.iter_pages(), key=lambda p: p.get("last_edited_time") or "")
+
+    # ---- синхронизация ----
+
+    def _save_meta(self, meta: Dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self.meta_path)
+
+    def sync_schema(self, stats: Optional[notion_http.Stats] = None) -> Dict[str, dict]:
+        url = f"{notion_http.API}/databases/{self.database_id}"
+        r = notion_http.request("GET", url, self.headers, stats=stats)
+        r.raise_for_status()
+        meta = self.meta()
+        meta["schema"] = notion_http.response_json(r).get("properties", {})
+        meta["schema_synced_at"] = _now_iso()
+        self._save_meta(meta)
+        return meta["schema"]
+
+    def sync(self, full: bool = False, stats: Optional[notion_http.Stats] = None) -> int:
+        """
+        Обновляет зеркало. Возвращает число полученных (новых/изменённых) страниц.
+        Дельта: страницы с last_edited_time >= максимального уже виденного
+        (Notion округляет время до минуты, поэтому граничные страницы приходят повторно — это безопасно).
+        """
+        meta = self.meta()
+        since = None if full or not os.path.exists(self.pages_path) else meta.get("last_edited_max")
+
+        payload: Dict = {}
+        if since:
+            payload["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+
+        changed: Dict[str, dict] = {}
+        last_max = since or ""
+        for page in notion_http.iter_query(self.database_id, self.headers, payload, stats=stats):
+            changed[page["id"]] = page
+            last_max = max(last_max, page.get("last_edited_time") or "")
+        received = len(changed)
+        pages = list(changed.values()) if self._listeners else []
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.pages_path + ".tmp"
+        with open(tmp, "wb") as out:
+            # потоково переписываем старый файл, подменяя изменённые страницы
+            if since:
+                for page in self.iter_pages():
+                    page = changed.pop(page["id"], page)
+                    if not (page.get("archived") or page.get("in_trash")):
+                        out.write(notion_http.dumps(page) + b"\n")
+            for page in changed.values():
+                if not (page.get("archived") or page.get("in_trash")):
+                    out.write(notion_http.dumps(page) + b"\n")
+        os.replace(tmp, self.pages_path)
+
+        meta = self.meta()
+        meta["database_id"] = self.database_id
+        meta["synced_at"] = _now_iso()
+        meta["last_edited_max"] = last_max or meta.get("last_edited_max", "")
+        self._save_meta(meta)
+        for fn in list(self._listeners):
+            if pages:
+                fn(pages)
+        return received
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Компактные модели строк Notion: Task (база задач) и JournalEntry («Журнал вложений»).
+
+Страница Notion — это несколько КБ вложенного JSON, из которого нам нужны 5–7 строк.
+Декодируем её один раз в объект со __slots__ и дальше работаем только с ним:
+никаких повторных try/except-цепочек по properties, и в памяти на порядок меньше.
+
+Какие колонки читать — задаёт карта имён свойств (как P[...] в bot.py).
+"""
+
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+# ===== Карты имён свойств (по умолчанию — из .env, как в bot.py / cloud_photo_bot.py) =====
+P: Dict[str, str] = {
+    "TITLE_ID": os.getenv("PROP_TITLE_ID", "ID (текст)"),
+    "NAME":     os.getenv("PROP_NAME",     "Название задачи"),
+    "STATUS":   os.getenv("PROP_STATUS",   "Статус"),
+    "DEADLINE": os.getenv("PROP_DEADLINE", "Срок ( Deadline)"),
+    "SOURCE":   os.getenv("PROP_SOURCE",   "Источник (Source)"),
+    "OBJECT":   os.getenv("PROP_OBJECT",   "Объект"),
+}
+
+# Статусы закрытых задач (по ним не напоминают, они не бывают просроченными)
+DONE_STATUSES = {s.strip().lower() for s in os.getenv("TASK_DONE_STATUSES", "Done,Готово,Выполнено").split(",")
+                 if s.strip()}
+
+J: Dict[str, str] = {
+    "SECTION": os.getenv("PROP_SECTION", "Раздел"),
+    "FILE":    os.getenv("PROP_FILE",    "Файл / Фото"),
+    "URL":     os.getenv("PROP_URL",     "Ссылка OneDrive"),
+    "DATE":    os.getenv("PROP_DATE",    "Дата"),
+    "COMMENT": os.getenv("PROP_COMMENT", "Комментарий"),
+}
+
+
+def prop_value(prop: Any) -> Any:
+    """
+    Значение свойства страницы по его типу:
+    title/rich_text -> str, select/status -> имя опции, date -> start (ISO),
+    url/number/checkbox -> как есть, files -> список URL. Пустое -> None.
+    """
+    if not isinstance(prop, dict):
+        return None
+    kind = prop.get("type")
+    if kind is None:  # урезанные ответы иногда приходят без "type"
+        kind = next((k for k in _KINDS if k in prop), None)
+    v = prop.get(kind)
+    if v is None:
+        return None
+    if kind in ("title", "rich_text"):
+        text = "".join(x.get("plain_text") or x.get("text", {}).get("content", "") for x in v)
+        return text or None
+    if kind in ("select", "status"):
+        return v.get("name")
+    if kind == "date":
+        return v.get("start")
+    if kind == "files":
+        return [f.get("external", {}).get("url") or f.get("file", {}).get("url") for f in v]
+    return v
+
+
+_KINDS = ("title", "rich_text", "status", "select", "date", "url", "files", "number", "checkbox")
+
+
+class _Row:
+    """Общая часть моделей: id страницы, created/last_edited и декодер по карте свойств."""
+    __slots__ = ("id", "created", "edited")
+
+    # (слот, ключ в карте свойств) — переопределяется в наследниках
+    FIELDS: tuple = ()
+    DEFAULT_MAP: Dict[str, str] = {}
+
+    @classmethod
+    def decoder(cls, props_map: Optional[Dict[str, str]] = None) -> Callable[[dict], "_Row"]:
+        """Готовит функцию page -> объект: имена колонок резолвятся один раз, а не на каждую страницу."""
+        m = props_map or cls.DEFAULT_MAP
+        fields = [(slot, m[key]) for slot, key in cls.FIELDS if m.get(key)]
+        missing = [slot for slot, key in cls.FIELDS if not m.get(key)]
+
+        def decode(page: dict):
+            obj = cls.__new__(cls)
+            obj.id = page.get("id", "")
+            obj.created = page.get("created_time")
+            obj.edited = page.get("last_edited_time")
+            props = page.get("properties") or {}
+            for slot, name in fields:
+                setattr(obj, slot, prop_value(props.get(name)))
+            for slot in missing:
+                setattr(obj, slot, None)
+            return obj
+
+        return decode
+
+    def __repr__(self) -> str:
+        vals = ", ".join(f"{s}={getattr(self, s)!r}" for s in ("id",) + tuple(s for s, _ in self.FIELDS))
+        return f"{type(self).__name__}({vals})"
+
+
+class Task(_Row):
+    __slots__ = ("code", "name", "status", "deadline", "source", "obj")
+    FIELDS = (
+        ("code", "TITLE_ID"),
+        ("name", "NAME"),
+        ("status", "STATUS"),
+        ("deadline", "DEADLINE"),
+        ("source", "SOURCE"),
+        ("obj", "OBJECT"),
+    )
+    DEFAULT_MAP = P
+
+
+class JournalEntry(_Row):
+    __slots__ = ("section", "file_name", "url", "date", "comment")
+    FIELDS = (
+        ("section", "SECTION"),
+        ("file_name", "FILE"),
+        ("url", "URL"),
+        ("date", "DATE"),
+        ("comment", "COMMENT"),
+    )
+    DEFAULT_MAP = J
+
+
+# (класс, id карты) -> (карта, декодер); карту держим, чтобы её id не переиспользовался
+_decoders: Dict[tuple, tuple] = {}
+
+
+def _cached_decoder(cls, props_map: Optional[Dict[str, str]]):
+    m = props_map or cls.DEFAULT_MAP
+    hit = _decoders.get((cls, id(m)))
+    if hit is None:
+        hit = _decoders[(cls, id(m))] = (m, cls.decoder(m))
+    return hit[1]
+
+
+def decode_task(page: dict, props_map: Optional[Dict[str, str]] = None) -> Task:
+    return _cached_decoder(Task, props_map)(page)
+
+
+def decode_entry(page: dict, props_map: Optional[Dict[str, str]] = None) -> JournalEntry:
+    return _cached_decoder(JournalEntry, props_map)(page)
+
+
+def iter_tasks(pages: Iterable[dict], props_map: Optional[Dict[str, str]] = None) -> Iterator[Task]:
+    dec = _cached_decoder(Task, props_map)
+    for page in pages:
+        yield dec(page)
+
+
+def iter_entries(pages: Iterable[dict], props_map: Optional[Dict[str, str]] = None) -> Iterator[JournalEntry]:
+    dec = _cached_decoder(JournalEntry, props_map)
+    for page in pages:
+        yield dec(page)
@@ -0,0 +1,529 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь записей в Notion (write-behind outbox) на SQLite (WAL).
+
+Бот не ждёт Notion: запись кладётся в локальную очередь (одна транзакция, ~мс),
+пользователь сразу получает ответ, а фоновый поток отправляет очередь в Notion.
+- пачки: за один проход берётся до OUTBOX_BATCH готовых записей, отправка в OUTBOX_WORKERS потоков
+  (у Notion нет пакетного API — это пачка отдельных запросов под общим лимитом частоты notion_http)
+- ретраи: 429/5xx/сеть — повтор с растущей паузой (до OUTBOX_MAX_DELAY), ответ 4xx — запись в failed;
+  любая другая ошибка попытки (ответ не JSON — портал провайдера, сбой в коде) — тоже повтор, поток
+  очереди из-за неё не падает; повреждённая запись или недоступная страница (4xx) — сразу в failed
+- идемпотентность: у каждой записи уникальный ключ (повторный enqueue с тем же ключом игнорируется);
+  если прошлая попытка оборвалась без ответа (таймаут, падение процесса), перед повтором
+  ищем уже созданную страницу по dedupe-фильтру и не создаём дубль
+- очередь переживает перезапуск: незавершённые записи отправятся при следующем старте бота
+- офлайн (offline.py): пока связи нет, очередь спит; при восстановлении сразу досылает всё накопленное
+- правки страниц из офлайна: expect_edited — last_edited_time страницы, которую видел пользователь
+  (из зеркала); если страницу успели изменить в Notion, запись уходит в conflict, а не затирает чужое
+  (точность — как у last_edited_time в Notion, до минуты).
+  merge_files — добавление файлов в свойство Files & media: текущий список читается в момент отправки
+- свои виды записей (kind): например, загрузка фото из спула в Cloudinary — Outbox.handle(kind, fn)
+- запись ушла в failed или conflict — об этом узнаёт чат, из которого она поставлена
+  (metrics.current_chat), или ADMIN_CHAT_ID: Outbox.on_problem(fn), в ботах — notify(app, outbox);
+  о конфликте — с обеими отметками времени, чтобы прораб проверил задачу и повторил правку
+
+Очереди разных ботов — разные файлы: outbox/<name>.sqlite (у ботов разные токены Notion).
+
+Настройки: NOTION_OUTBOX=0 — писать в Notion синхронно, как раньше; OUTBOX_DIR, OUTBOX_BATCH,
+OUTBOX_WORKERS, OUTBOX_MAX_DELAY, OUTBOX_KEEP_DAYS.
+
+Обслуживание:
+    python notion_outbox.py outbox/pf-bot.sqlite              # сводка и последние ошибки
+    python notion_outbox.py outbox/pf-bot.sqlite --retry-failed
+"""
+
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+import metrics
+import offline
+import tracing
+import notion_http
+
+log = logging.getLogger("notion-outbox")
+
+load_dotenv()
+
+OUTBOX_ENABLED = os.getenv("NOTION_OUTBOX", "1") != "0"
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", "outbox")
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "10"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "3"))
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", "600"))
+OUTBOX_KEEP_DAYS = float(os.getenv("OUTBOX_KEEP_DAYS", "7"))  # сколько хранить отправленные (для разбора)
+
+# info-ответ функций создания, когда запись принята в очередь, а не отправлена сразу
+QUEUED = "queued"
+
+# внутри одной попытки notion_http сам повторяет 429/5xx; дальше — пауза на стороне очереди
+SEND_RETRIES = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ops (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    key       TEXT NOT NULL UNIQUE,
+    method    TEXT NOT NULL,
+    url       TEXT NOT NULL,
+    payload   BLOB,
+    dedupe    BLOB,
+    label     TEXT NOT NULL DEFAULT '',
+    trace_id  TEXT,
+    created   REAL NOT NULL,
+    status    TEXT NOT NULL DEFAULT 'pending',
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    in_doubt  INTEGER NOT NULL DEFAULT 0,
+    next_try  REAL NOT NULL,
+    result    TEXT,
+    error     TEXT
+);
+CREATE INDEX IF NOT EXISTS ops_due ON ops(status, next_try);
+"""
+
+# колонки, добавленные позже: (имя, определение) — дописываются в старые файлы очереди
+_COLUMNS = (
+    ("kind", "TEXT NOT NULL DEFAULT 'notion'"),
+    ("expect_edited", "TEXT"),
+    ("merge_files", "TEXT"),
+    ("chat_id", "INTEGER"),
+)
+
+
+class Reject(Exception):
+    """Обработчик своего kind: запись не выполнится и при повторе — сразу в failed."""
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _delay(attempts: int) -> float:
+    return min(5.0 * 2 ** (attempts - 1), OUTBOX_MAX_DELAY)
+
+
+class Outbox:
+    """Очередь одного бота. Потокобезопасна: enqueue зовётся из event loop, отправка — из фонового потока."""
+
+    def __init__(self, name: str, headers: Dict[str, str], directory: str = OUTBOX_DIR,
+                 batch: int = OUTBOX_BATCH, workers: int = OUTBOX_WORKERS):
+        self.name = name
+        self.headers = headers
+        self.batch = batch
+        self.workers = workers
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.sqlite")
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        have = {row[1] for row in self.db.execute("PRAGMA table_info(ops)")}
+        for col, decl in _COLUMNS:
+            if col not in have:
+                self.db.execute(f"ALTER TABLE ops ADD COLUMN {col} {decl}")
+        self.db.commit()
+        self.db.row_factory = sqlite3.Row
+        self.handlers: Dict[str, Callable[[dict], str]] = {}
+        self._problem_listeners: List[Callable[[dict], None]] = []
+        self.lock = threading.RLock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._pruned = 0.0
+        metrics.QUEUE_DEPTH.set_function(lambda: self.count("pending"), queue=f"{name}:outbox")
+        metrics.QUEUE_DEPTH.set_function(lambda: self.count("failed"), queue=f"{name}:outbox_failed")
+        metrics.QUEUE_DEPTH.set_function(lambda: self.count("conflict"), queue=f"{name}:outbox_conflict")
+        offline.on_reconnect(self._on_reconnect)
+
+    # ---- постановка ----
+
+    def enqueue(self, method: str, url: str, payload: Optional[dict], key: Optional[str] = None,
+                dedupe: Optional[dict] = None, label: str = "", kind: str = "notion",
+                expect_edited: Optional[str] = None, merge_files: Optional[str] = None,
+                chat_id: Optional[int] = None) -> str:
+        """
+        Ставит запрос в очередь и возвращает его ключ. Запись уже на диске, когда функция вернулась.
+        dedupe — {"database_id": ..., "filter": <фильтр Notion>}: как найти страницу,
+        если создание могло пройти, а ответ потерялся.
+        expect_edited / merge_files — для PATCH страницы, см. описание модуля.
+        kind != "notion" — payload уходит обработчику, зарегистрированному через handle().
+        chat_id — кому сообщить о неудаче (по умолчанию — чат текущего хендлера).
+        """
+        key = key or uuid.uuid4().hex
+        if chat_id is None:
+            chat_id = metrics.current_chat()
+        now = time.time()
+        with tracing.span("outbox.enqueue", label=label), self.lock:
+            self.db.execute(
+                "INSERT OR IGNORE INTO ops(key, kind, method, url, payload, dedupe, label, trace_id, created,"
+                " next_try, expect_edited, merge_files, chat_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, method, url,
+                 notion_http.dumps(payload) if payload is not None else None,
+                 notion_http.dumps(dedupe) if dedupe else None,
+                 label, tracing.current_trace_id(), now, now, expect_edited, merge_files, chat_id),
+            )
+            self.db.commit()
+        self.start()
+        self._idle.clear()
+        self._wake.set()
+        return key
+
+    def handle(self, kind: str, fn: Callable[[dict], str]) -> None:
+        """
+        Обработчик записей вида kind: fn(payload) -> результат (строка).
+        Исключение — повтор позже, Reject — окончательный отказ.
+        """
+        self.handlers[kind] = fn
+
+    def on_problem(self, fn: Callable[[dict], None]) -> None:
+        """
+        fn(op) для каждой записи, которая не дойдёт до Notion без человека (статус failed или conflict).
+        op: key, label, status, error, chat_id; для conflict ещё expect_edited и edited. Из потока очереди.
+        """
+        self._problem_listeners.append(fn)
+
+    # ---- состояние ----
+
+    def count(self, status: str = "pending") -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM ops WHERE status = ?", (status,)).fetchone()[0]
+
+    def failed(self, limit: int = 20, status: str = "failed") -> List[Tuple[str, str, str, int]]:
+        """Последние окончательно не отправленные записи: (ключ, метка, ошибка, попыток)."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT key, label, error, attempts FROM ops WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (status, limit),
+            ).fetchall()
+
+    def retry_failed(self) -> int:
+        with self.lock:
+            n = self.db.execute(
+                "UPDATE ops SET status = 'pending', attempts = 0, next_try = ? WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+            self.db.commit()
+        self._wake.set()
+        return n
+
+    # ---- фоновая отправка ----
+
+    def start(self) -> None:
+        """Запускает фоновый поток (повторный вызов ничего не делает)."""
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._loop, name=f"outbox-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока не останется готовых к отправке записей. True — очередь пуста."""
+        self.start()
+        self._wake.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._due():
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            self._idle.wait(0.5 if left is None else min(left, 0.5))
+        return self.count("pending") == 0
+
+    def _due(self) -> List[tuple]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT id, key, kind, method, url, payload, dedupe, label, attempts, in_doubt, created,"
+                " expect_edited, merge_files, chat_id FROM ops"
+                " WHERE status = 'pending' AND next_try <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.batch),
+            ).fetchall()
+
+    def _next_wakeup(self) -> Optional[float]:
+        with self.lock:
+            row = self.db.execute("SELECT MIN(next_try) FROM ops WHERE status = 'pending'").fetchone()
+        return row[0]
+
+    def _on_reconnect(self) -> None:
+        """Связь вернулась: отложенные из-за сети записи — сразу, не дожидаясь паузы."""
+        with self.lock:
+            self.db.execute("UPDATE ops SET next_try = ? WHERE status = 'pending'", (time.time(),))
+            self.db.commit()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop:
+            try:
+                self._step()
+            except Exception as e:  # поток очереди не должен умирать: записи остались в базе, повторим
+                log.exception("Outbox %s: сбой цикла отправки: %s", self.name, e)
+                self._wake.wait(5.0)
+                self._wake.clear()
+
+    def _step(self) -> None:
+        """Один проход цикла: ждать или отправить пачку готовых записей."""
+        if not offline.online():
+            # без связи не тратим попытки; проверку канала делает offline.py
+            self._idle.set()
+            self._wake.wait(offline.OFFLINE_PROBE_S)
+            self._wake.clear()
+            return
+        ops = self._due()
+        if not ops:
+            self._idle.set()
+            self._prune()
+            nxt = self._next_wakeup()
+            self._wake.wait(None if nxt is None else max(nxt - time.time(), 0.05))
+            self._wake.clear()
+            return
+        # отметка «отправляется»: если процесс упадёт посреди запроса, при повторе проверим дубль
+        with self.lock:
+            self.db.executemany("UPDATE ops SET attempts = attempts + 1, in_doubt = 1 WHERE id = ?",
+                                [(op["id"],) for op in ops])
+            self.db.commit()
+        results = notion_http.run_bounded(self._send, ops, self.workers)
+        with self.lock:
+            self.db.executemany(
+                "UPDATE ops SET status = ?, in_doubt = ?, next_try = ?, result = ?, error = ? WHERE id = ?",
+                results,
+            )
+            self.db.commit()
+        self._report_problems(ops, results)
+
+    def _report_problems(self, ops: List[sqlite3.Row], results: List[tuple]) -> None:
+        by_id = {op["id"]: op for op in ops}
+        for status, _, _, result, error, op_id in results:
+            if status not in ("failed", "conflict"):
+                continue
+            op = by_id[op_id]
+            info = {"key": op["key"], "label": op["label"], "status": status, "error": error or "",
+                    "chat_id": op["chat_id"]}
+            if status == "conflict":
+                info.update(expect_edited=op["expect_edited"], edited=result)
+            for fn in list(self._problem_listeners):
+                try:
+                    fn(info)
+                except Exception as e:
+                    log.warning("Outbox %s: on_problem: %s", self.name, e)
+
+    def _prune(self) -> None:
+        """Раз в час удаляет давно отправленные записи."""
+        now = time.time()
+        if now - self._pruned < 3600:
+            return
+        self._pruned = now
+        with self.lock:
+            self.db.execute("DELETE FROM ops WHERE status = 'done' AND created < ?", (now - OUTBOX_KEEP_DAYS * 86400,))
+            self.db.commit()
+
+    def _find_existing(self, dedupe: dict, created: float) -> Optional[str]:
+        """Страница, созданная прошлой «потерянной» попыткой (фильтр + создана не раньше записи в очередь)."""
+        since = {"timestamp": "created_time", "created_time": {"on_or_after": _iso(created - 60)}}
+        payload = {"filter": {"and": [dedupe["filter"], since]}}
+        for page in notion_http.iter_query(dedupe["database_id"], self.headers, payload, limit=1):
+            return page.get("id")
+        return None
+
+    def _get_page(self, url: str) -> dict:
+        r = notion_http.request("GET", url, self.headers, retries=SEND_RETRIES)
+        if 400 <= r.status_code < 500 and r.status_code != 429:
+            # страницу удалили или закрыли доступ — повтор ничего не изменит
+            raise Reject(f"страница недоступна: {r.status_code} {r.text[:300]}")
+        r.raise_for_status()
+        return notion_http.response_json(r)
+
+    def _run_handler(self, op: sqlite3.Row, retry_at: float) -> tuple:
+        op_id, key = op["id"], op["key"]
+        fn = self.handlers.get(op["kind"])
+        if fn is None:
+            return "pending", 0, retry_at, None, f"нет обработчика для {op['kind']}", op_id
+        # записи, которые обработчик поставит сам (строка в Notion после загрузки фото), — тому же чату
+        token = metrics.origin_chat.set(op["chat_id"])
+        try:
+            return "done", 0, 0, fn(notion_http.loads(op["payload"])), None, op_id
+        except Reject as e:
+            log.warning("Outbox %s: %s отклонена: %s", self.name, key, e)
+            return "failed", 0, 0, None, str(e)[:500], op_id
+        except Exception as e:
+            log.warning("Outbox %s: %s — %s, повтор через %.0f с", self.name, key, e, retry_at - time.time())
+            return "pending", 1, retry_at, None, str(e)[:500], op_id
+        finally:
+            metrics.origin_chat.reset(token)
+
+    def _send(self, op: sqlite3.Row) -> tuple:
+        """
+        Одна попытка. Возвращает параметры UPDATE: (status, in_doubt, next_try, result, error, id).
+        Исключений не бросает — иначе run_bounded уронил бы поток очереди вместе с результатами пачки.
+        """
+        op_id, key = op["id"], op["key"]
+        try:
+            return self._attempt(op)
+        except Reject as e:
+            log.warning("Outbox %s: %s отклонена: %s", self.name, key, e)
+            return "failed", 0, 0, None, str(e)[:500], op_id
+        except Exception as e:
+            retry_at = time.time() + _delay(op["attempts"] + 1)
+            error = f"{type(e).__name__}: {e}"[:500]
+            log.warning("Outbox %s: %s — %s, повтор через %.0f с", self.name, key, error, retry_at - time.time())
+            # ответ мог потеряться уже после создания страницы (200 не-JSON) — перед повтором проверим дубль
+            doubt = 1 if op["method"] == "POST" and op["dedupe"] else 0
+            return "pending", doubt, retry_at, None, error, op_id
+
+    def _attempt(self, op: sqlite3.Row) -> tuple:
+        op_id, key, method, url = op["id"], op["key"], op["method"], op["url"]
+        attempts = op["attempts"] + 1
+        retry_at = time.time() + _delay(attempts)
+        if op["kind"] != "notion":
+            return self._run_handler(op, retry_at)
+        try:
+            payload = notion_http.loads(op["payload"]) if op["payload"] else None
+        except ValueError as e:
+            raise Reject(f"повреждённая запись: {e}")
+        try:
+            if op["in_doubt"] and op["dedupe"] and method == "POST":
+                page_id = self._find_existing(notion_http.loads(op["dedupe"]), op["created"])
+                if page_id:
+                    log.info("Outbox %s: %s уже создана (%s), повтор не нужен", self.name, key, page_id)
+                    return "done", 0, 0, page_id, None, op_id
+            if op["expect_edited"] or op["merge_files"]:
+                page = self._get_page(url)
+                edited = page.get("last_edited_time") or ""
+                if op["expect_edited"] and edited > op["expect_edited"]:
+                    error = f"страница изменена в Notion после правки офлайн ({op['expect_edited']} → {edited})"
+                    log.warning("Outbox %s: %s — конфликт: %s", self.name, key, error)
+                    return "conflict", 0, 0, edited, error, op_id
+                if op["merge_files"]:
+                    try:
+                        payload = _merge_files(payload, page, op["merge_files"])
+                    except (KeyError, TypeError, AttributeError) as e:
+                        raise Reject(f"не удалось дописать файлы ({op['merge_files']}): {type(e).__name__}: {e}")
+            r = notion_http.request(method, url, self.headers, payload, retries=SEND_RETRIES)
+        except requests.RequestException as e:
+            log.warning("Outbox %s: %s — сеть недоступна (%s), попытка %s", self.name, key, e, attempts)
+            return "pending", 1, retry_at, None, str(e)[:500], op_id
+
+        if r.status_code in (200, 201):
+            return "done", 0, 0, notion_http.response_json(r).get("id", ""), None, op_id
+        error = f"{r.status_code} {r.text[:500]}"
+        if r.status_code in (409, 429) or r.status_code >= 500:
+            log.warning("Outbox %s: %s — %s, повтор через %.0f с", self.name, key, r.status_code, retry_at - time.time())
+            # 5xx/409: Notion мог успеть создать страницу; 429 — эта попытка не прошла, но прошлая могла.
+            # Сомнение снимают только успех или окончательный отказ 4xx — иначе повтор POST даст дубль
+            doubt = 1 if method == "POST" and op["dedupe"] else 0
+            return "pending", doubt, retry_at, None, error, op_id
+        log.warning("Outbox %s: %s отклонена Notion: %s", self.name, key, error)
+        return "failed", 0, 0, None, error, op_id
+
+
+def _merge_files(payload: dict, page: dict, prop: str) -> dict:
+    """Текущие файлы страницы + новые из payload (ссылки, которые уже есть, не дублируем)."""
+    current = ((page.get("properties") or {}).get(prop) or {}).get("files") or []
+    seen = {(f.get("external") or f.get("file") or {}).get("url") for f in current}
+    new = [f for f in payload["properties"][prop]["files"] if (f.get("external") or {}).get("url") not in seen]
+    return {"properties": {prop: {"files": current + new}}}
+
+
+_outboxes: Dict[str, Outbox] = {}
+_outboxes_lock = threading.Lock()
+
+
+def get(name: str, headers: Dict[str, str]) -> Optional[Outbox]:
+    """Очередь бота name (одна на процесс) или None, если очередь выключена (NOTION_OUTBOX=0)."""
+    if not OUTBOX_ENABLED:
+        return None
+    with _outboxes_lock:
+        ob = _outboxes.get(name)
+        if ob is None:
+            ob = _outboxes[name] = Outbox(name, headers)
+        return ob
+
+
+def all_outboxes() -> List[Outbox]:
+    """Очереди, открытые в этом процессе (для /stats)."""
+    with _outboxes_lock:
+        return list(_outboxes.values())
+
+
+def _local_time(ts: Optional[str]) -> str:
+    """last_edited_time Notion ('2025-10-17T08:15:00.000Z') -> '17.10 13:15' по местному времени."""
+    try:
+        return datetime.fromisoformat((ts or "").replace("Z", "+00:00")).astimezone().strftime("%d.%m %H:%M")
+    except ValueError:
+        return ts or "?"
+
+
+def problem_text(op: dict) -> str:
+    what = op["label"] or op["key"]
+    if op["status"] == "conflict":
+        return (f"⚠️ Правка не применена: {what}\n"
+                f"Задачу изменили в Notion после вашей правки без связи: вы видели версию от "
+                f"{_local_time(op.get('expect_edited'))}, в Notion она уже от {_local_time(op.get('edited'))}.\n"
+                f"Проверь задачу и повтори правку, если она ещё нужна.")
+    return (f"✗ Notion не принял запись: {what}\n{op['error'][:300]}\n"
+            f"Она не сохранена — проверь данные и отправь заново.")
+
+
+def notify(app, outbox: Outbox, admin_chat_id: int = metrics.ADMIN_CHAT_ID) -> None:
+    """
+    Неудачи и конфликты очереди — сообщением в чат, откуда пришла запись; нет чата — ADMIN_CHAT_ID;
+    нет и его — только в лог.
+    Отправка планируется через JobQueue бота (из потока очереди это потокобезопасно).
+    """
+    def on_problem(op: dict) -> None:
+        chat = op.get("chat_id") or admin_chat_id
+        if not chat:
+            return
+        text = problem_text(op)
+
+        async def send(context) -> None:
+            try:
+                await context.bot.send_message(chat_id=chat, text=text)
+            except Exception as e:
+                log.warning("Outbox %s: не удалось сообщить в чат %s: %s", outbox.name, chat, e)
+
+        app.job_queue.run_once(send, when=0)
+
+    outbox.on_problem(on_problem)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Состояние очереди записей в Notion")
+    ap.add_argument("file", help="файл очереди, например outbox/pf-bot.sqlite")
+    ap.add_argument("--retry-failed", action="store_true", help="вернуть отклонённые записи в очередь")
+    args = ap.parse_args()
+    if not os.path.exists(args.file):
+        print(f"Нет файла очереди: {args.file}")
+        sys.exit(1)
+
+    directory, fname = os.path.split(args.file)
+    ob = Outbox(os.path.splitext(fname)[0], {}, directory or ".")
+    if args.retry_failed:
+        print(f"Возвращено в очередь: {ob.retry_failed()} (отправятся при работающем боте)")
+    with ob.lock:
+        rows = ob.db.execute("SELECT status, COUNT(*), MIN(created) FROM ops GROUP BY status").fetchall()
+    for status, n, oldest in rows:
+        age = timedelta(seconds=int(time.time() - oldest))
+        print(f"{status:<8} {n:>6}   старейшая: {age} назад")
+    for key, label, error, attempts in ob.failed():
+        print(f"  ✗ {key} [{label}] попыток {attempts}: {error}")
+    for key, label, error, attempts in ob.failed(status="conflict"):
+        print(f"  ⚠ {key} [{label}] конфликт: {error}")
+
+
+if __name__ == "__main__":
+    main()
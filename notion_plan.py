@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Планы пакетных операций Notion (режимы --plan / --apply у CLI-скриптов).
+--plan  : скрипт считает полный набор операций по локальному зеркалу, печатает число
+          API-вызовов и оценку времени под лимит 3 запроса/сек, сохраняет план в JSON.
+--apply : выполняет сохранённый план как есть, ничего не пересчитывая.
+
+Формат файла:
+  {"tool": "...", "created": "...", "database_id": "...", "workers": 3,
+   "ops": [{"method": "POST", "path": "/pages", "body": {...}, "label": "..."}],
+   "estimate": {"calls": N, "seconds": S}}
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import notion_http
+
+# Средняя задержка одного ответа Notion (сек) — для оценки при малом параллелизме
+EST_LATENCY = float(os.getenv("NOTION_EST_LATENCY", "0.4"))
+
+
+def op(method: str, path: str, body: Optional[Dict[str, Any]] = None, label: str = "") -> Dict[str, Any]:
+    return {"method": method, "path": path, "body": body, "label": label}
+
+
+def estimate(ops: List[Dict[str, Any]], workers: int = 1, extra_calls: int = 0) -> Dict[str, Any]:
+    """
+    calls   — число API-вызовов на этапе --apply;
+    seconds — оценка: упираемся либо в лимит частоты, либо в задержку при данном параллелизме.
+    extra_calls — вызовы, уже потраченные на построение плана (синхронизация зеркала), для справки.
+    """
+    calls = len(ops)
+    by_rate = calls / notion_http.NOTION_RPS if notion_http.NOTION_RPS > 0 else 0.0
+    by_latency = calls * EST_LATENCY / max(workers, 1)
+    by_method: Dict[str, int] = {}
+    for o in ops:
+        by_method[o["method"]] = by_method.get(o["method"], 0) + 1
+    return {
+        "calls": calls,
+        "by_method": by_method,
+        "seconds": round(max(by_rate, by_latency), 1),
+        "rps": notion_http.NOTION_RPS,
+        "planning_calls": extra_calls,
+    }
+
+
+def save(path: str, tool: str, database_id: str, ops: List[Dict[str, Any]],
+         workers: int = 1, extra_calls: int = 0) -> Dict[str, Any]:
+    plan = {
+        "tool": tool,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "database_id": database_id,
+        "workers": workers,
+        "ops": ops,
+        "estimate": estimate(ops, workers, extra_calls),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    return plan
+
+
+def load(path: str, tool: Optional[str] = None) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if tool and plan.get("tool") != tool:
+        raise RuntimeError(f"План {path} создан для {plan.get('tool')}, а не для {tool}")
+    return plan
+
+
+def summary(plan: Dict[str, Any]) -> str:
+    est = plan["estimate"]
+    methods = ", ".join(f"{m}: {n}" for m, n in sorted(est["by_method"].items())) or "—"
+    return (
+        f"План {plan['tool']} ({plan['created']}):\n"
+        f"  API-вызовов: {est['calls']} ({methods})\n"
+        f"  Оценка времени: ~{est['seconds']} с при {est['rps']:g} запр/с и {plan['workers']} потоках\n"
+        f"  Вызовов на построение плана (синхронизация зеркала): {est['planning_calls']}"
+    )
+
+
+def apply(plan: Dict[str, Any], headers: Dict[str, str], workers: Optional[int] = None) -> Tuple[int, int, notion_http.Stats]:
+    """Выполняет операции плана. Возвращает (успешно, с ошибками, статистика)."""
+    stats = notion_http.Stats()
+    ops = plan["ops"]
+
+    def _run(o: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+        r = notion_http.request(o["method"], notion_http.API + o["path"], headers, o.get("body"), stats=stats)
+        return o, r
+
+    ok = fail = 0
+    for o, r in notion_http.run_bounded(_run, ops, workers or plan.get("workers", 1)):
+        if r.status_code in (200, 201):
+            ok += 1
+            print(f"  √ {o['label'] or o['method'] + ' ' + o['path']}")
+        else:
+            fail += 1
+            print(f"  × {o['label'] or o['method'] + ' ' + o['path']}: {r.status_code} {r.text[:200]}")
+    return ok, fail, stats
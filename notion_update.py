@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
-import os, json, requests, argparse, sys
+import os, argparse, sys
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator
+
+import notion_http
+from notion_models import P, decode_task
 
 # ===== ПЕРЕМЕННЫЕ ОКРУЖЕНИЯ =====
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DATABASE_ID  = os.getenv("NOTION_TASKS_DB")
 
-API = "https://api.notion.com/v1"
+API = notion_http.API
 HEADERS = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
     "Content-Type": "application/json",
@@ -23,6 +26,10 @@ SOURCE_PROP     = "Источник (Source)"   # Select
 PRIORITY_PROP   = "Приоритет"           # Select (если есть)
 SIZE_PROP       = "Сложность (Size)"    # Select (если есть)
 
+# Карта для декодера задач (notion_models.Task)
+PROPS_MAP = dict(P, TITLE_ID=TITLE_PROP, NAME=NAME_TEXT_PROP, STATUS=STATUS_PROP,
+                 DEADLINE=DEADLINE_PROP, SOURCE=SOURCE_PROP)
+
 # ===== АЛИАСЫ =====
 STATUS_ALIASES = {
     "не начато":"Not started","не начата":"Not started",
@@ -57,8 +64,8 @@ def parse_deadline(s: Optional[str]) -> Optional[str]:
     return s
 
 def db_properties() -> Dict:
-    r = requests.get(f"{API}/databases/{DATABASE_ID}", headers=HEADERS)
-    return r.json() if r.status_code==200 else {}
+    r = notion_http.request("GET", f"{API}/databases/{DATABASE_ID}", HEADERS)
+    return notion_http.response_json(r) if r.status_code==200 else {}
 
 def allowed_statuses() -> List[str]:
     try:
@@ -75,34 +82,33 @@ def allowed_select(prop: str) -> List[str]:
         return []
 
 # ---------- Поиск страницы ----------
-def query(payload: Dict) -> Dict:
-    r = requests.post(f"{API}/databases/{DATABASE_ID}/query",
-                      headers=HEADERS, data=json.dumps(payload))
-    return r.json()
+def query(payload: Dict, limit: Optional[int] = None) -> List[Dict]:
+    """Все результаты /query (с пагинацией), не больше limit."""
+    return list(notion_http.iter_query(DATABASE_ID, HEADERS, payload, limit=limit))
+
+def scan_pages(stats: Optional[notion_http.Stats] = None) -> Iterator[Dict]:
+    """Все страницы базы одним постраничным обходом (для пакетного поиска): только ID и название."""
+    return notion_http.iter_query(DATABASE_ID, HEADERS, {}, stats=stats,
+                                  filter_properties=[TITLE_PROP, NAME_TEXT_PROP])
 
 def find_by_intel_id(intel_id: str) -> Optional[Dict]:
     # Ищем по Title equals
     payload = {
         "filter": {"property": TITLE_PROP, "title": {"equals": intel_id}},
-        "page_size": 1
     }
-    data = query(payload)
-    res = data.get("results", [])
+    res = query(payload, limit=1)
     return res[0] if res else None
 
 def find_by_name_contains(substr: str) -> List[Dict]:
     payload = {
         "filter": {"property": NAME_TEXT_PROP, "rich_text": {"contains": substr}},
-        "page_size": 50
     }
-    data = query(payload)
-    return data.get("results", [])
+    return query(payload)
 
 # ---------- Обновление ----------
-def patch_page(page_id: str, props: Dict) -> bool:
-    r = requests.patch(f"{API}/pages/{page_id}",
-                       headers=HEADERS,
-                       data=json.dumps({"properties": props}))
+def patch_page(page_id: str, props: Dict, stats: Optional[notion_http.Stats] = None) -> bool:
+    r = notion_http.request("PATCH", f"{API}/pages/{page_id}", HEADERS,
+                            {"properties": props}, stats=stats)
     return r.status_code==200
 
 def build_props(status=None, deadline=None, source=None, priority=None, size=None, new_name=None) -> Dict:
@@ -187,16 +193,9 @@ def main():
     ok, fail = 0, 0
     for pg in pages:
         pid = pg["id"]
-        title_txt = ""
-        try:
-            title_txt = pg["properties"][TITLE_PROP]["title"][0]["plain_text"]
-        except Exception:
-            pass
-        name_txt = ""
-        try:
-            name_txt = pg["properties"][NAME_TEXT_PROP]["rich_text"][0]["plain_text"]
-        except Exception:
-            pass
+        task = decode_task(pg, PROPS_MAP)
+        title_txt = task.code or ""
+        name_txt = task.name or ""
 
         if patch_page(pid, props):
             ok += 1
@@ -1,91 +1,251 @@
 # -*- coding: utf-8 -*-
-import os, sys
+import os, sys, argparse
+from typing import Dict, List, Optional, Tuple
 
 from notion_update import (  # используем функции из первого файла
     normalize, parse_deadline, allowed_statuses, allowed_select,
-    find_by_intel_id, find_by_name_contains, patch_page,
+    find_by_intel_id, find_by_name_contains, patch_page, scan_pages,
     build_props, STATUS_ALIASES, PRIORITY_ALIASES, SIZE_ALIASES,
-    TITLE_PROP, NAME_TEXT_PROP
+    PROPS_MAP, DATABASE_ID, HEADERS
 )
+import notion_http
+import notion_plan
+from notion_mirror import Mirror
+from notion_models import Task, decode_task, iter_tasks
 
 INPUT_FILE = "updates.txt"
+DEFAULT_WORKERS = 3
 
 def is_intel_id(s: str) -> bool:
     s = s.strip().upper()
     return s.startswith("INTEL-") and s[6:].isdigit()
 
-def main():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Файл {INPUT_FILE} не найден.")
-        sys.exit(1)
-
+def parse_update_line(line: str) -> Tuple[str, Dict[str, str]]:
+    """'INTEL-023;STATUS=Done;DEADLINE=2025-09-27' -> ('INTEL-023', {'STATUS': 'Done', ...})"""
+    parts = [p.strip() for p in line.split(";") if p.strip()]
+    ident  = parts[0]
+    kv = {}
+    for p in parts[1:]:
+        if "=" in p:
+            k,v = p.split("=",1)
+            kv[k.strip().upper()] = v.strip()
+    return ident, kv
+
+def props_for_update(kv: Dict[str, str], line: str, allowed_stat, allowed_pri, allowed_size) -> Optional[Dict]:
+    """Нормализует и проверяет значения. Возвращает props для PATCH или None (строку пропускаем)."""
+    new_status   = normalize(kv.get("STATUS"),   STATUS_ALIASES)
+    new_deadline = parse_deadline(kv.get("DEADLINE"))
+    new_source   = kv.get("SOURCE")
+    new_priority = normalize(kv.get("PRIORITY"), PRIORITY_ALIASES)
+    new_size     = normalize(kv.get("SIZE"),     SIZE_ALIASES)
+    new_name     = kv.get("RENAME")
+
+    if new_status and allowed_stat and new_status not in allowed_stat:
+        print(f"⚠ Статус «{new_status}» не найден. Пропускаю строку: {line}")
+        return None
+    if new_priority and allowed_pri and new_priority not in allowed_pri:
+        print(f"⚠ Приоритет «{new_priority}» не найден. Пропускаю строку: {line}")
+        return None
+    if new_size and allowed_size and new_size not in allowed_size:
+        print(f"⚠ Сложность «{new_size}» не найдена. Пропускаю строку: {line}")
+        return None
+
+    return build_props(new_status, new_deadline, new_source, new_priority, new_size, new_name)
+
+
+def read_lines(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [raw.strip() for raw in f if raw.strip()]
+
+def main_sequential(path: str):
+    """Старый режим: построчно — поиск и PATCH для каждой строки по очереди."""
     allowed_stat = allowed_statuses()
     allowed_pri  = allowed_select("Приоритет")
     allowed_size = allowed_select("Сложность (Size)")
 
     ok, fail = 0, 0
 
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        for raw in f:
-            line = raw.strip()
-            if not line: continue
-
-            parts = [p.strip() for p in line.split(";") if p.strip()]
-            ident  = parts[0]
-            kv = {}
-            for p in parts[1:]:
-                if "=" in p:
-                    k,v = p.split("=",1)
-                    kv[k.strip().upper()] = v.strip()
-
-            new_status   = normalize(kv.get("STATUS"),   STATUS_ALIASES)
-            new_deadline = parse_deadline(kv.get("DEADLINE"))
-            new_source   = kv.get("SOURCE")
-            new_priority = normalize(kv.get("PRIORITY"), PRIORITY_ALIASES)
-            new_size     = normalize(kv.get("SIZE"),     SIZE_ALIASES)
-            new_name     = kv.get("RENAME")
-
-            if new_status and allowed_stat and new_status not in allowed_stat:
-                print(f"⚠ Статус «{new_status}» не найден. Пропускаю строку: {line}")
-                fail += 1
-                continue
-            if new_priority and allowed_pri and new_priority not in allowed_pri:
-                print(f"⚠ Приоритет «{new_priority}» не найден. Пропускаю строку: {line}")
-                fail += 1
-                continue
-            if new_size and allowed_size and new_size not in allowed_size:
-                print(f"⚠ Сложность «{new_size}» не найдена. Пропускаю строку: {line}")
+    for line in read_lines(path):
+        ident, kv = parse_update_line(line)
+        props = props_for_update(kv, line, allowed_stat, allowed_pri, allowed_size)
+        if props is None:
+            fail += 1
+            continue
+
+        if is_intel_id(ident):
+            page = find_by_intel_id(ident)
+            pages = [page] if page else []
+        else:
+            pages = find_by_name_contains(ident)
+
+        if not pages:
+            print(f"✗ Не найдено по идентификатору/подстроке: {ident}")
+            fail += 1
+            continue
+
+        for pg in pages:
+            pid = pg["id"]
+            if patch_page(pid, props):
+                ok += 1
+                task = decode_task(pg, PROPS_MAP)
+                print(f"  ✓ Обновлено: {task.code or ''} — «{task.name or ''}»")
+            else:
                 fail += 1
-                continue
+                print(f"  ✗ Ошибка обновления строки: {line}")
 
-            if is_intel_id(ident):
-                page = find_by_intel_id(ident)
-                pages = [page] if page else []
-            else:
-                pages = find_by_name_contains(ident)
+    print(f"— Готово. Успешно: {ok}, с ошибками: {fail}")
 
-            if not pages:
-                print(f"✗ Не найдено по идентификатору/подстроке: {ident}")
-                fail += 1
-                continue
-
-            props = build_props(new_status, new_deadline, new_source, new_priority, new_size, new_name)
-
-            for pg in pages:
-                pid = pg["id"]
-                if patch_page(pid, props):
-                    ok += 1
-                    try:
-                        t = pg["properties"][TITLE_PROP]["title"][0]["plain_text"]
-                        n = pg["properties"][NAME_TEXT_PROP]["rich_text"][0]["plain_text"]
-                    except Exception:
-                        t=n=""
-                    print(f"  ✓ Обновлено: {t} — «{n}»")
-                else:
-                    fail += 1
-                    print(f"  ✗ Ошибка обновления строки: {line}")
+def parse_jobs(path: str) -> Tuple[List[Tuple[str, str, Dict]], int]:
+    """Разбирает и проверяет все строки файла. Возвращает ([(line, ident, props)], отброшено)."""
+    allowed_stat = allowed_statuses()
+    allowed_pri  = allowed_select("Приоритет")
+    allowed_size = allowed_select("Сложность (Size)")
 
+    fail = 0
+    jobs: List[Tuple[str, str, Dict]] = []
+    for line in read_lines(path):
+        ident, kv = parse_update_line(line)
+        props = props_for_update(kv, line, allowed_stat, allowed_pri, allowed_size)
+        if props is None:
+            fail += 1
+            continue
+        jobs.append((line, ident, props))
+    return jobs, fail
+
+def resolve_and_merge(jobs, all_pages) -> Tuple[Dict[str, Dict], Dict[str, Task], int]:
+    """
+    Резолвит идентификаторы по одному проходу all_pages и сливает обновления одной страницы
+    в один набор props (поздние строки перекрывают ранние).
+    Страницы декодируются в компактные Task сразу при обходе — сырой JSON в памяти не держим.
+    Возвращает (page_id -> props, page_id -> Task, не найдено).
+    """
+    by_title: Dict[str, Task] = {}
+    by_name: List[Tuple[str, Task]] = []
+    for task in iter_tasks(all_pages, PROPS_MAP):
+        if task.code:
+            by_title.setdefault(task.code.strip().upper(), task)
+        by_name.append(((task.name or "").lower(), task))
+
+    fail = 0
+    merged: Dict[str, Dict] = {}
+    pages: Dict[str, Task] = {}
+    for line, ident, props in jobs:
+        if is_intel_id(ident):
+            page = by_title.get(ident.strip().upper())
+            found = [page] if page else []
+        else:
+            needle = ident.lower()
+            found = [task for n, task in by_name if needle in n]
+
+        if not found:
+            print(f"✗ Не найдено по идентификатору/подстроке: {ident}")
+            fail += 1
+            continue
+        for task in found:
+            merged.setdefault(task.id, {}).update(props)
+            pages[task.id] = task
+    return merged, pages, fail
+
+def main_pipeline(path: str, workers: int = DEFAULT_WORKERS, use_mirror: bool = False):
+    """
+    Конвейер:
+      1) разбираем и проверяем все строки;
+      2) резолвим все идентификаторы одним постраничным обходом базы (или по локальному зеркалу);
+      3) сливаем несколько обновлений одной страницы в один PATCH (поздние строки перекрывают ранние);
+      4) выполняем PATCH'и с ограниченным параллелизмом (общий лимит 3 запроса/сек).
+    Поиск по подстроке идёт по названиям на момент обхода (RENAME в том же файле на поиск не влияет).
+    """
+    stats = notion_http.Stats()
+
+    # 1) разбор
+    jobs, fail = parse_jobs(path)
+
+    # 2) + 3) один обход базы и слияние по page_id
+    if use_mirror:
+        mirror = Mirror(DATABASE_ID, HEADERS)
+        mirror.sync(stats=stats)
+        all_pages = mirror.iter_pages()
+    else:
+        all_pages = scan_pages(stats)
+    merged, pages, not_found = resolve_and_merge(jobs, all_pages)
+    fail += not_found
+
+    print(f"Строк: {len(jobs)}, страниц к обновлению: {len(merged)} (потоков: {workers})")
+
+    # 4) PATCH с ограниченным параллелизмом
+    def _patch(pid: str) -> Tuple[str, bool]:
+        return pid, patch_page(pid, merged[pid], stats=stats)
+
+    ok = 0
+    for pid, done in notion_http.run_bounded(_patch, list(merged), workers):
+        task = pages[pid]
+        if done:
+            ok += 1
+            print(f"  ✓ Обновлено: {task.code or ''} — «{task.name or ''}»")
+        else:
+            fail += 1
+            print(f"  ✗ Ошибка обновления: {task.code or ''} — «{task.name or ''}» (page_id={pid})")
+
+    print(f"— Готово. Успешно: {ok}, с ошибками: {fail}")
+    print(stats.report(ok))
+
+def plan(path: str, plan_path: str, workers: int = DEFAULT_WORKERS):
+    """--plan: резолвим по локальному зеркалу, считаем PATCH'и и сохраняем план."""
+    stats = notion_http.Stats()
+    jobs, fail = parse_jobs(path)
+    mirror = Mirror(DATABASE_ID, HEADERS)
+    mirror.sync(stats=stats)
+    merged, pages, not_found = resolve_and_merge(jobs, mirror.iter_pages())
+
+    ops = []
+    for pid, props in merged.items():
+        task = pages[pid]
+        ops.append(notion_plan.op("PATCH", f"/pages/{pid}", {"properties": props},
+                                  f"{task.code or ''} — «{task.name or ''}»"))
+
+    # allowed_statuses()/allowed_select() тоже ходят в API — учтём их в стоимости планирования
+    p = notion_plan.save(plan_path, "notion_update_from_file", DATABASE_ID, ops,
+                         workers=workers, extra_calls=stats.requests + 3)
+    print(f"Строк: {len(jobs)}, не найдено/отброшено: {fail + not_found}, страниц к обновлению: {len(merged)}")
+    print(notion_plan.summary(p))
+    print(f"План сохранён: {plan_path}. Выполнить: python notion_update_from_file.py --apply {plan_path}")
+
+def apply(plan_path: str, workers: Optional[int] = None):
+    """--apply: выполняем сохранённый план без пересчёта."""
+    p = notion_plan.load(plan_path, "notion_update_from_file")
+    print(notion_plan.summary(p))
+    ok, fail, stats = notion_plan.apply(p, HEADERS, workers)
     print(f"— Готово. Успешно: {ok}, с ошибками: {fail}")
+    print(stats.report(ok))
+
+def main():
+    ap = argparse.ArgumentParser(description="Пакетное обновление задач Notion из файла")
+    ap.add_argument("--file", default=INPUT_FILE, help=f"Файл обновлений (по умолчанию {INPUT_FILE})")
+    ap.add_argument("--pipeline", action="store_true",
+                    help="Конвейер: один обход базы, слияние PATCH'ей, параллельное выполнение")
+    ap.add_argument("--workers", type=int, default=None,
+                    help=f"Потоков для PATCH (--pipeline/--plan: по умолчанию {DEFAULT_WORKERS}; "
+                         f"--apply: по умолчанию — как в плане)")
+    ap.add_argument("--from-mirror", action="store_true", help="В режиме --pipeline резолвить по локальному зеркалу")
+    ap.add_argument("--plan", metavar="PLAN.json", help="Только посчитать операции и сохранить план")
+    ap.add_argument("--apply", metavar="PLAN.json", help="Выполнить сохранённый план")
+    args = ap.parse_args()
+
+    if args.apply:
+        apply(args.apply, args.workers)
+        return
+
+    if not os.path.exists(args.file):
+        print(f"Файл {args.file} не найден.")
+        sys.exit(1)
+
+    workers = args.workers or DEFAULT_WORKERS
+    if args.plan:
+        plan(args.file, args.plan, workers)
+    elif args.pipeline:
+        main_pipeline(args.file, workers, args.from_mirror)
+    else:
+        main_sequential(args.file)
 
 if __name__ == "__main__":
     main()
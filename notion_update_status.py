@@ -1,6 +1,9 @@
 import os, sys, json, requests, time
 from datetime import datetime
 
+import notion_http
+from notion_models import P, decode_task
+
 # ==== НАСТРОЙКА ИМЁН СВОЙСТВ В ТВОЕЙ БАЗЕ ====
 TITLE_PROP      = "ID (текст)"          # Это Title-колонка (левая первая)
 NAME_TEXT_PROP  = "Название задачи"     # Обычный Text
@@ -8,6 +11,9 @@ STATUS_PROP     = "Статус"              # Status
 DEADLINE_PROP   = "Срок ( Deadline)"    # Date (обрати внимание на пробел)
 SOURCE_PROP     = "Источник (Source)"   # Select (не используется здесь)
 
+PROPS_MAP = dict(P, TITLE_ID=TITLE_PROP, NAME=NAME_TEXT_PROP, STATUS=STATUS_PROP,
+                 DEADLINE=DEADLINE_PROP, SOURCE=SOURCE_PROP)
+
 # ==== Русско-английские алиасы статусов ====
 STATUS_ALIASES = {
     "не начато": "Not started",
@@ -36,7 +42,7 @@ HEADERS = {
 }
 
 def get_database_schema():
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}"
+    url = f"{notion_http.API}/databases/{DATABASE_ID}"
     r = requests.get(url, headers=HEADERS, timeout=30)
     r.raise_for_status()
     return r.json()
@@ -52,18 +58,14 @@ def get_allowed_statuses():
 
 def find_pages_by_name_contains(substr):
     """Ищем по подстроке в 'Название задачи' (Text). Возвращаем список страниц."""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
     payload = {
         "filter": {
             "property": NAME_TEXT_PROP,
             "rich_text": {"contains": substr}
         },
-        "page_size": 10,
         "sorts": [{"timestamp": "last_edited_time", "direction": "descending"}]
     }
-    r = requests.post(url, headers=HEADERS, data=json.dumps(payload), timeout=30)
-    r.raise_for_status()
-    return r.json().get("results", [])
+    return list(notion_http.iter_query(DATABASE_ID, HEADERS, payload))
 
 def update_status(page_id, new_status):
     payload = {
@@ -71,7 +73,7 @@ def update_status(page_id, new_status):
             STATUS_PROP: {"status": {"name": new_status}}
         }
     }
-    url = f"https://api.notion.com/v1/pages/{page_id}"
+    url = f"{notion_http.API}/pages/{page_id}"
     r = requests.patch(url, headers=HEADERS, data=json.dumps(payload), timeout=30)
     if r.status_code in (200, 204):
         return True, {}
@@ -100,11 +102,7 @@ def main():
 
     page = pages[0]
     ok, info = update_status(page["id"], new_status)
-    title_show = None
-    try:
-        title_show = page["properties"][NAME_TEXT_PROP]["rich_text"][0]["plain_text"]
-    except Exception:
-        title_show = "(без названия)"
+    title_show = decode_task(page, PROPS_MAP).name or "(без названия)"
 
     if ok:
         print(f"✅ Статус обновлён: «{title_show}» → {new_status} (page_id={page['id']})")
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Работа при плохой связи на объекте.
+
+- состояние канала: online() / mark_down() / mark_up(). В режиме auto после сетевой ошибки
+  считаем себя офлайн и раз в OFFLINE_PROBE_S проверяем, открывается ли TCP-соединение с API;
+  при восстановлении вызываются подписчики on_reconnect (очереди сразу досылают накопленное)
+- спул медиа: файлы, которые не удалось загрузить сразу, лежат в SPOOL_DIR до отправки
+- маленький кэш справочников на диске (разделы и т.п.) — чтобы меню работали без связи
+- фоновое обновление зеркал Notion (notion_mirror.Mirror), пока связь есть — из них читаем офлайн;
+  это отдельная повторяющаяся задача JobQueue бота (start_refresh), она работает и при OFFLINE_MODE=off
+
+Включается в ботах вызовом start() (+ start_refresh(app) для зеркал); в CLI-скриптах (массовые загрузки и т.п.) офлайн-логики нет —
+там по-прежнему работают обычные ретраи notion_http.
+
+Настройки:
+    OFFLINE_MODE=auto        auto — по факту ошибок сети; on — всегда офлайн (проверка); off — всегда онлайн
+    OFFLINE_PROBE_S=30       как часто проверять связь, пока её нет
+    OFFLINE_PROBE_URL=...    что проверять (по умолчанию NOTION_API_BASE)
+    MIRROR_REFRESH_S=300     как часто обновлять зеркала, пока связь есть (0 — не обновлять)
+    SPOOL_DIR=spool, OFFLINE_CACHE=offline_cache.json
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, List, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+log = logging.getLogger("offline")
+
+load_dotenv()
+
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "auto").lower()
+OFFLINE_PROBE_S = float(os.getenv("OFFLINE_PROBE_S", "30"))
+OFFLINE_PROBE_URL = os.getenv("OFFLINE_PROBE_URL") or os.getenv("NOTION_API_BASE", "https://api.notion.com/v1")
+MIRROR_REFRESH_S = float(os.getenv("MIRROR_REFRESH_S", "300"))
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+OFFLINE_CACHE = os.getenv("OFFLINE_CACHE", "offline_cache.json")
+
+_lock = threading.Lock()
+_enabled = False        # start() в боте
+_down_since = 0.0       # 0 — связь есть
+_last_probe = 0.0
+_reconnect_listeners: List[Callable[[], None]] = []
+_mirrors: List[Any] = []
+_refresh_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+# ---- состояние канала ----
+
+def online() -> bool:
+    if not _enabled:
+        return True
+    if OFFLINE_MODE == "on":
+        return False
+    return not _down_since  # проверку канала делает фоновый поток — хендлеры не ждут сеть
+
+
+def mark_down(reason: str = "") -> None:
+    global _down_since, _last_probe
+    if not _enabled:
+        return
+    with _lock:
+        if _down_since:
+            return
+        _down_since = _last_probe = time.monotonic()
+    log.warning("Нет связи (%s) — работаем офлайн: чтение из зеркала, записи в очередь", reason or "ошибка сети")
+
+
+def mark_up() -> None:
+    global _down_since
+    with _lock:
+        if not _down_since:
+            return
+        offline_for = time.monotonic() - _down_since
+        _down_since = 0.0
+        listeners = list(_reconnect_listeners)
+    log.info("Связь восстановлена через %.0f с — досылаем очередь", offline_for)
+    for fn in listeners:
+        try:
+            fn()
+        except Exception as e:
+            log.warning("on_reconnect: %s", e)
+
+
+def probe(timeout: float = 3.0) -> bool:
+    """TCP-соединение с хостом API: есть ли канал вообще (без запроса и токена)."""
+    global _last_probe
+    _last_probe = time.monotonic()
+    u = urlparse(OFFLINE_PROBE_URL)
+    port = u.port or (443 if u.scheme == "https" else 80)
+    try:
+        with socket.create_connection((u.hostname, port), timeout=timeout):
+            pass
+    except OSError:
+        return False
+    mark_up()
+    return True
+
+
+def on_reconnect(fn: Callable[[], None]) -> None:
+    with _lock:
+        _reconnect_listeners.append(fn)
+
+
+def status_text() -> str:
+    if online():
+        return "🟢 связь есть"
+    return f"📴 офлайн {time.monotonic() - _down_since:.0f} с" if _down_since else "📴 офлайн (OFFLINE_MODE=on)"
+
+
+# ---- спул медиа ----
+
+def spool_put(name: str, data: bytes) -> str:
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    path = os.path.join(SPOOL_DIR, name)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def spool_path(name: str) -> str:
+    """Путь в спуле для больших файлов, которые пишутся потоком (без spool_put из памяти)."""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return os.path.join(SPOOL_DIR, name)
+
+
+def spool_read(name: str) -> bytes:
+    with open(os.path.join(SPOOL_DIR, name), "rb") as f:
+        return f.read()
+
+
+def spool_drop(name: str) -> None:
+    try:
+        os.remove(os.path.join(SPOOL_DIR, name))
+    except FileNotFoundError:
+        pass
+
+
+# ---- кэш справочников ----
+
+def cache_get(key: str, default: Any = None) -> Any:
+    try:
+        with open(OFFLINE_CACHE, "r", encoding="utf-8") as f:
+            return json.load(f).get(key, default)
+    except (OSError, ValueError):
+        return default
+
+
+def cache_put(key: str, value: Any) -> None:
+    with _lock:
+        try:
+            with open(OFFLINE_CACHE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[key] = value
+        tmp = OFFLINE_CACHE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, OFFLINE_CACHE)
+
+
+# ---- фон: проверка связи и обновление зеркал ----
+
+def keep_fresh(mirror: Any) -> None:
+    """Зеркало (notion_mirror.Mirror) будет обновляться в фоне (start_refresh), пока есть связь."""
+    with _lock:
+        _mirrors.append(mirror)
+
+
+def _refresh_mirrors() -> None:
+    if not _refresh_lock.acquire(blocking=False):
+        return  # прошлый обход ещё идёт (медленная сеть) — не наслаиваем
+    try:
+        for m in list(_mirrors):
+            try:
+                n = m.sync()
+                if n:
+                    log.info("Зеркало %s: обновлено страниц: %s", m.database_id, n)
+            except Exception as e:  # сеть пропала посреди обхода — mark_down уже сделал notion_http
+                log.warning("Зеркало %s не обновлено: %s", m.database_id, e)
+                return
+    finally:
+        _refresh_lock.release()
+
+
+def start_refresh(app) -> None:
+    """
+    Обновление зеркал — повторяющаяся задача JobQueue бота раз в MIRROR_REFRESH_S (первая — сразу).
+    Не зависит от OFFLINE_MODE и потока start(): пропускается только, пока связи нет.
+    """
+    if not MIRROR_REFRESH_S:
+        return
+
+    async def refresh(context) -> None:
+        if _mirrors and online():
+            await asyncio.to_thread(_refresh_mirrors)
+
+    app.job_queue.run_repeating(refresh, MIRROR_REFRESH_S, first=1.0, name="mirror-refresh")
+
+
+def _loop() -> None:
+    while True:
+        if OFFLINE_MODE != "on" and _down_since:
+            if time.monotonic() - _last_probe >= OFFLINE_PROBE_S:
+                probe()
+        time.sleep(min(OFFLINE_PROBE_S, 5.0))
+
+
+def start() -> None:
+    """Включает офлайн-режим процесса и фоновый поток проверки связи (зеркала — start_refresh)."""
+    global _thread, _enabled
+    with _lock:
+        if _thread is not None or OFFLINE_MODE == "off":
+            return
+        _enabled = True
+        _thread = threading.Thread(target=_loop, name="offline", daemon=True)
+        _thread.start()
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Дерево папок structure.txt в OneDrive через Microsoft Graph — без локального клиента OneDrive.
+
+- папки создаются по уровням (сначала родители), запросы уровня идут пачками через
+  POST /$batch, по GRAPH_BATCH_SIZE (у Graph не больше 20 в одной пачке)
+- conflictBehavior=fail: повторный запуск не плодит копии «Папка 1»; ответ 409 значит «уже есть» —
+  id такой папки добирается следующей пачкой GET items/{родитель}:/{имя}
+- id созданных/найденных папок лежат в кэше (ONEDRIVE_FOLDER_CACHE): при неизменной структуре
+  запросов к Graph нет вовсе, при изменённой — только для новых папок
+- папку удалили в OneDrive, а в кэше она есть (404 на родителя) — ветка выбрасывается из кэша и
+  проверяется заново
+- 429/503/504 внутри пачки — повтор только этих запросов после Retry-After
+- глубина дерева любая
+
+Настройки:
+    GRAPH_TOKEN=...                  токен с правом Files.ReadWrite
+    GRAPH_API_BASE=https://graph.microsoft.com/v1.0   (стенд: http://127.0.0.1:8787/v1.0)
+    ONEDRIVE_ROOT_ID=root            id папки, в которой создаётся проект
+    ONEDRIVE_PROJECT=Школа 65        папка проекта
+    ONEDRIVE_FOLDER_CACHE=onedrive_folders.json
+    GRAPH_BATCH_SIZE=20
+
+Запуск:
+    python onedrive_graph.py [--force]    # --force — не доверять кэшу, проверить все папки
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from dotenv import load_dotenv
+
+import notion_http
+from create_folders_from_structure import iter_paths_from_structure
+
+log = logging.getLogger("onedrive-graph")
+
+load_dotenv()
+
+GRAPH_TOKEN = os.getenv("GRAPH_TOKEN")
+GRAPH_API_BASE = os.getenv("GRAPH_API_BASE", "https://graph.microsoft.com/v1.0").rstrip("/")
+ONEDRIVE_ROOT_ID = os.getenv("ONEDRIVE_ROOT_ID", "root")
+ONEDRIVE_PROJECT = os.getenv("ONEDRIVE_PROJECT", "Школа 65")
+ONEDRIVE_CACHE = os.getenv("ONEDRIVE_FOLDER_CACHE", "onedrive_folders.json")
+GRAPH_BATCH_SIZE = min(int(os.getenv("GRAPH_BATCH_SIZE", "20")), 20)
+GRAPH_RETRIES = int(os.getenv("GRAPH_RETRIES", "5"))
+STRUCTURE_FILE = os.getenv("STRUCTURE_FILE", "structure.txt")
+
+Path = Tuple[str, ...]
+
+_RETRY_STATUS = (429, 503, 504)
+
+
+def structure_paths(filename: str = STRUCTURE_FILE, project: str = ONEDRIVE_PROJECT) -> List[Path]:
+    """Папки structure.txt кортежами имён от корня: (проект, корпус, раздел, ...)."""
+    return [(project,) + tuple(p.split(os.sep)) for p in iter_paths_from_structure("", filename)]
+
+
+def _key(path: Path) -> str:
+    return "/".join(path)
+
+
+class GraphFolders:
+    """Создание дерева папок в OneDrive. Вызовы блокирующие (requests)."""
+
+    def __init__(self, token: Optional[str] = GRAPH_TOKEN, base: str = GRAPH_API_BASE,
+                 root_id: str = ONEDRIVE_ROOT_ID, cache_path: Optional[str] = ONEDRIVE_CACHE,
+                 batch_size: int = GRAPH_BATCH_SIZE, session: Optional[requests.Session] = None):
+        self.base = base.rstrip("/")
+        self.root_id = root_id
+        self.cache_path = cache_path
+        self.batch_size = max(1, min(batch_size, 20))
+        self.session = session or requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        self.ids: Dict[str, str] = self._load_cache()
+        self.stats: Dict[str, int] = {"created": 0, "existing": 0, "cached": 0, "batches": 0, "retries": 0}
+
+    # ---- кэш id ----
+
+    def _load_cache(self) -> Dict[str, str]:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return dict(data.get("items") or {}) if data.get("root") == self.root_id else {}
+
+    def _save_cache(self) -> None:
+        if not self.cache_path:
+            return
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"root": self.root_id, "items": self.ids}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.cache_path)
+
+    def _forget(self, key: str) -> None:
+        """Папки нет в OneDrive — выбрасываем её и всё под ней."""
+        for k in [k for k in self.ids if k == key or k.startswith(key + "/")]:
+            del self.ids[k]
+
+    def _parent_id(self, path: Path) -> Optional[str]:
+        return self.ids.get(_key(path[:-1])) if len(path) > 1 else self.root_id
+
+    # ---- $batch ----
+
+    def batch(self, reqs: List[dict]) -> Dict[str, dict]:
+        """
+        Пачка запросов (не больше batch_size) -> {id запроса: ответ}. Ответы 429/503/504 повторяются
+        после Retry-After; остальные статусы возвращаются как есть — разбирает вызывающий.
+        """
+        pending = {r["id"]: r for r in reqs}
+        out: Dict[str, dict] = {}
+        for attempt in range(GRAPH_RETRIES):
+            payload = {"requests": list(pending.values())}
+            self.stats["batches"] += 1
+            try:
+                resp = self.session.post(f"{self.base}/$batch", data=notion_http.dumps(payload), timeout=60)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == GRAPH_RETRIES - 1:
+                    raise
+                log.warning("Graph $batch: %s, повтор %s", type(e).__name__, attempt + 1)
+                self.stats["retries"] += 1
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            if resp.status_code in _RETRY_STATUS and attempt < GRAPH_RETRIES - 1:
+                self.stats["retries"] += 1
+                time.sleep(_retry_after(resp.headers, attempt))
+                continue
+            resp.raise_for_status()
+            delay = 0.0
+            for r in notion_http.response_json(resp).get("responses") or []:
+                if r.get("status") in _RETRY_STATUS and attempt < GRAPH_RETRIES - 1:
+                    delay = max(delay, _retry_after(r.get("headers") or {}, attempt))
+                    continue
+                out[r["id"]] = r
+                pending.pop(r["id"], None)
+            if not pending:
+                break
+            self.stats["retries"] += len(pending)
+            log.warning("Graph $batch: %s запросов ограничено, повтор через %.1f с", len(pending), delay)
+            time.sleep(delay)
+        return out
+
+    def _run(self, reqs: List[Tuple[Path, dict]]) -> Dict[Path, dict]:
+        """Запросы по пачкам; id запроса — номер в списке."""
+        out: Dict[Path, dict] = {}
+        for i in range(0, len(reqs), self.batch_size):
+            chunk = reqs[i:i + self.batch_size]
+            by_id = {str(n): path for n, (path, _) in enumerate(chunk)}
+            res = self.batch([dict(r, id=str(n)) for n, (_, r) in enumerate(chunk)])
+            for rid, path in by_id.items():
+                out[path] = res.get(rid) or {"status": 0, "body": {}}
+        return out
+
+    # ---- дерево ----
+
+    def ensure(self, paths: Iterable[Path]) -> List[Tuple[str, str]]:
+        """
+        Создаёт недостающие папки (родители — автоматически). Возвращает ошибки [(путь, причина)];
+        счётчики — в self.stats.
+        """
+        wanted = set()
+        for p in paths:
+            for depth in range(1, len(p) + 1):
+                wanted.add(tuple(p[:depth]))
+        errors: List[Tuple[str, str]] = []
+        for _ in range(2):  # второй проход — если кэш оказался устаревшим
+            stale = False
+            errors = []
+            self.stats["cached"] = sum(1 for p in wanted if _key(p) in self.ids)
+            for depth in range(1, max((len(p) for p in wanted), default=0) + 1):
+                level = sorted(p for p in wanted if len(p) == depth and _key(p) not in self.ids)
+                stale |= self._create_level(level, errors)
+                self._save_cache()
+            if not stale:
+                break
+        return errors
+
+    def _create_level(self, level: List[Path], errors: List[Tuple[str, str]]) -> bool:
+        """Один уровень дерева. True — встретился удалённый родитель из кэша (нужен ещё проход)."""
+        reqs, stale = [], False
+        for p in level:
+            parent = self._parent_id(p)
+            if parent is None:  # родитель не создался — ошибка уже записана
+                continue
+            reqs.append((p, {"method": "POST", "url": f"/me/drive/items/{parent}/children",
+                             "headers": {"Content-Type": "application/json"},
+                             "body": {"name": p[-1], "folder": {}, "@microsoft.graph.conflictBehavior": "fail"}}))
+        lookup = []
+        for p, r in self._run(reqs).items():
+            status = r.get("status")
+            if status in (200, 201):
+                self.ids[_key(p)] = r["body"]["id"]
+                self.stats["created"] += 1
+            elif status == 409:
+                lookup.append((p, {"method": "GET",
+                                   "url": f"/me/drive/items/{self._parent_id(p)}:/{quote(p[-1])}:"}))
+            elif status == 404 and len(p) > 1:
+                self._forget(_key(p[:-1]))
+                stale = True
+            else:
+                errors.append((_key(p), _error_text(r)))
+        for p, r in self._run(lookup).items():
+            body = r.get("body") or {}
+            if r.get("status") == 200 and "folder" in body:
+                self.ids[_key(p)] = body["id"]
+                self.stats["existing"] += 1
+            elif r.get("status") == 200:
+                errors.append((_key(p), "на этом месте файл, а не папка"))
+            else:
+                errors.append((_key(p), _error_text(r)))
+        return stale
+
+
+def _retry_after(headers: Dict[str, str], attempt: int) -> float:
+    try:
+        return max(float(headers.get("Retry-After") or headers.get("retry-after") or ""), 0.0)
+    except ValueError:
+        return min(2 ** attempt, 30)
+
+
+def _error_text(r: dict) -> str:
+    err = (r.get("body") or {}).get("error") or {}
+    return f"{r.get('status')} {err.get('code', '')}: {err.get('message', '')}".strip()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Дерево папок structure.txt в OneDrive через Microsoft Graph")
+    ap.add_argument("--force", action="store_true", help="не доверять кэшу id, проверить все папки")
+    ap.add_argument("--structure", default=STRUCTURE_FILE)
+    args = ap.parse_args()
+
+    if not GRAPH_TOKEN:
+        print("✗ Проверь .env: GRAPH_TOKEN")
+        sys.exit(1)
+    paths = structure_paths(args.structure)
+    g = GraphFolders()
+    if args.force:
+        g.ids.clear()
+    t0 = time.perf_counter()
+    errors = g.ensure(paths)
+    dt = time.perf_counter() - t0
+    s = g.stats
+    print(f"✓ OneDrive: {ONEDRIVE_PROJECT} — создано папок {s['created']}, "
+          f"уже были {s['existing']}, из кэша {s['cached']}; пачек $batch {s['batches']}, "
+          f"повторов {s['retries']}, {dt:.2f} с")
+    for key, err in errors[:10]:
+        print(f"✗ {key}: {err}")
+    if errors:
+        print(f"✗ Ошибок: {len(errors)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
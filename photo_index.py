@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс загруженных фото: повторно присланный снимок не грузим в Cloudinary второй раз.
+
+Прорабы часто пересылают то же фото ещё раз или из другого чата. Для каждого загруженного фото
+храним три ключа и ссылку Cloudinary (SQLite, PHOTO_INDEX):
+- file_unique_id Telegram — одинаков у пересланного/повторно отправленного файла; проверяется
+  ещё до скачивания
+- sha256 исходных байтов — точная копия
+- dHash (64 бита, по уменьшенному до 9x8 серому кадру) — тот же кадр после пережатия/уменьшения
+  другим мессенджером; совпадение, если различаются не больше PHOTO_DUP_DISTANCE бит.
+  Это «похоже», а не «то же самое» (два кадра одного места подряд тоже могут совпасть), поэтому
+  бот в этом случае спрашивает, а не решает сам
+
+Там же — производные картинки (превью) по public_id. Открывать журнал в Notion и ответы бота
+с полноразмерными фото по слабому каналу долго, поэтому:
+- при загрузке просим Cloudinary сразу построить превью (eager, асинхронно — загрузку не задерживает)
+- ссылка на превью — та же ссылка Cloudinary со вставленной трансформацией, без запросов к API
+- выданные ссылки запоминаем: если PHOTO_THUMB потом поменяют, старые записи продолжат ссылаться
+  на уже построенные превью, а не заставят Cloudinary строить новые (это расходует лимит трансформаций)
+
+Настройки:
+    PHOTO_DEDUP=1              0 — не искать дубли
+    PHOTO_INDEX=photo_index.sqlite
+    PHOTO_DUP_DISTANCE=4       порог для dHash, бит из 64 (0 — только точные совпадения)
+    PHOTO_THUMB=c_limit,w_480,q_auto,f_auto       превью для журнала (пусто — не делать)
+    PHOTO_PREVIEW=c_limit,w_1280,q_auto,f_auto    «посмотреть с телефона» в ответах бота
+
+Сводка:
+    python photo_index.py [photo_index.sqlite]
+"""
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+log = logging.getLogger("photo-index")
+
+load_dotenv()
+
+PHOTO_DEDUP = os.getenv("PHOTO_DEDUP", "1") != "0"
+PHOTO_INDEX = os.getenv("PHOTO_INDEX", "photo_index.sqlite")
+PHOTO_DUP_DISTANCE = int(os.getenv("PHOTO_DUP_DISTANCE", "4"))
+PHOTO_THUMB = os.getenv("PHOTO_THUMB", "c_limit,w_480,q_auto,f_auto")
+PHOTO_PREVIEW = os.getenv("PHOTO_PREVIEW", "c_limit,w_1280,q_auto,f_auto")
+
+# имя производной -> трансформация Cloudinary
+DERIVED: Dict[str, str] = {name: t for name, t in (("thumb", PHOTO_THUMB), ("preview", PHOTO_PREVIEW)) if t}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    url        TEXT NOT NULL,
+    public_id  TEXT NOT NULL DEFAULT '',
+    section    TEXT NOT NULL DEFAULT '',
+    sha256     TEXT,
+    phash      TEXT,
+    file_id    TEXT,
+    created    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS photos_sha ON photos(sha256);
+CREATE INDEX IF NOT EXISTS photos_file ON photos(file_id);
+CREATE TABLE IF NOT EXISTS derived (
+    public_id  TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    source     TEXT NOT NULL,
+    url        TEXT NOT NULL,
+    PRIMARY KEY (public_id, name)
+);
+CREATE INDEX IF NOT EXISTS derived_source ON derived(source);
+"""
+
+_UPLOAD_RE = re.compile(r"^(https?://.+?/image/upload/)(.+)$")
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def eager_transformations() -> Optional[str]:
+    """Параметр eager для cloudinary.uploader.upload: все производные одной строкой."""
+    return "|".join(DERIVED.values()) or None
+
+
+def derived_url(url: str, transformation: str) -> Optional[str]:
+    """Ссылка на производную: трансформация вставляется после /image/upload/. Не Cloudinary — None."""
+    m = _UPLOAD_RE.match(url or "")
+    return f"{m.group(1)}{transformation}/{m.group(2)}" if m else None
+
+
+class PhotoIndex:
+    """Потокобезопасен: ищем из хендлеров, дописываем и из фоновой очереди (фото из спула)."""
+
+    def __init__(self, path: str = PHOTO_INDEX, max_distance: int = PHOTO_DUP_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        self.db.commit()
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        # dHash всех фото в памяти: ближайший по Хэммингу ищется перебором (тысячи фото — доли мс)
+        self._phashes: List[Tuple[int, int]] = [
+            (int(row["phash"], 16), row["id"])
+            for row in self.db.execute("SELECT id, phash FROM photos WHERE phash IS NOT NULL")
+        ]
+
+    def _row(self, where: str, *args: Any) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.db.execute(f"SELECT * FROM photos WHERE {where} ORDER BY id LIMIT 1", args).fetchone()
+        return dict(row) if row else None
+
+    def find(self, sha256: Optional[str] = None, phash: Optional[int] = None,
+             file_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Уже загруженное фото или None (и при PHOTO_DEDUP=0). В ответе — строка индекса (url, section, created...)
+        и exact: True — тот же файл, False — похожий кадр по dHash (distance — сколько бит отличается).
+        """
+        if not PHOTO_DEDUP:
+            return None
+        for col, value in (("file_id", file_id), ("sha256", sha256)):
+            if value:
+                hit = self._row(f"{col} = ?", value)
+                if hit:
+                    hit.update(exact=True, distance=0)
+                    return hit
+        if phash is None or self.max_distance <= 0:
+            return None
+        with self.lock:
+            best = min(((distance(phash, h), rid) for h, rid in self._phashes), default=None)
+        if best is None or best[0] > self.max_distance:
+            return None
+        hit = self._row("id = ?", best[1])
+        if hit:
+            hit.update(exact=False, distance=best[0])
+        return hit
+
+    def add(self, url: str, public_id: str = "", section: str = "", sha256: Optional[str] = None,
+            phash: Optional[int] = None, file_id: Optional[str] = None) -> None:
+        ph = f"{phash:016x}" if phash is not None else None
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT INTO photos (url, public_id, section, sha256, phash, file_id, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, public_id, section, sha256, ph, file_id, time.time()))
+            self.db.commit()
+            if phash is not None:
+                self._phashes.append((phash, cur.lastrowid))
+
+    def add_derived(self, public_id: str, url: str) -> Dict[str, str]:
+        """Ссылки на производные загруженного фото (по текущим DERIVED) — в кэш и в ответ."""
+        out = {name: u for name, t in DERIVED.items() if (u := derived_url(url, t))}
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO derived (public_id, name, source, url) VALUES (?, ?, ?, ?)",
+                [(public_id, name, url, u) for name, u in out.items()])
+            self.db.commit()
+        return out
+
+    def derived(self, public_id: Optional[str] = None, url: Optional[str] = None) -> Dict[str, str]:
+        """Производные по public_id или по исходной ссылке; чего нет в кэше — строится по текущим DERIVED."""
+        with self.lock:
+            if public_id:
+                rows = self.db.execute("SELECT name, url FROM derived WHERE public_id = ?", (public_id,))
+            else:
+                rows = self.db.execute("SELECT name, url FROM derived WHERE source = ?", (url or "",))
+            out = {name: u for name, u in rows.fetchall()}
+        if url:
+            for name, t in DERIVED.items():
+                if name not in out and (u := derived_url(url, t)):
+                    out[name] = u
+        return out
+
+    def count(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+
+
+_index: Optional[PhotoIndex] = None
+_index_lock = threading.Lock()
+
+
+def get() -> PhotoIndex:
+    """Общий индекс процесса."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PhotoIndex()
+        return _index
+
+
+def derived(url: str, public_id: Optional[str] = None) -> Dict[str, str]:
+    """{"thumb": ..., "preview": ...} для ссылки Cloudinary; если индекс недоступен — строим сами."""
+    try:
+        return get().derived(public_id, url)
+    except sqlite3.Error as e:
+        log.warning("Индекс фото недоступен: %s", e)
+        return {name: u for name, t in DERIVED.items() if (u := derived_url(url, t))}
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else PHOTO_INDEX
+    if not os.path.exists(path):
+        print(f"Индекс не найден: {path}")
+        sys.exit(1)
+    idx = PhotoIndex(path)
+    n = idx.count()
+    nd = idx.db.execute("SELECT COUNT(DISTINCT public_id) FROM derived").fetchone()[0]
+    print(f"{path}: фото {n}, с dHash {len(idx._phashes)}, с превью {nd}")
+    # близкие пары внутри индекса — чтобы подобрать PHOTO_DUP_DISTANCE на своих фото
+    close = 0
+    hashes = sorted(idx._phashes)
+    for i, (a, _) in enumerate(hashes):
+        close += sum(1 for b, _ in hashes[i + 1:] if distance(a, b) <= idx.max_distance)
+    print(f"похожих пар (не больше {idx.max_distance} бит разницы): {close}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Подготовка фото перед загрузкой в Cloudinary: уменьшение, пережатие, удаление EXIF.
+
+По медленному каналу со стройки большая часть времени загрузки — байты, которые никто
+не смотрит в полном размере. Поэтому перед upload:
+- поворот по EXIF Orientation (иначе после удаления EXIF фото «ляжет на бок»)
+- уменьшение до PHOTO_MAX_SIDE по длинной стороне
+- пережатие в JPEG или WebP с качеством PHOTO_QUALITY
+- EXIF не переносится; GPS и время съёмки возвращаются отдельно — их пишем в Notion
+- sha256 исходника и dHash кадра — для поиска уже загруженных фото (photo_index.py)
+
+Работает в пуле потоков (PHOTO_WORKERS): Pillow отпускает GIL на декодировании/сжатии,
+event loop бота не блокируется. Pillow — опционально (pip install Pillow): без него фото уходит как есть.
+
+Настройки:
+    PHOTO_MAX_SIDE=2048     0 — не уменьшать
+    PHOTO_FORMAT=jpeg       jpeg | webp | original (не трогать файл)
+    PHOTO_QUALITY=82
+    PHOTO_WORKERS=2
+
+Замер (байты и время загрузки до/после на фото):
+    python photo_prep.py photo1.jpg photo2.jpg ...   # свои фото или папка
+    python photo_prep.py                             # синтетические 12 Мп кадры
+"""
+
+import io
+import os
+import hashlib
+import sys
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+try:  # опционально
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+log = logging.getLogger("photo-prep")
+
+load_dotenv()
+
+PHOTO_MAX_SIDE = int(os.getenv("PHOTO_MAX_SIDE", "2048"))
+PHOTO_FORMAT = os.getenv("PHOTO_FORMAT", "jpeg").lower()
+PHOTO_QUALITY = int(os.getenv("PHOTO_QUALITY", "82"))
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
+
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+_DATETIME = 0x0132
+_DATETIME_ORIGINAL = 0x9003
+
+_pool = ThreadPoolExecutor(max_workers=max(PHOTO_WORKERS, 1), thread_name_prefix="photo-prep")
+
+
+class Prepared:
+    """Результат подготовки: байты для загрузки и то, что стоит сохранить в Notion."""
+
+    __slots__ = ("data", "ext", "width", "height", "original_bytes", "gps", "taken_at", "sha256", "phash")
+
+    def __init__(self, data: bytes, ext: str, width: int = 0, height: int = 0, original_bytes: int = 0,
+                 gps: Optional[Tuple[float, float]] = None, taken_at: Optional[str] = None,
+                 sha256: Optional[str] = None, phash: Optional[int] = None):
+        self.data = data
+        self.ext = ext
+        self.width = width
+        self.height = height
+        self.original_bytes = original_bytes or len(data)
+        self.gps = gps
+        self.taken_at = taken_at
+        self.sha256 = sha256
+        self.phash = phash
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def _ratio(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _gps(exif) -> Optional[Tuple[float, float]]:
+    """GPS IFD -> (широта, долгота) в градусах."""
+    try:
+        g = exif.get_ifd(_GPS_IFD)
+    except Exception:
+        return None
+    if not g or 2 not in g or 4 not in g:
+        return None
+
+    def deg(dms, ref) -> float:
+        d, m, s = (_ratio(x) for x in dms)
+        v = d + m / 60 + s / 3600
+        return -v if ref in ("S", "W") else v
+
+    try:
+        lat, lon = deg(g[2], g.get(1, "N")), deg(g[4], g.get(3, "E"))
+    except (TypeError, ValueError):
+        return None
+    return (round(lat, 6), round(lon, 6)) if (lat or lon) else None
+
+
+def _taken_at(exif) -> Optional[str]:
+    raw = None
+    try:
+        raw = exif.get_ifd(_EXIF_IFD).get(_DATETIME_ORIGINAL)
+    except Exception:
+        pass
+    raw = raw or exif.get(_DATETIME)
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(str(raw).strip("\x00 "), "%Y:%m:%d %H:%M:%S").isoformat(timespec="minutes")
+    except ValueError:
+        return None
+
+
+def dhash(im) -> int:
+    """Разностный хэш: 64 бита «левый пиксель ярче правого» по серому кадру 9x8."""
+    small = im.convert("L").resize((9, 8), Image.BOX)
+    px = small.tobytes()
+    bits = 0
+    for y in range(8):
+        row = px[y * 9:(y + 1) * 9]
+        for x in range(8):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+
+def prepare(data: bytes, max_side: int = PHOTO_MAX_SIDE, fmt: str = PHOTO_FORMAT,
+            quality: int = PHOTO_QUALITY) -> Prepared:
+    """Синхронная подготовка одного фото. Если что-то пошло не так — исходные байты."""
+    sha = hashlib.sha256(data).hexdigest()
+    if Image is None:
+        return Prepared(data, "jpg", sha256=sha)
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            exif = im.getexif()
+            gps, taken = _gps(exif), _taken_at(exif)
+            if fmt == "original":  # файл не трогаем, только хэш по уменьшенному при декодировании кадру
+                size = im.size
+                im.draft("RGB", (256, 256))
+                return Prepared(data, "jpg", *size, sha256=sha, phash=dhash(ImageOps.exif_transpose(im)))
+            if max_side and im.format == "JPEG":
+                im.draft("RGB", (max_side, max_side))  # декодер JPEG сразу уменьшает в 2/4/8 раз — в разы быстрее
+            im = ImageOps.exif_transpose(im)
+            if max_side and max(im.size) > max_side:
+                im.thumbnail((max_side, max_side), Image.BICUBIC)
+            phash = dhash(im)
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            out = io.BytesIO()
+            if fmt == "webp":
+                im.save(out, "WEBP", quality=quality, method=4)
+                ext = "webp"
+            else:
+                im.save(out, "JPEG", quality=quality, optimize=True)
+                ext = "jpg"
+            width, height = im.size
+    except Exception as e:
+        log.warning("Фото не обработано, загружаем как есть: %s", e)
+        return Prepared(data, "jpg", sha256=sha)
+    if out.tell() >= len(data) and not len(exif):
+        # уже маленькое и без метаданных (типично для фото, пережатых Telegram) — оставляем как было
+        return Prepared(data, "jpg", width, height, sha256=sha, phash=phash)
+    return Prepared(out.getvalue(), ext, width, height, len(data), gps, taken, sha, phash)
+
+
+async def aprepare(data: bytes) -> Prepared:
+    """prepare() в пуле потоков — для хендлеров бота."""
+    return await asyncio.get_running_loop().run_in_executor(_pool, prepare, data)
+
+
+# ---- замер ----
+
+def _files(args: List[str]) -> List[str]:
+    out = []
+    for a in args:
+        if os.path.isdir(a):
+            out += [os.path.join(a, f) for f in sorted(os.listdir(a))
+                    if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".heic"))]
+        else:
+            out.append(a)
+    return out
+
+
+def bench(paths: List[str], uplink_kbit: float = 2000.0) -> Dict[str, float]:
+    """
+    Байты и время загрузки до/после по каждому файлу. Время загрузки оценивается по каналу
+    uplink_kbit (кбит/с; 2000 — типичный 3G/слабый 4G на объекте) плюс время самой подготовки.
+    """
+    before = after = prep_s = 0.0
+    print(f"{'файл':<32} {'было, КБ':>9} {'стало, КБ':>10} {'размер':>11} {'подг., мс':>10} {'выигрыш, с':>11}")
+    for path in paths:
+        with open(path, "rb") as f:
+            raw = f.read()
+        t0 = time.perf_counter()
+        p = prepare(raw)
+        dt = time.perf_counter() - t0
+        gain = (len(raw) - len(p.data)) * 8 / 1000 / uplink_kbit - dt
+        before, after, prep_s = before + len(raw), after + len(p.data), prep_s + dt
+        print(f"{os.path.basename(path)[:32]:<32} {len(raw) / 1024:>9.0f} {len(p.data) / 1024:>10.0f} "
+              f"{f'{p.width}x{p.height}':>11} {dt * 1000:>10.0f} {gain:>11.1f}")
+    n = max(len(paths), 1)
+    saved_s = ((before - after) * 8 / 1000 / uplink_kbit - prep_s) / n
+    print(f"\nВ среднем на фото: сэкономлено {(before - after) / n / 1024:.0f} КБ "
+          f"({(1 - after / before) if before else 0:.0%}), загрузка быстрее на {saved_s:.1f} с "
+          f"при канале {uplink_kbit:g} кбит/с (формат {PHOTO_FORMAT}, q={PHOTO_QUALITY}, max {PHOTO_MAX_SIDE}px)")
+    return {"bytes_before": before, "bytes_after": after, "prep_s": prep_s, "saved_s_per_photo": saved_s}
+
+
+def synthetic_photo(seed: int = 0, size: Tuple[int, int] = (4000, 3000)) -> bytes:
+    """Кадр «как с телефона»: 12 Мп JPEG q=95 с шумом (на гладкой картинке выигрыш был бы нечестным)."""
+    import random
+    rnd = random.Random(seed)
+    small = Image.new("RGB", (size[0] // 8, size[1] // 8))
+    small.putdata([(rnd.randrange(90, 200), rnd.randrange(80, 180), rnd.randrange(60, 160))
+                   for _ in range(small.width * small.height)])
+    im = small.resize(size, Image.BICUBIC)
+    out = io.BytesIO()
+    im.save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+def main():
+    if Image is None:
+        print("Pillow не установлен (pip install Pillow) — подготовка фото выключена")
+        sys.exit(1)
+    paths = _files(sys.argv[1:])
+    if not paths:
+        import tempfile
+        tmp = tempfile.mkdtemp(prefix="photo-prep-")
+        for i in range(5):
+            path = os.path.join(tmp, f"synthetic_{i + 1}.jpg")
+            with open(path, "wb") as f:
+                f.write(synthetic_photo(i))
+            paths.append(path)
+        print(f"Фото не заданы — синтетические кадры 4000x3000 в {tmp}")
+    bench(paths, float(os.getenv("UPLINK_KBIT", "2000")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Реестр объектов (стройплощадок): один процесс бота обслуживает несколько объектов.
+
+У каждого объекта своё: structure.txt, кэш структуры для меню бота, корень папок в Cloudinary,
+токен и базы Notion, чаты Telegram, которые к нему относятся. Бот выбирает объект по чату.
+Соединения и лимит частоты Notion — свои у каждого токена (notion_http.limiter_for), кэши схем
+(notion_http.property_ids, notion_mirror) — по id базы, так что объекты друг другу не мешают.
+
+PROJECTS_FILE (projects.json), ключ — короткое имя объекта:
+    {
+      "school65": {
+        "name": "Школа 65 — Уральск",
+        "structure": "structure.txt",
+        "cache": "structure_cache.json",
+        "cloud_root": "Школа_65",
+        "notion_token_env": "NOTION_TOKEN_SCHOOL65",   # токен — в .env, в файле только имя переменной
+        "journal_db": "…",                             # журнал фото (cloud_photo_bot)
+        "tasks_db": "…",                               # задачи (bot.py)
+        "chats": [-1001234567890]
+      },
+      "kindergarten": {...}
+    }
+Объект по умолчанию — первый в файле (или с "default": true): ему достаются чаты, не указанные ни у кого.
+Файла нет — один объект из .env, как раньше (NOTION_*_SCHOOL65, STRUCTURE_FILE, CLOUD_ROOT).
+
+Проверка:
+    python projects.py
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+import notion_http
+
+load_dotenv()
+
+PROJECTS_FILE = os.getenv("PROJECTS_FILE", "projects.json")
+
+
+class Project:
+    """Настройки одного объекта."""
+
+    __slots__ = ("key", "name", "structure", "cache", "cloud_root", "notion_token", "journal_db",
+                 "tasks_db", "chats", "headers")
+
+    def __init__(self, key: str, name: str = "", structure: str = "structure.txt",
+                 cache: str = "structure_cache.json", cloud_root: str = "Project", notion_token: str = "",
+                 journal_db: str = "", tasks_db: str = "", chats: Optional[List[int]] = None):
+        self.key = key
+        self.name = name or key
+        self.structure = structure
+        self.cache = cache
+        self.cloud_root = cloud_root
+        self.notion_token = notion_token
+        self.journal_db = journal_db
+        self.tasks_db = tasks_db
+        self.chats = [int(c) for c in chats or []]
+        self.headers = notion_http.make_headers(notion_token)
+
+    def __repr__(self) -> str:
+        return f"Project({self.key!r})"
+
+
+def _from_env() -> Project:
+    return Project(
+        "default",
+        name=os.getenv("PROJECT_NAME", "Школа 65 — Уральск"),
+        structure=os.getenv("STRUCTURE_FILE", "structure.txt"),
+        cloud_root=os.getenv("CLOUD_ROOT", "Project"),
+        notion_token=os.getenv("NOTION_TOKEN_SCHOOL65", ""),
+        journal_db=os.getenv("NOTION_DATABASE_ID_SCHOOL65", ""),
+        tasks_db=os.getenv("NOTION_TASKS_DB", "") or os.getenv("NOTION_DATABASE_ID", ""),
+    )
+
+
+def _from_dict(key: str, d: Dict[str, Any]) -> Project:
+    token = d.get("notion_token") or os.getenv(d.get("notion_token_env") or "NOTION_TOKEN_SCHOOL65", "")
+    return Project(
+        key,
+        name=d.get("name", ""),
+        structure=d.get("structure") or f"structure_{key}.txt",
+        cache=d.get("cache") or f"structure_cache_{key}.json",
+        cloud_root=d.get("cloud_root") or key,
+        notion_token=token,
+        journal_db=d.get("journal_db", ""),
+        tasks_db=d.get("tasks_db", ""),
+        chats=d.get("chats"),
+    )
+
+
+class Registry:
+    def __init__(self, items: List[Project], default: Optional[str] = None):
+        if not items:
+            raise ValueError("Реестр объектов пуст")
+        self.items: Dict[str, Project] = {p.key: p for p in items}
+        self.default = self.items[default] if default in self.items else items[0]
+        self.by_chat: Dict[int, Project] = {}
+        for p in items:
+            for chat in p.chats:
+                if chat in self.by_chat:
+                    raise ValueError(f"Чат {chat} указан у двух объектов: {self.by_chat[chat].key} и {p.key}")
+                self.by_chat[chat] = p
+
+    @classmethod
+    def load(cls, path: str = PROJECTS_FILE) -> "Registry":
+        if not os.path.exists(path):
+            return cls([_from_env()])
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        items = [_from_dict(key, d) for key, d in data.items()]
+        default = next((key for key, d in data.items() if d.get("default")), None)
+        return cls(items, default)
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def registry() -> Registry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = Registry.load()
+        return _registry
+
+
+def all_projects() -> List[Project]:
+    return list(registry().items.values())
+
+
+def default() -> Project:
+    return registry().default
+
+
+def get(key: Optional[str]) -> Project:
+    """Объект по ключу; нет такого (или None) — объект по умолчанию."""
+    reg = registry()
+    return reg.items.get(key or "", reg.default)
+
+
+def for_chat(chat_id: Optional[int]) -> Project:
+    reg = registry()
+    return reg.by_chat.get(chat_id, reg.default) if chat_id is not None else reg.default
+
+
+def main():
+    reg = registry()
+    src = PROJECTS_FILE if os.path.exists(PROJECTS_FILE) else ".env"
+    print(f"Объекты ({src}):")
+    for p in reg.items.values():
+        mark = "*" if p is reg.default else " "
+        print(f" {mark} {p.key}: {p.name}; structure={p.structure}, cache={p.cache}, cloud_root={p.cloud_root}, "
+              f"журнал={p.journal_db[:8] or '—'}, задачи={p.tasks_db[:8] or '—'}, "
+              f"токен={'есть' if p.notion_token else 'НЕТ'}, чатов {len(p.chats)}")
+
+
+if __name__ == "__main__":
+    main()
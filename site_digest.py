@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Суточная сводка по объекту: задачи по объектам и фото по разделам — из локальных зеркал Notion.
+
+- один потоковый проход по зеркалу задач и один — по зеркалу журнала фото: страницы читаются
+  по строке, декодируются и сразу складываются в счётчики; в памяти — только счётчики по объектам
+  и разделам и не больше DIGEST_TOP самых просроченных задач на объект (куча), сколько бы задач ни было
+- по каждому объекту: открыто сейчас, заведено за период, закрыто за период (статус из
+  TASK_DONE_STATUSES и правка в периоде), просрочено; по каждому разделу — фото за период
+- вывод: Telegram (укладывается в лимит сообщения), Markdown, CSV
+- в bot.py сводка уходит раз в день (DIGEST_TIME) в DIGEST_CHATS; формат чатов — как у
+  REMINDER_CHATS: после «:» можно оставить чату только свои объекты
+
+Период — последние сутки до момента отправки, или календарный день (--date). «Открыто» и
+«просрочено» — снимок на сегодня, «новых» и «закрыто» — за период.
+
+Настройки:
+    DIGEST_CHATS=-1001111,-1002222:Котельная
+    DIGEST_TIME=08:00
+    DIGEST_TOP=10           сколько просроченных задач перечислять
+
+Запуск (заменяет check_notion.py для менеджеров):
+    python site_digest.py                       # Telegram-текст в консоль
+    python site_digest.py --format md --out digest.md
+    python site_digest.py --format csv --out digest.csv --date 2025-10-17
+"""
+
+import os
+import io
+import csv
+import sys
+import heapq
+import asyncio
+import logging
+import argparse
+from collections import Counter
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+import notion_http
+from notion_models import DONE_STATUSES, iter_entries, iter_tasks
+
+log = logging.getLogger("digest")
+
+load_dotenv()
+
+DIGEST_CHATS = os.getenv("DIGEST_CHATS", "")
+DIGEST_TIME = os.getenv("DIGEST_TIME", "08:00")
+DIGEST_TOP = int(os.getenv("DIGEST_TOP", "10"))
+
+TELEGRAM_LIMIT = 4000  # у Telegram 4096 символов на сообщение, с запасом
+
+METRICS = ("open", "opened", "closed", "overdue")
+HEADERS = {"open": "открыто", "opened": "новых", "closed": "закрыто", "overdue": "просрочено"}
+
+
+def _utc(dt: datetime) -> str:
+    """Граница периода в виде created_time/last_edited_time Notion — такие строки сравниваются как есть."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class Digest:
+    """Счётчики за период. add_task/add_photo — по одной странице, память не растёт с числом задач."""
+
+    def __init__(self, since: datetime, until: datetime, today: Optional[date] = None, top: int = DIGEST_TOP):
+        self.since, self.until = since, until
+        self.today = (today or date.today()).isoformat()
+        self._since, self._until = _utc(since), _utc(until)
+        self.top = top
+        self.objects: Dict[str, Counter] = {}
+        self.sections: Counter = Counter()
+        self.overdue: Dict[str, List[tuple]] = {}  # объект -> куча (-срок, код, название): наверху — наименее просроченная
+        self.tasks = 0
+        self.photos = 0
+
+    def _in_period(self, ts: Optional[str]) -> bool:
+        return bool(ts) and self._since <= ts < self._until
+
+    def add_tasks(self, pages: Iterable[dict], props_map: Optional[Dict[str, str]] = None) -> None:
+        for t in iter_tasks(pages, props_map):
+            self.tasks += 1
+            c = self.objects.get(t.obj or "—")
+            if c is None:
+                c = self.objects[t.obj or "—"] = Counter()
+            done = (t.status or "").lower() in DONE_STATUSES
+            if self._in_period(t.created):
+                c["opened"] += 1
+            if done:
+                if self._in_period(t.edited):
+                    c["closed"] += 1
+                continue
+            c["open"] += 1
+            if t.deadline and t.deadline[:10] < self.today:
+                c["overdue"] += 1
+                heap = self.overdue.setdefault(t.obj or "—", [])
+                item = (_neg(t.deadline[:10]), t.code or "", t.name or "")
+                if len(heap) < self.top:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    def add_photos(self, pages: Iterable[dict], props_map: Optional[Dict[str, str]] = None) -> None:
+        for e in iter_entries(pages, props_map):
+            if self._in_period(e.created):
+                self.sections[e.section or "—"] += 1
+                self.photos += 1
+
+    # ---- выборки для вывода ----
+
+    def object_rows(self, objects: Optional[Set[str]] = None) -> List[Tuple[str, Counter]]:
+        rows = [(o, c) for o, c in self.objects.items() if objects is None or o in objects]
+        return sorted(rows, key=lambda r: (-r[1]["overdue"], -r[1]["open"], r[0]))
+
+    def overdue_list(self, objects: Optional[Set[str]] = None) -> List[Tuple[str, str, str, str]]:
+        """(срок, код, название, объект) — самые просроченные первыми."""
+        items = heapq.nlargest(self.top, ((item, obj) for obj, heap in self.overdue.items()
+                                          if objects is None or obj in objects for item in heap))
+        return [(_neg(d), code, name, obj) for (d, code, name), obj in items]
+
+
+def _neg(day: str) -> str:
+    """'2025-10-17' <-> обратная строка: в куче-минимуме наверху окажется самый поздний срок."""
+    return day.translate(_NEG)
+
+
+_NEG = str.maketrans("0123456789", "9876543210")
+
+
+# ---- вывод ----
+
+def _period(d: Digest) -> str:
+    return f"{d.since:%d.%m %H:%M} — {d.until:%d.%m %H:%M}"
+
+
+def render_telegram(d: Digest, objects: Optional[Set[str]] = None) -> str:
+    rows = d.object_rows(objects)
+    lines = [f"📋 Сводка за {_period(d)}"]
+    total = Counter()
+    for _, c in rows:
+        total.update(c)
+    lines.append("Задачи: " + ", ".join(f"{HEADERS[m]} {total[m]}" for m in METRICS))
+    for o, c in rows:
+        lines.append(f"• {o}: " + ", ".join(f"{HEADERS[m]} {c[m]}" for m in METRICS if c[m]))
+    overdue = d.overdue_list(objects)
+    if overdue:
+        lines.append("\n⏰ Самые просроченные:")
+        for day, code, name, obj in overdue:
+            lines.append(f"• {code or '—'} {name} [{obj or '—'}] — срок {day[8:10]}.{day[5:7]}")
+    if objects is None and d.sections:
+        lines.append(f"\n📷 Фото за период: {d.photos}")
+        for sec, n in d.sections.most_common():
+            lines.append(f"• {sec}: {n}")
+    text, out = 0, []
+    for line in lines:
+        if text + len(line) + 1 > TELEGRAM_LIMIT - 20:
+            out.append("…")
+            break
+        out.append(line)
+        text += len(line) + 1
+    return "\n".join(out)
+
+
+def render_markdown(d: Digest, objects: Optional[Set[str]] = None) -> str:
+    lines = [f"# Сводка за {_period(d)}", "", "## Задачи по объектам", "",
+             "| Объект | " + " | ".join(HEADERS[m] for m in METRICS) + " |",
+             "|---|" + "---:|" * len(METRICS)]
+    for o, c in d.object_rows(objects):
+        lines.append(f"| {o} | " + " | ".join(str(c[m]) for m in METRICS) + " |")
+    overdue = d.overdue_list(objects)
+    if overdue:
+        lines += ["", "## Самые просроченные", "", "| Срок | Код | Задача | Объект |", "|---|---|---|---|"]
+        for day, code, name, obj in overdue:
+            lines.append(f"| {day} | {code} | {name.replace('|', '/')} | {obj} |")
+    if objects is None:
+        lines += ["", f"## Фото по разделам (всего {d.photos})", "", "| Раздел | Фото |", "|---|---:|"]
+        for sec, n in d.sections.most_common():
+            lines.append(f"| {sec} | {n} |")
+    return "\n".join(lines) + "\n"
+
+
+def render_csv(d: Digest, objects: Optional[Set[str]] = None) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["type", "name"] + list(METRICS) + ["photos"])
+    for o, c in d.object_rows(objects):
+        w.writerow(["object", o] + [c[m] for m in METRICS] + [""])
+    if objects is None:
+        for sec, n in d.sections.most_common():
+            w.writerow(["section", sec] + [""] * len(METRICS) + [n])
+    return buf.getvalue()
+
+
+RENDERERS = {"telegram": render_telegram, "md": render_markdown, "csv": render_csv}
+
+
+def build(tasks_mirror, journal_mirror=None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+          props_map: Optional[Dict[str, str]] = None) -> Digest:
+    """Сводка по зеркалам (notion_mirror.Mirror) за [since, until); по умолчанию — последние сутки."""
+    until = until or datetime.now().astimezone()
+    since = since or until - timedelta(days=1)
+    d = Digest(since, until)
+    d.add_tasks(tasks_mirror.iter_pages(), props_map)
+    if journal_mirror is not None:
+        d.add_photos(journal_mirror.iter_pages())
+    return d
+
+
+def start(app, tasks_mirror, journal_mirror, chats: Dict[int, Optional[Set[str]]],
+          props_map: Optional[Dict[str, str]] = None) -> None:
+    """Ежедневная отправка через JobQueue бота в DIGEST_TIME (местное время)."""
+    async def send(context) -> None:
+        d = await asyncio.to_thread(build, tasks_mirror, journal_mirror, None, None, props_map)
+        for chat, objects in chats.items():
+            try:
+                await context.bot.send_message(chat_id=chat, text=render_telegram(d, objects))
+            except Exception as e:
+                log.warning("Сводка в чат %s не отправлена: %s", chat, e)
+
+    h, m = (int(x) for x in DIGEST_TIME.split(":"))
+    tz = datetime.now().astimezone().tzinfo
+    app.job_queue.run_daily(send, dtime(h, m, tzinfo=tz), name="site-digest")
+
+
+def main():
+    from notion_mirror import Mirror
+    import projects
+
+    ap = argparse.ArgumentParser(description="Суточная сводка по задачам и фото из зеркал Notion")
+    ap.add_argument("--format", choices=list(RENDERERS), default="telegram")
+    ap.add_argument("--out", help="файл (по умолчанию — в консоль)")
+    ap.add_argument("--date", help="календарный день YYYY-MM-DD вместо последних суток")
+    ap.add_argument("--object", action="append", help="только этот объект (можно несколько раз)")
+    ap.add_argument("--sync", action="store_true", help="сначала обновить зеркала из Notion")
+    args = ap.parse_args()
+
+    p = projects.default()
+    tasks = Mirror(os.getenv("NOTION_DATABASE_ID", "") or p.tasks_db,
+                   notion_http.make_headers(os.getenv("NOTION_TOKEN", "")))
+    journal = Mirror(p.journal_db, p.headers) if p.journal_db else None
+    if args.sync:
+        for m in filter(None, (tasks, journal)):
+            m.sync()
+    if not tasks.exists():
+        print("✗ Зеркало базы задач не найдено — запусти с --sync или запусти бота")
+        sys.exit(1)
+    since = until = None
+    if args.date:
+        since = datetime.strptime(args.date, "%Y-%m-%d").astimezone()
+        until = since + timedelta(days=1)
+    d = build(tasks, journal if journal is not None and journal.exists() else None, since, until)
+    text = RENDERERS[args.format](d, set(args.object) if args.object else None)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        print(f"✓ {args.out}: задач {d.tasks}, фото за период {d.photos}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
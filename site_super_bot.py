@@ -3,12 +3,12 @@
 Pocket Foreman (Journal) — Telegram → Notion
 Диалог /add: Раздел → Имя файла → URL → Комментарий
 Команда /sections: вывести доступные разделы из Notion
+Несколько объектов (projects.py): журнал выбирается по чату — у объекта свой journal_db и токен.
 """
 from __future__ import annotations
 
 import os
 import re
-import json
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
@@ -16,6 +16,13 @@ from typing import Dict, Any, Optional, List, Tuple
 import requests
 from dotenv import load_dotenv
 
+import metrics
+import offline
+import notion_http
+import notion_outbox
+import photo_index
+import projects
+
 from telegram import (
     Update,
     ReplyKeyboardMarkup,
@@ -75,43 +82,77 @@ PROP_FILE     = os.getenv("PROP_FILE",     "Файл / Фото")
 PROP_URL      = os.getenv("PROP_URL",      "URL")
 PROP_DATE     = os.getenv("PROP_DATE",     "Дата")
 PROP_COMMENT  = os.getenv("PROP_COMMENT",  "Комментарий")
+PROP_THUMB    = os.getenv("PROP_THUMB",    "")  # опц. Files & media: превью для ссылок Cloudinary
+
+# ==========================
+# 2.1) ОБЪЕКТЫ: журнал по чату
+# ==========================
+class Journal:
+    """«Журнал вложений» объекта: база, заголовки Notion, имя очереди outbox."""
+
+    def __init__(self, key: str, database_id: str, headers: Dict[str, str], outbox_name: str):
+        self.key = key
+        self.database_id = database_id
+        self.headers = headers
+        self.outbox_name = outbox_name
+
+    def __repr__(self) -> str:
+        return f"Journal({self.key!r})"
+
+
+# база из .env — как раньше; объекты из projects.json со своей базой журнала — отдельно
+DEFAULT_JOURNAL = Journal(projects.default().key, DATABASE_ID, NOTION_HEADERS, "journal-bot")
+JOURNALS: Dict[str, Journal] = {}  # ключ объекта -> Journal
+for _p in projects.all_projects():
+    if not _p.journal_db or _p.journal_db == DATABASE_ID:
+        JOURNALS[_p.key] = DEFAULT_JOURNAL
+    else:
+        JOURNALS[_p.key] = Journal(_p.key, _p.journal_db, _p.headers, f"journal-bot-{_p.key}")
+
+
+def _chat_journal(update: Update) -> Journal:
+    chat = getattr(update, "effective_chat", None)
+    return JOURNALS.get(projects.for_chat(chat.id if chat else None).key, DEFAULT_JOURNAL)
+
 
 # ==========================
 # 3) УТИЛИТЫ ДЛЯ NOTION
 # ==========================
-def _retry_post(url: str, payload: Dict[str, Any], retries: int = 2) -> requests.Response:
-    """POST с небольшой ретраем."""
-    last_exc: Optional[Exception] = None
-    for attempt in range(retries + 1):
-        try:
-            r = requests.post(url, headers=NOTION_HEADERS, data=json.dumps(payload), timeout=20)
-            return r
-        except Exception as e:
-            last_exc = e
-    if last_exc:
-        raise last_exc
-    raise RuntimeError("unknown POST error")
+def _retry_post(url: str, payload: Dict[str, Any], retries: int = 2,
+                journal: Optional[Journal] = None) -> requests.Response:
+    """POST через общий слой notion_http: ретраи сетевых ошибок, 429/5xx и метрики."""
+    return notion_http.request("POST", url, (journal or DEFAULT_JOURNAL).headers, payload, retries=retries + 1)
 
 def notion_ping() -> bool:
     """Лёгкая проверка доступа к базе — query с page_size=1."""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    r = requests.post(url, headers=NOTION_HEADERS, data=json.dumps({"page_size": 1}))
-    log.info("Notion ping: %s %s", r.status_code, r.text[:120])
-    return r.status_code == 200
-
-def notion_get_section_options() -> List[str]:
-    """Получить список вариантов (Select) из свойства «Раздел»."""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}"
-    r = requests.get(url, headers=NOTION_HEADERS)
+    try:
+        first = next(notion_http.iter_query(DATABASE_ID, NOTION_HEADERS, {}, limit=1), None)
+    except requests.RequestException as e:
+        log.info("Notion ping: %s", e)
+        return False
+    log.info("Notion ping: ok (%s)", "есть записи" if first else "база пуста")
+    return True
+
+def notion_get_section_options(journal: Optional[Journal] = None) -> List[str]:
+    """Получить список вариантов (Select) из свойства «Раздел». Без связи — последний полученный список."""
+    journal = journal or DEFAULT_JOURNAL
+    cache_key = "journal_sections" if journal is DEFAULT_JOURNAL else f"journal_sections:{journal.key}"
+    url = f"{notion_http.API}/databases/{journal.database_id}"
+    try:
+        r = notion_http.request("GET", url, journal.headers)
+    except requests.RequestException as e:
+        log.warning("get database failed: %s — разделы из локального кэша", e)
+        return offline.cache_get(cache_key, [])
     if r.status_code != 200:
         log.warning("get database failed: %s %s", r.status_code, r.text[:200])
         return []
-    db = r.json()
+    db = notion_http.response_json(r)
     props = db.get("properties", {})
     section_prop = props.get(PROP_SECTION, {})
     select = section_prop.get("select", {})
     options = select.get("options", []) if isinstance(select, dict) else []
     names = [o.get("name") for o in options if isinstance(o, dict) and o.get("name")]
+    offline.cache_put(cache_key, names)
     return names
 
 def _sanitize_url(s: str) -> Optional[str]:
@@ -128,10 +169,12 @@ def notion_create_journal_entry(
     file_name: str,
     url: str,
     comment: Optional[str],
+    journal: Optional[Journal] = None,
 ) -> Tuple[bool, str]:
     """
     Создать запись в Журнале: Раздел, Файл/Фото (rich text), URL, Дата=сегодня, Комментарий.
     """
+    journal = journal or DEFAULT_JOURNAL
     today_iso = datetime.now().strftime("%Y-%m-%d")
     props: Dict[str, Any] = {
         PROP_SECTION: {"select": {"name": section}},
@@ -141,11 +184,23 @@ def notion_create_journal_entry(
     }
     if comment and comment.strip() not in ("-", "—"):
         props[PROP_COMMENT] = {"rich_text": [{"text": {"content": comment.strip()}}]}
-
-    payload = {"parent": {"database_id": DATABASE_ID}, "properties": props}
-    r = _retry_post("https://api.notion.com/v1/pages", payload)
+    if PROP_THUMB:
+        thumb = photo_index.derived(url).get("thumb")  # у ссылок не из Cloudinary превью нет
+        if thumb:
+            props[PROP_THUMB] = {"files": [{"name": "превью", "type": "external", "external": {"url": thumb}}]}
+
+    payload = {"parent": {"database_id": journal.database_id}, "properties": props}
+    outbox = notion_outbox.get(journal.outbox_name, journal.headers)
+    if outbox is not None:
+        outbox.enqueue("POST", f"{notion_http.API}/pages", payload, label=f"journal {file_name}",
+                       dedupe={"database_id": journal.database_id, "filter": {"and": [
+                           {"property": PROP_URL, "url": {"equals": url}},
+                           {"property": PROP_FILE, "rich_text": {"equals": file_name}},
+                       ]}})
+        return True, notion_outbox.QUEUED
+    r = _retry_post(f"{notion_http.API}/pages", payload, journal=journal)
     if r.status_code in (200, 201):
-        page_id = r.json().get("id", "")
+        page_id = notion_http.response_json(r).get("id", "")
         return True, page_id
     return False, f"{r.status_code} {r.text}"
 
@@ -155,8 +210,8 @@ def notion_create_journal_entry(
 # ==========================
 ADD_SECTION, ADD_NAME, ADD_URL, ADD_COMMENT = range(4)
 
-def _sections_keyboard() -> ReplyKeyboardMarkup:
-    names = notion_get_section_options()
+def _sections_keyboard(journal: Optional[Journal] = None) -> ReplyKeyboardMarkup:
+    names = notion_get_section_options(journal)
     # разобьём на столбцы по 2–3, чтобы не было «портянки» в одну строку
     rows: List[List[str]] = []
     row: List[str] = []
@@ -187,7 +242,7 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 async def cmd_sections(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    names = notion_get_section_options()
+    names = notion_get_section_options(_chat_journal(update))
     if not names:
         await update.message.reply_text("Разделы не найдены (проверь доступ интеграции к базе).")
         return
@@ -195,13 +250,13 @@ async def cmd_sections(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===== Диалог /add =====
 async def add_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    kb = _sections_keyboard()
+    kb = _sections_keyboard(_chat_journal(update))
     await update.message.reply_text("Выбери раздел:", reply_markup=kb)
     return ADD_SECTION
 
 async def add_got_section(update: Update, context: ContextTypes.DEFAULT_TYPE):
     section = update.message.text.strip()
-    valid = notion_get_section_options()
+    valid = notion_get_section_options(_chat_journal(update))
     if section not in valid:
         await update.message.reply_text("Такого раздела нет. Нажми на кнопку с нужным разделом.")
         return ADD_SECTION
@@ -233,8 +288,10 @@ async def add_got_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name = context.user_data.get("name", "")
     url = context.user_data.get("url", "")
 
-    ok, info = notion_create_journal_entry(section, name, url, comment)
-    if ok:
+    ok, info = notion_create_journal_entry(section, name, url, comment, _chat_journal(update))
+    if ok and info == notion_outbox.QUEUED:
+        await update.message.reply_text("✓ Запись принята и уйдёт в Notion «Журнал вложений» в фоне.")
+    elif ok:
         await update.message.reply_text("✓ Запись добавлена в Notion «Журнал вложений».")
     else:
         await update.message.reply_text(f"✗ Ошибка: {info}")
@@ -276,8 +333,18 @@ def main():
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("help", cmd_help))
     app.add_handler(CommandHandler("sections", cmd_sections))
+    app.add_handler(CommandHandler("stats", metrics.cmd_stats))
     app.add_handler(add_conv)
 
+    metrics.instrument_application(app, "journal-bot")
+    metrics.serve()
+    for journal in {id(j): j for j in JOURNALS.values()}.values():
+        outbox = notion_outbox.get(journal.outbox_name, journal.headers)
+        if outbox is not None:
+            notion_outbox.notify(app, outbox)  # отклонённое Notion — сообщением в чат
+            outbox.start()  # досылаем то, что осталось в очереди с прошлого запуска
+    offline.start()
+
     log.info("Pocket Foreman (Journal) bot is starting...")
     app.run_polling(drop_pending_updates=True)  # без лишних накопившихся апдейтов
 
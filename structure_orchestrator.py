@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Одна команда вместо четырёх: structure.txt -> Cloudinary, Notion, локальный OneDrive, OneDrive через Graph.
+
+- structure.txt читается один раз, все цели получают один и тот же список путей
+- у каждой цели своё состояние (STRUCTURE_TARGETS_STATE): хэш и пути после её последнего успешного
+  прогона; цель получает diff (добавлено/убрано) против своего состояния, а не против соседей —
+  упавшая в прошлый раз цель догонит при следующем запуске, остальные ничего не делают
+- цели работают параллельно (каждая в своём потоке), в конце — время по каждой
+- ничего не удаляется: убранные из structure.txt разделы только попадают в отчёт
+- объекты из реестра (projects.py) прогоняются по очереди: у каждого свой structure.txt, корень
+  в Cloudinary и кэш, база журнала в Notion и папка в OneDrive; состояние целей — отдельно по объекту
+
+Цели:
+    cloudinary  — папки под CLOUD_ROOT (structure_sync) + structure_cache.json для ботов
+    notion      — опции Select «Раздел» (sync_structure_to_notion)
+    local       — папки в локальном OneDrive (create_folders_from_structure)
+    graph       — папки в OneDrive через Microsoft Graph $batch (onedrive_graph)
+
+Без --targets запускаются цели, для которых заполнен .env (local — если найден OneDrive).
+
+Запуск:
+    python structure_orchestrator.py
+    python structure_orchestrator.py --targets notion,graph
+    python structure_orchestrator.py --force        # не доверять состоянию, прогнать все цели
+    python structure_orchestrator.py --project kindergarten
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import structure_sync
+import sync_structure_to_notion
+import create_folders_from_structure
+import onedrive_graph
+import projects
+
+load_dotenv()
+
+STRUCTURE_FILE = os.getenv("STRUCTURE_FILE", "structure.txt")
+STATE_FILE = os.getenv("STRUCTURE_TARGETS_STATE", "structure_targets.json")
+
+Path = Tuple[str, ...]
+
+
+def parse(filename: str = STRUCTURE_FILE) -> List[Path]:
+    """Пути structure.txt кортежами имён, без дублей, в порядке файла (родитель раньше потомков)."""
+    return list(dict.fromkeys(tuple(p.split(os.sep))
+                              for p in create_folders_from_structure.iter_paths_from_structure("", filename)))
+
+
+def _hash(paths: List[Path]) -> str:
+    return hashlib.sha1("\n".join("/".join(p) for p in paths).encode("utf-8")).hexdigest()
+
+
+# ---- состояние целей ----
+
+def load_state() -> Dict[str, dict]:
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: Dict[str, dict]) -> None:
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, STATE_FILE)
+
+
+def diff(old: List[Path], new: List[Path]) -> Dict[str, List[Path]]:
+    have, want = set(old), set(new)
+    return {"added": [p for p in new if p not in have], "removed": [p for p in old if p not in want]}
+
+
+def _is_default(project: projects.Project) -> bool:
+    return project is projects.default()
+
+
+def _state_key(project: projects.Project, name: str) -> str:
+    """Объект по умолчанию — прежние ключи состояния (просто имя цели), остальные — «объект:цель»."""
+    return name if _is_default(project) else f"{project.key}:{name}"
+
+
+def _onedrive_folder(project: projects.Project, default: str) -> str:
+    return default if _is_default(project) else project.name
+
+
+# ---- цели ----
+# Каждая получает (объект, все пути, diff) и возвращает короткую строку для отчёта; ошибка — исключение.
+
+def target_cloudinary(project: projects.Project, paths: List[Path], d: Dict[str, List[Path]]) -> str:
+    structure_sync._config_cloudinary()
+    flat = ["/".join(p) for p in paths]
+    structure_sync._ensure_folders_in_cloudinary(["/".join(p) for p in d["added"]], project.cloud_root)
+    structure_sync._save_cache(flat, project.cache, project.cloud_root)
+    return f"папок +{len(d['added'])}, кэш ботов обновлён"
+
+
+def target_notion(project: projects.Project, paths: List[Path], d: Dict[str, List[Path]]) -> str:
+    added = sync_structure_to_notion.sync_added(["/".join(p) for p in d["added"]], project=project)
+    return f"опций «Раздел» +{added}"
+
+
+def target_local(project: projects.Project, paths: List[Path], d: Dict[str, List[Path]]) -> str:
+    root = os.path.join(create_folders_from_structure.find_onedrive_root(),
+                        _onedrive_folder(project, create_folders_from_structure.PROJECT_ROOT_NAME))
+    made, skipped, errors = create_folders_from_structure.materialize(root, [os.path.join(root, *p) for p in paths])
+    if errors:
+        raise RuntimeError(f"не создано папок: {len(errors)} (первая: {errors[0][0]}: {errors[0][1]})")
+    return f"папок создано/проверено {made}, уже были {skipped}"
+
+
+def target_graph(project: projects.Project, paths: List[Path], d: Dict[str, List[Path]]) -> str:
+    g = onedrive_graph.GraphFolders()
+    folder = _onedrive_folder(project, onedrive_graph.ONEDRIVE_PROJECT)
+    errors = g.ensure([(folder,) + p for p in paths])
+    if errors:
+        raise RuntimeError(f"ошибок Graph: {len(errors)} (первая: {errors[0][0]}: {errors[0][1]})")
+    s = g.stats
+    return f"создано {s['created']}, уже были {s['existing']}, из кэша {s['cached']}, $batch {s['batches']}"
+
+
+def _has_onedrive(project: projects.Project = None) -> bool:
+    try:
+        create_folders_from_structure.find_onedrive_root()
+        return True
+    except RuntimeError:
+        return False
+
+
+# имя -> (функция, настроена ли цель для объекта)
+TARGETS: Dict[str, Tuple[Callable[[projects.Project, List[Path], Dict[str, List[Path]]], str],
+                         Callable[[projects.Project], bool]]] = {
+    "cloudinary": (target_cloudinary, lambda p: bool(structure_sync.CLOUD_NAME and structure_sync.CLOUD_API_KEY)),
+    "notion": (target_notion, lambda p: bool(p.notion_token and p.journal_db)),
+    "local": (target_local, _has_onedrive),
+    "graph": (target_graph, lambda p: bool(onedrive_graph.GRAPH_TOKEN)),
+}
+
+
+def run(targets: Optional[List[str]] = None, force: bool = False,
+        filename: Optional[str] = None, project: Optional[projects.Project] = None) -> Dict[str, dict]:
+    """
+    Прогон целей одного объекта параллельно (по умолчанию — объект по умолчанию и его structure.txt).
+    Возвращает {цель: {"status": ok|skip|error, "seconds", "text", "added", "removed"}}.
+    Состояние цели обновляется только после её успешного прогона.
+    """
+    project = project or projects.default()
+    paths = parse(filename or project.structure)
+    h = _hash(paths)
+    names = targets or [n for n, (_, configured) in TARGETS.items() if configured(project)]
+    state = load_state()
+    results: Dict[str, dict] = {}
+
+    def one(name: str) -> dict:
+        fn = TARGETS[name][0]
+        prev = state.get(_state_key(project, name)) or {}
+        if not force and prev.get("hash") == h:
+            return {"status": "skip", "seconds": 0.0, "text": "без изменений", "added": 0, "removed": 0}
+        d = diff([tuple(p) for p in prev.get("paths", [])] if not force else [], paths)
+        t0 = time.perf_counter()
+        try:
+            text = fn(project, paths, d)
+            status = "ok"
+        except Exception as e:
+            text, status = f"{type(e).__name__}: {e}", "error"
+        return {"status": status, "seconds": time.perf_counter() - t0, "text": text,
+                "added": len(d["added"]), "removed": len(d["removed"])}
+
+    with ThreadPoolExecutor(max_workers=max(len(names), 1), thread_name_prefix="structure") as pool:
+        for name, res in zip(names, pool.map(one, names)):
+            results[name] = res
+            if res["status"] == "ok":
+                state[_state_key(project, name)] = {"hash": h, "paths": [list(p) for p in paths], "synced": time.time()}
+    save_state(state)
+    return results
+
+
+def report(results: Dict[str, dict], total_s: float) -> str:
+    marks = {"ok": "✓", "skip": "=", "error": "✗"}
+    lines = [f"{'цель':<11} {'время, с':>9} {'+':>5} {'−':>5}  итог"]
+    for name, r in results.items():
+        lines.append(f"{marks[r['status']]} {name:<9} {r['seconds']:>9.2f} {r['added']:>5} {r['removed']:>5}  {r['text']}")
+    lines.append(f"Всего {total_s:.2f} с (цели параллельно)")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="structure.txt -> все цели синхронизации за один прогон")
+    ap.add_argument("--targets", help=f"через запятую: {','.join(TARGETS)} (по умолчанию — настроенные в .env)")
+    ap.add_argument("--force", action="store_true", help="прогнать цели, даже если structure.txt для них не менялся")
+    ap.add_argument("--structure", help="другой structure.txt (только вместе с одним объектом)")
+    ap.add_argument("--project", action="append", metavar="KEY",
+                    help="только этот объект из projects.json (можно несколько раз; по умолчанию — все)")
+    args = ap.parse_args()
+
+    targets = None
+    if args.targets:
+        targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+        unknown = [t for t in targets if t not in TARGETS]
+        if unknown:
+            print(f"✗ Неизвестные цели: {', '.join(unknown)}. Есть: {', '.join(TARGETS)}")
+            sys.exit(2)
+    unknown = [k for k in args.project or [] if k not in projects.registry().items]
+    if unknown:
+        print(f"✗ Неизвестные объекты: {', '.join(unknown)}. Есть: {', '.join(projects.registry().items)}")
+        sys.exit(2)
+    if args.structure:
+        chosen = [projects.get(args.project[0] if args.project else None)]
+    else:
+        chosen = [projects.get(k) for k in args.project] if args.project else projects.all_projects()
+    ran = failed = False
+    for p in chosen:
+        t0 = time.perf_counter()
+        results = run(targets, args.force, args.structure, p)
+        if not results:
+            continue
+        ran = True
+        if len(chosen) > 1:
+            print(f"\n[{p.key}] {p.name}")
+        print(report(results, time.perf_counter() - t0))
+        failed = failed or any(r["status"] == "error" for r in results.values())
+    if not ran:
+        print("✗ Ни одна цель не настроена в .env — укажи --targets")
+        sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,17 @@ Safe-Sync: наблюдение за structure.txt с подтверждение
 - Отслеживает изменения файла (watchdog)
 - Считает diff (добавлено / убрано)
 - Присылает админу запрос на подтверждение с inline-кнопками
-- По подтверждению вызывает sync_structure() и пересобирает кэш
+- По подтверждению вызывает sync_structure() и пересобирает кэш,
+  новые разделы (только добавленные по diff) — в опции «Раздел» Notion
+- Следит за structure.txt каждого объекта из реестра (projects.py): у каждого свой кэш,
+  корень в Cloudinary и база журнала в Notion
 ВНИМАНИЕ: НИЧЕГО НЕ УДАЛЯЕМ В CLOUDINARY. Это мягкая синхронизация.
 """
 
 from __future__ import annotations
 import os
-import json
 import time
+import asyncio
 import threading
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Callable
@@ -21,15 +24,18 @@ from watchdog.events import FileSystemEventHandler
 
 # наш старый модуль синхронизации
 from structure_sync import sync_structure
+import notion_http
+import projects
+import sync_structure_to_notion
 
 STRUCTURE_FILE = Path(os.getenv("STRUCTURE_FILE", "structure.txt"))
 CACHE_FILE     = Path("structure_cache.json")
 
 # ---------------- utils ----------------
 
-def _read_cache_paths() -> Tuple[str, List[str]]:
-    if CACHE_FILE.exists():
-        data = json.loads(CACHE_FILE.read_text(encoding="utf-8"))
+def _read_cache_paths(cache_file: Path = CACHE_FILE) -> Tuple[str, List[str]]:
+    if cache_file.exists():
+        data = notion_http.loads(cache_file.read_bytes())
         return data.get("root", ""), data.get("paths", [])
     return "", []
 
@@ -66,8 +72,10 @@ def _diff(old_paths: List[str], new_paths: List[str]) -> Dict[str, List[str]]:
     common  = sorted(list(old_set & new_set))
     return {"added": added, "removed": removed, "same": common}
 
-def _format_diff_text(root: str, d: Dict[str, List[str]]) -> str:
+def _format_diff_text(root: str, d: Dict[str, List[str]], title: str = "") -> str:
     parts = []
+    if title:
+        parts.append(f"🏗 {title}")
     parts.append(f"⚙️ Изменения в структуре (root: {root}):")
     parts.append(f"➕ Добавится: {len(d['added'])}")
     if d["added"]:
@@ -84,17 +92,18 @@ def _format_diff_text(root: str, d: Dict[str, List[str]]) -> str:
 # --------------- SafeSync core ---------------
 
 class _DebounceHandler(FileSystemEventHandler):
-    def __init__(self, on_change: Callable[[], None], delay: float = 1.0):
+    def __init__(self, on_change: Callable[[], None], delay: float = 1.0, path: Path = STRUCTURE_FILE):
         self.on_change = on_change
         self.delay = delay
+        self.path = str(path.resolve())
         self._timer: Optional[threading.Timer] = None
 
     def on_modified(self, event):
-        if event.src_path.endswith(str(STRUCTURE_FILE)):
+        if os.path.abspath(event.src_path) == self.path:
             self._arm()
 
     def on_created(self, event):
-        if event.src_path.endswith(str(STRUCTURE_FILE)):
+        if os.path.abspath(event.src_path) == self.path:
             self._arm()
 
     def _arm(self):
@@ -112,20 +121,21 @@ class SafeSync:
         self.app = application
         self.admin_chat_id = admin_chat_id
         self.observer: Optional[Observer] = None
-        self.pending: Dict[int, Dict] = {}  # change_id -> diff/info
+        self.pending: Dict[int, Dict] = {}  # change_id -> объект/diff/info
         self._seq = 1
         self._lock = threading.Lock()
 
     # ---- public ----
 
     def start(self):
-        # при старте сразу проверим — вдруг structure.txt уже отличается
-        self._check_and_notify()
-        # затем включим watchdog
-        handler = _DebounceHandler(self._check_and_notify, delay=1.5)
         self.observer = Observer()
-        watch_dir = str(STRUCTURE_FILE.parent.resolve())
-        self.observer.schedule(handler, watch_dir, recursive=False)
+        for p in projects.all_projects():
+            # при старте сразу проверим — вдруг structure.txt уже отличается
+            self._check_and_notify(p)
+            # затем включим watchdog — по обработчику на объект
+            structure = Path(p.structure)
+            handler = _DebounceHandler(lambda p=p: self._check_and_notify(p), delay=1.5, path=structure)
+            self.observer.schedule(handler, str(structure.parent.resolve()), recursive=False)
         self.observer.daemon = True
         self.observer.start()
 
@@ -157,12 +167,19 @@ class SafeSync:
 
         info = self.pending.pop(cid)
         if action == "apply":
-            # применяем: просто вызываем существующий sync_structure()
-            res = sync_structure()
+            # применяем: существующий sync_structure() — с файлами и корнем объекта
+            p = projects.get(info.get("project"))
+            res = await asyncio.to_thread(sync_structure, p.structure, p.cloud_root, p.cache)
             txt = (f"✓ Структура обновлена.\n"
                    f"Root: {res['root']}\n"
                    f"Путей в дереве: {len(res['paths'])}\n\n"
                    f"Ранее обнаруженные изменения были применены.")
+            try:
+                added = await asyncio.to_thread(sync_structure_to_notion.sync_added, info["diff"]["added"],
+                                                project=p)
+                txt += f"\nNotion: новых разделов в списке — {added}."
+            except Exception as e:
+                txt += f"\n⚠️ Разделы в Notion не обновлены: {e}"
             await query.edit_message_text(txt)
         else:
             await query.edit_message_text("Операция отменена. Изменения не применялись.")
@@ -175,21 +192,22 @@ class SafeSync:
             self._seq += 1
             return k
 
-    def _check_and_notify(self):
+    def _check_and_notify(self, project=None):
         """
-        Вычисляем diff между текущим кэшем и structure.txt.
+        Вычисляем diff между текущим кэшем объекта и его structure.txt.
         Если есть изменения — отправляем админу подтверждение.
         """
+        p = project or projects.default()
         try:
-            root, old_paths = _read_cache_paths()
-            new_paths = _parse_structure_txt(STRUCTURE_FILE)
+            root, old_paths = _read_cache_paths(Path(p.cache))
+            new_paths = _parse_structure_txt(Path(p.structure))
             d = _diff(old_paths, new_paths)
             if not d["added"] and not d["removed"]:
                 return  # ничего не менялось
 
             change_id = self._next_id()
-            self.pending[change_id] = {"root": root, "diff": d}
-            text = _format_diff_text(root, d)
+            self.pending[change_id] = {"project": p.key, "root": root, "diff": d}
+            text = _format_diff_text(root, d, p.name if len(projects.all_projects()) > 1 else "")
 
             from telegram import InlineKeyboardButton, InlineKeyboardMarkup
             kb = InlineKeyboardMarkup([[
@@ -211,13 +229,13 @@ class SafeSync:
             # запускаем "сразу" (через 0 сек) — это потокобезопасно
             self.app.job_queue.run_once(_notify_job, when=0)
 
-            print(f"[SafeSync] Обнаружены изменения. Отправлен запрос на подтверждение (id={change_id}).")
+            print(f"[SafeSync] Обнаружены изменения ({p.key}). Отправлен запрос на подтверждение (id={change_id}).")
 
             
             
 
         except Exception as e:
-            print(f"[SafeSync] Ошибка при проверке изменений: {e}")
+            print(f"[SafeSync] Ошибка при проверке изменений ({p.key}): {e}")
 
 # ---- factory ----
 
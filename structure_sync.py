@@ -19,11 +19,14 @@ from dotenv import load_dotenv
 import cloudinary
 import cloudinary.api
 
+import metrics
+
 load_dotenv()
 
 CLOUD_NAME = os.getenv("CLOUD_NAME", "")
 CLOUD_API_KEY = os.getenv("CLOUD_API_KEY", "")
 CLOUD_API_SECRET = os.getenv("CLOUD_API_SECRET", "")
+CLOUD_API_BASE = os.getenv("CLOUD_API_BASE", "")  # пусто — настоящий api.cloudinary.com
 
 CLOUD_ROOT = os.getenv("CLOUD_ROOT", "Project")
 STRUCTURE_FILE = os.getenv("STRUCTURE_FILE", "structure.txt")
@@ -38,6 +41,7 @@ def _config_cloudinary():
         api_key=CLOUD_API_KEY,
         api_secret=CLOUD_API_SECRET,
         secure=True,
+        upload_prefix=CLOUD_API_BASE or None,
     )
 
 
@@ -96,7 +100,8 @@ def _ensure_folders_in_cloudinary(paths: List[str], root: str) -> None:
     for p in paths:
         folder = f"{root}/{p}" if root else p
         try:
-            cloudinary.api.create_folder(folder)
+            with metrics.timed("cloudinary", "create_folder"):
+                cloudinary.api.create_folder(folder)
             print(f"✓ Создана папка: {folder}")
         except cloudinary.exceptions.Error as e:
             # Если уже существует — Cloudinary вернёт ошибку уровня предупреждения,
@@ -109,21 +114,26 @@ def _ensure_folders_in_cloudinary(paths: List[str], root: str) -> None:
 
 
 def _save_cache(paths: List[str], cache_path: str, root: str) -> None:
+    """Кэш пишем минифицированным JSON (без отступов) — читатели те же, файл в разы меньше."""
     data = {
         "root": root,
         "paths": paths,
     }
     with open(cache_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
     print(f"✓ Кэш путей сохранён: {cache_path} (root={root}, {len(paths)} путей)")
 
 
-def sync_structure() -> Dict[str, object]:
+def sync_structure(structure_file: str = None, root: str = None, cache_path: str = None) -> Dict[str, object]:
+    """По умолчанию — structure.txt/CLOUD_ROOT/кэш из .env; для других объектов (projects.py) — свои."""
+    structure_file = structure_file or STRUCTURE_FILE
+    root = CLOUD_ROOT if root is None else root
+    cache_path = cache_path or CACHE_PATH
     _config_cloudinary()
-    paths = _parse_structure_txt(STRUCTURE_FILE)
-    _ensure_folders_in_cloudinary(paths, CLOUD_ROOT)
-    _save_cache(paths, CACHE_PATH, CLOUD_ROOT)
-    return {"root": CLOUD_ROOT, "paths": paths}
+    paths = _parse_structure_txt(structure_file)
+    _ensure_folders_in_cloudinary(paths, root)
+    _save_cache(paths, cache_path, root)
+    return {"root": root, "paths": paths}
 
 
 if __name__ == "__main__":
@@ -3,41 +3,45 @@
 Отслеживание изменений structure.txt.
 При сохранении файла — запускаем sync_structure() и обновляем structure_cache.json,
 чтобы бот сразу показывал новую структуру без перезапуска.
+Без file_path следит за structure.txt всех объектов реестра (projects.py): изменился файл
+объекта — синхронизируется его корень в Cloudinary и его кэш.
 """
 
 import os
 import time
 import threading
-from typing import Optional, Callable
+from typing import Dict, Optional, Callable
 
+import projects
 from structure_sync import sync_structure
 
 DEFAULT_FILE = os.getenv("STRUCTURE_FILE", "structure.txt")
 
-def _watch_loop(file_path: str, on_synced: Optional[Callable[[dict], None]] = None):
-    """Простой цикл слежения за mtime файла."""
-    last_mtime = None
+def _watch_loop(files: Dict[str, Optional[projects.Project]], on_synced: Optional[Callable[[dict], None]] = None):
+    """Простой цикл слежения за mtime файлов: путь -> объект (None — настройки из .env)."""
+    last_mtime: Dict[str, float] = {}
     while True:
-        try:
-            if os.path.exists(file_path):
-                mtime = os.path.getmtime(file_path)
-                if last_mtime is None:
-                    last_mtime = mtime
-                elif mtime != last_mtime:
-                    # Файл изменился — синхронизируем
-                    info = sync_structure()
-                    last_mtime = mtime
-                    print(f"[Watcher] ✓ Обновлена структура: root={info.get('root')} paths={len(info.get('paths', []))}")
-                    if on_synced:
-                        try:
-                            on_synced(info)
-                        except Exception as e:
-                            print(f"[Watcher] on_synced error: {e}")
-            else:
-                # файла нет — просто ждём
-                pass
-        except Exception as e:
-            print(f"[Watcher] ошибка цикла: {e}")
+        for file_path, p in files.items():
+            try:
+                if os.path.exists(file_path):
+                    mtime = os.path.getmtime(file_path)
+                    if file_path not in last_mtime:
+                        last_mtime[file_path] = mtime
+                    elif mtime != last_mtime[file_path]:
+                        # Файл изменился — синхронизируем
+                        info = sync_structure(p.structure, p.cloud_root, p.cache) if p else sync_structure(file_path)
+                        last_mtime[file_path] = mtime
+                        print(f"[Watcher] ✓ Обновлена структура: root={info.get('root')} paths={len(info.get('paths', []))}")
+                        if on_synced:
+                            try:
+                                on_synced(info)
+                            except Exception as e:
+                                print(f"[Watcher] on_synced error: {e}")
+                else:
+                    # файла нет — просто ждём
+                    pass
+            except Exception as e:
+                print(f"[Watcher] ошибка цикла ({file_path}): {e}")
         time.sleep(2)  # частота проверки
 
 def start_watcher(file_path: Optional[str] = None, on_synced: Optional[Callable[[dict], None]] = None) -> threading.Thread:
@@ -45,8 +49,11 @@ def start_watcher(file_path: Optional[str] = None, on_synced: Optional[Callable[
     Запустить фонового наблюдателя. Возвращает поток (daemon),
     который можно оставить работать до остановки процесса.
     """
-    fp = file_path or DEFAULT_FILE
-    t = threading.Thread(target=_watch_loop, args=(fp, on_synced), daemon=True)
+    if file_path:
+        files: Dict[str, Optional[projects.Project]] = {file_path: None}
+    else:
+        files = {p.structure: p for p in projects.all_projects()}
+    t = threading.Thread(target=_watch_loop, args=(files, on_synced), daemon=True)
     t.start()
-    print(f"[Watcher] ▶ Старт. Следим за: {fp}")
+    print(f"[Watcher] ▶ Старт. Следим за: {', '.join(files)}")
     return t
@@ -1,12 +1,35 @@
 # -*- coding: utf-8 -*-
-import os, json, re, requests
+"""
+Разделы из structure.txt -> опции Select «Раздел» в Notion.
+
+- слияние по множеству: существующие опции не трогаем, добавляем только новые
+- кэш (SECTION_OPTIONS_CACHE): хэш списка разделов после последней успешной синхронизации;
+  если structure.txt с тех пор не менялся — ни GET, ни PATCH (--force — проверить всё равно)
+- новые опции уходят одним PATCH: Notion принимает только полный список (опция, которой в нём нет,
+  удаляется — и со страниц тоже), так что делить его на части бессмысленно
+- sync_added(paths) — добавить только новые разделы из diff structure.txt (structure_safe_sync)
+- project= (projects.Project) — база журнала, токен и structure.txt объекта вместо значений из .env;
+  --project KEY в командной строке, --all — все объекты реестра по очереди
+
+Запуск:
+    python sync_structure_to_notion.py [--force] [--project KEY | --all]
+    python sync_structure_to_notion.py --plan plan.json / --apply plan.json
+"""
+import os, re, json, hashlib, argparse
+from typing import Dict, Iterable, List, Optional, Tuple
 from dotenv import load_dotenv
 
+import notion_http
+import notion_plan
+import projects
+from notion_mirror import Mirror
+
 load_dotenv()
 
 NOTION_TOKEN = os.getenv("NOTION_TOKEN_SCHOOL65")
 DATABASE_ID  = os.getenv("NOTION_DATABASE_ID_SCHOOL65")
-assert NOTION_TOKEN and DATABASE_ID, "Проверь .env: NOTION_TOKEN_SCHOOL65 и NOTION_DATABASE_ID_SCHOOL65"
+PROP_SECTION = os.getenv("PROP_SECTION", "Раздел")
+OPTIONS_CACHE = os.getenv("SECTION_OPTIONS_CACHE", "section_options_cache.json")
 
 HEADERS = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
@@ -14,7 +37,19 @@ HEADERS = {
     "Notion-Version": "2022-06-28",
 }
 
-STRUCTURE_FILE = "structure.txt"
+STRUCTURE_FILE = os.getenv("STRUCTURE_FILE", "structure.txt")
+
+def _target(project=None) -> Tuple[str, Dict[str, str], str]:
+    """(id базы журнала, заголовки, structure.txt): объекта из реестра или из .env."""
+    if project is None:
+        return DATABASE_ID, HEADERS, STRUCTURE_FILE
+    return project.journal_db, project.headers, project.structure
+
+def _check_env(project=None):
+    if project is None:
+        assert NOTION_TOKEN and DATABASE_ID, "Проверь .env: NOTION_TOKEN_SCHOOL65 и NOTION_DATABASE_ID_SCHOOL65"
+    else:
+        assert project.notion_token and project.journal_db, f"Объект {project.key}: нет токена Notion или journal_db"
 
 def sanitize_option_name(s: str) -> str:
     """
@@ -58,29 +93,35 @@ def iter_paths(filename):
             prev_level = level
             yield " / ".join(stack)
 
-def get_database():
-    r = requests.get(f"https://api.notion.com/v1/databases/{DATABASE_ID}", headers=HEADERS)
+def get_database(project=None):
+    database_id, headers, _ = _target(project)
+    r = notion_http.request("GET", f"{notion_http.API}/databases/{database_id}", headers)
     if r.status_code != 200:
         raise RuntimeError(f"Failed to fetch database: {r.status_code} {r.text}")
-    return r.json()
+    return notion_http.response_json(r)
 
-def patch_select_options(options):
-    body = {
+def select_options_body(options):
+    return {
         "properties": {
-            "Раздел": {
+            PROP_SECTION: {
                 "select": {
                     "options": [{"name": o} for o in options]
                 }
             }
         }
     }
-    r = requests.patch(f"https://api.notion.com/v1/databases/{DATABASE_ID}", headers=HEADERS, data=json.dumps(body))
+
+def patch_select_options(options, project=None):
+    database_id, headers, _ = _target(project)
+    body = select_options_body(options)
+    r = notion_http.request("PATCH", f"{notion_http.API}/databases/{database_id}", headers, body)
     if r.status_code != 200:
         raise RuntimeError(f"Failed to update select options: {r.status_code} {r.text}")
 
-if __name__ == "__main__":
+def structure_options(project=None):
+    """Пути из structure.txt в виде опций Select (санитизированные, без дублей, порядок сохранён)."""
     # 1) Пути из structure.txt
-    raw_paths = list(dict.fromkeys(iter_paths(STRUCTURE_FILE)))
+    raw_paths = list(dict.fromkeys(iter_paths(_target(project)[2])))
 
     # 2) Санитизируем каждую часть пути и заново собираем строки
     sanitized_paths = []
@@ -88,18 +129,145 @@ if __name__ == "__main__":
         parts = [sanitize_option_name(x) for x in p.split(" / ")]
         sanitized_paths.append(" / ".join(parts))
     # Уберём возможные дубликаты после нормализации, сохраним порядок
-    all_paths = list(dict.fromkeys(sanitized_paths))
+    return list(dict.fromkeys(sanitized_paths))
 
+def option_name(path: str, sep: str = "/") -> str:
+    """Путь из кэша структуры ('A/B/C') -> имя опции в том же виде, что даёт structure_options()."""
+    return " / ".join(sanitize_option_name(x) for x in path.split(sep))
+
+def current_options(properties) -> List[str]:
     # 3) Проверим свойство "Раздел"
-    db = get_database()
-    prop = db["properties"].get("Раздел")
+    prop = properties.get(PROP_SECTION)
     if not prop or prop.get("type") != "select":
-        raise RuntimeError('В базе Notion нет поля "Раздел" типа Select. Создай его вручную в таблице.')
+        raise RuntimeError(f'В базе Notion нет поля "{PROP_SECTION}" типа Select. Создай его вручную в таблице.')
+    return [opt["name"] for opt in prop["select"].get("options", [])]
+
+def merge_options(properties, all_paths):
+    """Сливает существующие опции «Раздел» с новыми. Возвращает (merged, сколько новых)."""
+    # 4) Сольём существующие + новые (проверка по множеству — O(n), а не O(n²) по списку)
+    current = current_options(properties)
+    have = set(current)
+    new = [p for p in dict.fromkeys(all_paths) if p not in have]
+    return current + new, len(new)
+
+# ---- кэш последней синхронизации ----
+
+def options_hash(options: Iterable[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(set(options))).encode("utf-8")).hexdigest()
+
+def _load_cache() -> Dict[str, dict]:
+    try:
+        with open(OPTIONS_CACHE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def cached_hash(database_id: str = None) -> Optional[str]:
+    return (_load_cache().get(database_id or DATABASE_ID) or {}).get("hash")
+
+def save_hash(h: str, count: int, database_id: str = None) -> None:
+    data = _load_cache()
+    data[database_id or DATABASE_ID] = {"hash": h, "count": count}
+    tmp = OPTIONS_CACHE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, OPTIONS_CACHE)
 
-    # 4) Сольём существующие + новые
-    current = [opt["name"] for opt in prop["select"].get("options", [])]
-    merged = current + [p for p in all_paths if p not in current]
+def push_options(properties, wanted: List[str], project=None) -> Tuple[int, List[str]]:
+    """
+    Добавляет в «Раздел» недостающие из wanted. Возвращает (сколько добавлено, опции в Notion после этого).
+    """
+    merged, added = merge_options(properties, wanted)
+    if added:
+        patch_select_options(merged, project)
+        print(f"  + {added} опций (всего {len(merged)})")
+    return added, merged
+
+def sync_added(paths: List[str], sep: str = "/", project=None) -> int:
+    """
+    Инкрементально: только разделы, добавленные в structure.txt (diff из structure_safe_sync).
+    Нечего добавлять — ни одного запроса. Возвращает число добавленных опций.
+    """
+    _check_env(project)
+    database_id, _, structure_file = _target(project)
+    wanted = list(dict.fromkeys(option_name(p, sep) for p in paths))
+    if not wanted:
+        return 0
+    added, confirmed = push_options(get_database(project)["properties"], wanted, project)
+    if os.path.exists(structure_file):
+        # хэш — только если в Notion теперь есть ВСЕ разделы структуры (сверено с живым свойством):
+        # опции, потерянные раньше (сбой, удалили руками), иначе полный прогон пропустил бы навсегда
+        full = structure_options(project)
+        if set(full) <= set(confirmed):
+            save_hash(options_hash(full), len(full), database_id)
+    return added
+
+def plan(plan_path, project=None):
+    """--plan: сравниваем со схемой из локального зеркала и сохраняем план (один PATCH, если есть новые)."""
+    database_id, headers, _ = _target(project)
+    stats = notion_http.Stats()
+    mirror = Mirror(database_id, headers)
+    schema = mirror.sync_schema(stats=stats)
+    merged, added = merge_options(schema, structure_options(project))
+    ops = []
+    if added:
+        ops.append(notion_plan.op("PATCH", f"/databases/{database_id}", select_options_body(merged),
+                                  f"{PROP_SECTION}: +{added} опций (всего {len(merged)})"))
+    p = notion_plan.save(plan_path, "sync_structure_to_notion", database_id, ops, extra_calls=stats.requests)
+    print(f"Новых опций в поле 'Раздел': {added}")
+    print(notion_plan.summary(p))
+    print(f"План сохранён: {plan_path}. Выполнить: python sync_structure_to_notion.py --apply {plan_path}")
+
+def apply(plan_path, project=None):
+    """--apply: выполняем сохранённый план без пересчёта."""
+    p = notion_plan.load(plan_path, "sync_structure_to_notion")
+    print(notion_plan.summary(p))
+    ok, fail, stats = notion_plan.apply(p, _target(project)[1])
+    print(f"— Готово. Успешно: {ok}, с ошибками: {fail}")
 
-    # 5) Обновим опции
-    patch_select_options(merged)
-    print(f"OK, обновлено опций в поле 'Раздел': {len(merged)}")
+def main():
+    ap = argparse.ArgumentParser(description="Синхронизация разделов structure.txt в Select «Раздел» Notion")
+    ap.add_argument("--plan", metavar="PLAN.json", help="Только посчитать операции и сохранить план")
+    ap.add_argument("--apply", metavar="PLAN.json", help="Выполнить сохранённый план")
+    ap.add_argument("--force", action="store_true", help="Сверить с Notion, даже если structure.txt не менялся")
+    ap.add_argument("--project", metavar="KEY", help="Объект из projects.json (по умолчанию — .env)")
+    ap.add_argument("--all", action="store_true", help="Все объекты реестра по очереди")
+    args = ap.parse_args()
+    project = projects.get(args.project) if args.project else None
+    if not args.all:
+        _check_env(project)
+
+    if args.apply:
+        apply(args.apply, project)
+        return
+    if args.plan:
+        plan(args.plan, project)
+        return
+
+    if args.all:
+        for p in projects.all_projects():
+            if not (p.notion_token and p.journal_db):
+                print(f"[{p.key}] нет токена Notion или journal_db — пропускаю")
+                continue
+            print(f"[{p.key}] {p.name}")
+            sync_full(args.force, p)
+        return
+    sync_full(args.force, project)
+
+def sync_full(force: bool = False, project=None) -> int:
+    """Полный прогон по structure.txt объекта; без изменений с прошлого раза (и без force) — без запросов."""
+    database_id, _, _ = _target(project)
+    wanted = structure_options(project)
+    h = options_hash(wanted)
+    if not force and cached_hash(database_id) == h:
+        print(f"Разделы не менялись с прошлой синхронизации ({len(wanted)}) — Notion не трогаем. --force — сверить заново")
+        return 0
+
+    # 5) Обновим опции (только если есть новые)
+    added, _ = push_options(get_database(project)["properties"], wanted, project)
+    save_hash(h, len(wanted), database_id)
+    print(f"OK, новых опций в поле '{PROP_SECTION}': {added}" if added else "OK, все разделы уже есть в Notion")
+    return added
+
+if __name__ == "__main__":
+    main()
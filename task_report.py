@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+/report из локального зеркала базы задач: окна по сроку, фильтры, готовые счётчики.
+
+- задачи из зеркала декодируются один раз (Task со __slots__) и держатся в памяти; дальше индекс
+  обновляется только страницами дельт зеркала (Mirror.on_change) — файл не перечитывается
+- счётчики по статусу и по объекту (и объект×статус) ведутся инкрементально: задача поменялась —
+  её старый вклад вычитается, новый прибавляется
+- задачи по дате срока лежат в словаре «дата -> id», так что «сегодня»/«неделя» — это несколько
+  обращений к словарю, а не проход по всей базе
+- готовый текст ответа кэшируется по запросу (и текущей дате) до следующей дельты: в начале смены,
+  когда /report спрашивают все сразу, ответ отдаётся из кэша
+
+Запросы (аргументы /report, в любом порядке):
+    (пусто)/recent — последние изменённые        today/сегодня, tomorrow/завтра, week/неделя
+    overdue/просрочено — срок прошёл, не закрыта  object=Котельная (объект=...), status=Done (статус=...)
+
+Настройки:
+    REPORT_LIMIT=15     строк задач в ответе (остальное — «…и ещё N»)
+
+Проверка на зеркале:
+    python task_report.py overdue object=Котельная
+"""
+
+import os
+import re
+import sys
+import heapq
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from notion_models import DONE_STATUSES, P, Task, iter_tasks
+
+load_dotenv()
+
+REPORT_LIMIT = int(os.getenv("REPORT_LIMIT", "15"))
+
+WINDOWS = {
+    "recent": "recent", "последние": "recent",
+    "today": "today", "сегодня": "today",
+    "tomorrow": "tomorrow", "завтра": "tomorrow",
+    "week": "week", "неделя": "week",
+    "overdue": "overdue", "просрочено": "overdue", "просрочка": "overdue",
+}
+FILTERS = {"object": "object", "объект": "object", "status": "status", "статус": "status"}
+
+TITLES = {
+    "recent": "Последние изменения",
+    "today": "Срок сегодня",
+    "tomorrow": "Срок завтра",
+    "week": "Срок в ближайшие 7 дней",
+    "overdue": "Просрочено",
+}
+
+# значение фильтра может быть из нескольких слов: тянется до следующего фильтра или слова-окна
+_FILTER_RE = re.compile(r"(\w+)=(.+?)(?=\s+(?:\w+=|(?:%s)(?:\s|$))|$)" % "|".join(WINDOWS), re.IGNORECASE)
+
+
+def parse_query(text: str) -> Tuple[str, Dict[str, str]]:
+    """'overdue object=Корпус А' -> ('overdue', {'object': 'Корпус А'}). Неизвестное слово — ValueError."""
+    filters: Dict[str, str] = {}
+    for key, value in _FILTER_RE.findall(text):
+        if key.lower() not in FILTERS:
+            raise ValueError(f"Неизвестный фильтр: {key}=")
+        filters[FILTERS[key.lower()]] = value.strip()
+    window = "recent"
+    for word in _FILTER_RE.sub(" ", text).split():
+        if word.lower() not in WINDOWS:
+            raise ValueError(f"Не понял «{word}»")
+        window = WINDOWS[word.lower()]
+    return window, filters
+
+
+def _is_done(t: Task) -> bool:
+    return (t.status or "").lower() in DONE_STATUSES
+
+
+class TaskIndex:
+    """Задачи зеркала в памяти + счётчики. Потокобезопасен: дельты приходят из фонового потока offline."""
+
+    def __init__(self, props_map: Optional[Dict[str, str]] = None):
+        self.props_map = props_map or P
+        self.tasks: Dict[str, Task] = {}
+        self.by_deadline: Dict[str, Set[str]] = {}  # 'YYYY-MM-DD' -> id задач
+        self.by_status: Counter = Counter()
+        self.by_object: Counter = Counter()
+        self.by_object_status: Counter = Counter()  # (объект, статус)
+        self.loaded = False
+        self.lock = threading.Lock()
+        self._cache: Dict[tuple, str] = {}
+        self._loading: Optional[List[dict]] = None  # дельты, пришедшие во время load()
+        self._load_lock = threading.Lock()
+
+    # ---- наполнение ----
+
+    def _add(self, t: Task) -> None:
+        self.tasks[t.id] = t
+        if t.deadline:
+            self.by_deadline.setdefault(t.deadline[:10], set()).add(t.id)
+        status, obj = t.status or "—", t.obj or "—"
+        self.by_status[status] += 1
+        self.by_object[obj] += 1
+        self.by_object_status[(obj, status)] += 1
+
+    def _remove(self, page_id: str) -> None:
+        t = self.tasks.pop(page_id, None)
+        if t is None:
+            return
+        if t.deadline:
+            ids = self.by_deadline.get(t.deadline[:10])
+            if ids is not None:
+                ids.discard(page_id)
+                if not ids:
+                    del self.by_deadline[t.deadline[:10]]
+        status, obj = t.status or "—", t.obj or "—"
+        for counter, key in ((self.by_status, status), (self.by_object, obj), (self.by_object_status, (obj, status))):
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+    def _apply(self, pages: List[dict]) -> None:
+        for page, t in zip(pages, iter_tasks(pages, self.props_map)):
+            self._remove(t.id)
+            if not (page.get("archived") or page.get("in_trash")):
+                self._add(t)
+        self._cache.clear()
+
+    def load(self, pages: Iterable[dict]) -> int:
+        """Весь файл зеркала. Дельты, пришедшие за время чтения, применяются поверх."""
+        with self.lock:
+            self._loading = []
+        fresh = TaskIndex(self.props_map)
+        fresh._apply(list(pages))
+        with self.lock:
+            for name in ("tasks", "by_deadline", "by_status", "by_object", "by_object_status"):
+                setattr(self, name, getattr(fresh, name))
+            pending, self._loading = self._loading or [], None
+            self._apply(pending)
+            self.loaded = True
+            return len(self.tasks)
+
+    def ensure_loaded(self, mirror) -> bool:
+        """Загрузить из зеркала один раз (одновременные вызовы ждут первый). False — зеркала ещё нет."""
+        with self._load_lock:
+            if not self.loaded and mirror.exists():
+                self.load(mirror.iter_pages())
+            return self.loaded
+
+    def feed(self, pages: List[dict]) -> None:
+        """Страницы дельты зеркала (или ответ Notion на правку) — вместо прежних версий."""
+        with self.lock:
+            if self._loading is not None:
+                self._loading.extend(pages)
+            elif self.loaded:
+                self._apply(pages)
+
+    # ---- выборки ----
+
+    def _select(self, window: str, filters: Dict[str, str], today: date) -> List[Task]:
+        if window == "recent":
+            ids: Iterable[str] = self.tasks
+        elif window == "overdue":
+            cut = today.isoformat()
+            ids = [i for d, s in self.by_deadline.items() if d < cut for i in s]
+        else:
+            start, days = {"today": (today, 1), "tomorrow": (today + timedelta(days=1), 1),
+                           "week": (today, 7)}[window]
+            ids = [i for n in range(days) for i in self.by_deadline.get((start + timedelta(days=n)).isoformat(), ())]
+        obj, status = filters.get("object", "").lower(), filters.get("status", "").lower()
+        out = []
+        for i in ids:
+            t = self.tasks[i]
+            if obj and (t.obj or "").lower() != obj:
+                continue
+            if status and (t.status or "").lower() != status:
+                continue
+            if window == "overdue" and _is_done(t):
+                continue
+            out.append(t)
+        return out
+
+    def _summary(self, filters: Dict[str, str]) -> str:
+        obj = filters.get("object", "").lower()
+        if obj:
+            counts = Counter({s: n for (o, s), n in self.by_object_status.items() if o.lower() == obj})
+        else:
+            counts = self.by_status
+        total = sum(counts.values())
+        parts = ", ".join(f"{s} {n}" for s, n in counts.most_common())
+        text = f"Всего задач: {total}" + (f" ({parts})" if parts else "")
+        if not obj and len(self.by_object) > 1:
+            text += "\nПо объектам: " + ", ".join(f"{o} {n}" for o, n in self.by_object.most_common(8))
+        return text
+
+    def render(self, query: str = "", limit: int = REPORT_LIMIT, today: Optional[date] = None) -> str:
+        """Текст ответа /report; один и тот же запрос до следующей дельты — из кэша."""
+        window, filters = parse_query(query)
+        today = today or date.today()
+        key = (window, tuple(sorted((k, v.lower()) for k, v in filters.items())), today, limit)
+        with self.lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                return hit
+            tasks = self._select(window, filters, today)
+            if window == "recent":
+                tasks = heapq.nlargest(limit, tasks, key=lambda t: t.edited or "")
+                more = 0
+            else:
+                more = max(len(tasks) - limit, 0)
+                tasks = heapq.nsmallest(limit, tasks, key=lambda t: (t.deadline or "", t.code or ""))
+            title = TITLES[window] + "".join(f" · {v}" for v in filters.values())
+            lines = [f"{title}:"]
+            for t in tasks:
+                lines.append(f"{t.code or '—'}: {t.name or ''} | {t.status or '—'} | {(t.deadline or '')[:10] or '—'}"
+                             + (f" | {t.obj}" if t.obj and "object" not in filters else ""))
+            if len(lines) == 1:
+                lines.append("нет задач")
+            if more:
+                lines.append(f"…и ещё {more}")
+            text = "\n".join(lines) + "\n\n" + self._summary(filters)
+            self._cache[key] = text
+            return text
+
+
+def main():
+    from notion_mirror import Mirror
+    mirror = Mirror(os.getenv("NOTION_DATABASE_ID", ""), {})
+    if not mirror.exists():
+        print("Зеркало базы задач не найдено — запусти бота или notion_mirror")
+        sys.exit(1)
+    index = TaskIndex()
+    index.ensure_loaded(mirror)
+    print(f"Задач в зеркале: {len(index.tasks)}\n")
+    try:
+        print(index.render(" ".join(sys.argv[1:])))
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Трассировка действий пользователя: Telegram → Cloudinary → Notion.
+
+Каждое действие (хендлер бота) — корневой спан трассы, этапы внутри — дочерние спаны.
+Поля спана совместимы с OpenTelemetry (trace_id 32 hex, span_id 16 hex, parent_span_id,
+start/end_time_unix_nano, attributes, status), одна строка JSONL на спан.
+Спаны трассы буферизуются и дописываются в файл одной записью при завершении действия.
+
+По умолчанию выключена: в спанах коды и статусы задач, а на объекте бот работает месяцами —
+включают на время разбора. Файл не растёт без предела: дойдя до TRACE_MAX_MB, он переименовывается
+в <TRACE_FILE>.1 (прежний .1 удаляется), и запись начинается заново.
+
+Настройки:
+    TRACE_FILE=traces.jsonl   куда писать (пусто, по умолчанию — трассировка выключена)
+    TRACE_SAMPLE=0.1          доля действий, которые пишем (1 — все)
+    TRACE_MAX_MB=20           размер файла, после которого он ротируется
+    TRACE_SERVICE=...         имя сервиса в resource (по умолчанию — имя скрипта)
+
+Использование:
+    @tracing.action("ph3_comment")            # корневой спан для async/sync функции
+    async def ph3_comment(update, context): ...
+
+    with tracing.span("cloudinary.upload") as sp:
+        res = cloudinary.uploader.upload(...)
+        sp.set("bytes", len(data))
+
+Сводка по файлу:
+    python tracing.py [traces.jsonl] [--root ph3_comment] [--slowest 10]
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import logging
+import argparse
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+log = logging.getLogger("tracing")
+
+load_dotenv()
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "0.1"))
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "20"))
+TRACE_SERVICE = os.getenv("TRACE_SERVICE") or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+_write_lock = threading.Lock()
+
+
+class Span:
+    """Один этап действия. Атрибуты — только простые значения (str/int/float/bool)."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "_Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+            "resource": {"service.name": TRACE_SERVICE},
+        }
+
+
+class _NoopSpan:
+    """Спан вне трассы или в не попавшем в выборку действии — ничего не пишет."""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "lock")
+
+    def __init__(self):
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()  # дочерние спаны могут закрываться из потоков (asyncio.to_thread)
+
+
+# текущий спан; _NOOP — действие не попало в выборку; None — вне действия
+_current: contextvars.ContextVar = contextvars.ContextVar("pf_span", default=None)
+
+
+def enabled() -> bool:
+    return bool(TRACE_FILE) and TRACE_SAMPLE > 0
+
+
+def current_trace_id() -> Optional[str]:
+    cur = _current.get()
+    return cur.trace.trace_id if isinstance(cur, Span) else None
+
+
+def _rotate() -> None:
+    """Под _write_lock: файл дорос до TRACE_MAX_MB — в .1 (прежний .1 пропадает)."""
+    try:
+        if TRACE_MAX_MB > 0 and os.path.getsize(TRACE_FILE) >= TRACE_MAX_MB * 1024 * 1024:
+            os.replace(TRACE_FILE, TRACE_FILE + ".1")
+    except FileNotFoundError:
+        pass
+
+
+def _export(trace: _Trace) -> None:
+    lines = "".join(json.dumps(s.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n" for s in trace.spans)
+    try:
+        with _write_lock:
+            _rotate()
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(lines)
+    except OSError as e:
+        log.warning("Не удалось записать трассу в %s: %s", TRACE_FILE, e)
+
+
+@contextmanager
+def _run(sp: Span, root: bool) -> Iterator[Span]:
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current.reset(token)
+        sp.end_ns = time.time_ns()
+        with sp.trace.lock:
+            sp.trace.spans.append(sp)
+        if root:
+            _export(sp.trace)
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Дочерний спан этапа. Вне действия (или если действие не в выборке) — без накладных расходов."""
+    parent = _current.get()
+    if not isinstance(parent, Span):
+        yield _NOOP
+        return
+    with _run(Span(parent.trace, name, parent.span_id, attributes), root=False) as sp:
+        yield sp
+
+
+@contextmanager
+def root(name: str, **attributes: Any):
+    """Корневой спан действия (с выборкой). Внутри уже идущего действия становится дочерним."""
+    parent = _current.get()
+    if isinstance(parent, Span):
+        with _run(Span(parent.trace, name, parent.span_id, attributes), root=False) as sp:
+            yield sp
+        return
+    if parent is _NOOP or not enabled() or random.random() >= TRACE_SAMPLE:
+        token = _current.set(_NOOP)
+        try:
+            yield _NOOP
+        finally:
+            _current.reset(token)
+        return
+    with _run(Span(_Trace(), name, None, attributes), root=True) as sp:
+        yield sp
+
+
+def _update_attrs(args: tuple) -> Dict[str, Any]:
+    """Для хендлеров Telegram: chat_id и user_id из первого аргумента (Update), если он есть."""
+    upd = args[0] if args else None
+    attrs: Dict[str, Any] = {}
+    chat = getattr(upd, "effective_chat", None)
+    user = getattr(upd, "effective_user", None)
+    if chat is not None:
+        attrs["telegram.chat_id"] = chat.id
+    if user is not None:
+        attrs["telegram.user_id"] = user.id
+    return attrs
+
+
+def action(name: str) -> Callable[[Callable], Callable]:
+    """Декоратор: функция (async или обычная) — отдельное действие с корневым спаном name."""
+    def deco(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with root(name, **_update_attrs(args)):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with root(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---- сводка по файлу ----
+
+def _pct(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга (values отсортированы)."""
+    if not values:
+        return 0.0
+    k = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+    return values[k]
+
+
+def load(path: str) -> List[dict]:
+    spans = []
+    with open(path, "rb") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                log.warning("%s:%s: битая строка пропущена", path, n)
+    return spans
+
+
+def summarize(spans: List[dict], root_name: Optional[str] = None, slowest: int = 0) -> str:
+    by_trace: Dict[str, List[dict]] = {}
+    for s in spans:
+        by_trace.setdefault(s["trace_id"], []).append(s)
+
+    roots = {tid: next((s for s in ss if not s.get("parent_span_id")), None) for tid, ss in by_trace.items()}
+    if root_name:
+        by_trace = {tid: ss for tid, ss in by_trace.items() if roots[tid] and roots[tid]["name"] == root_name}
+
+    # этап = "действие / спан": один и тот же notion.create_row из разных хендлеров считаем отдельно
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for tid, ss in by_trace.items():
+        r = roots[tid]
+        prefix = r["name"] if r else "?"
+        for s in ss:
+            key = prefix if s is r else f"{prefix} / {s['name']}"
+            stages.setdefault(key, []).append(s["duration_ms"])
+            if s.get("status", {}).get("code") == "ERROR":
+                errors[key] = errors.get(key, 0) + 1
+
+    lines = [f"Трасс: {len(by_trace)}, спанов: {sum(len(v) for v in stages.values())}",
+             f"{'этап':<52} {'n':>6} {'p50, мс':>9} {'p95, мс':>9} {'max, мс':>9} {'ошибок':>7}"]
+    for key in sorted(stages):
+        v = sorted(stages[key])
+        lines.append(f"{key[:52]:<52} {len(v):>6} {_pct(v, 0.5):>9.1f} {_pct(v, 0.95):>9.1f} "
+                     f"{v[-1]:>9.1f} {errors.get(key, 0):>7}")
+
+    if slowest:
+        ranked = sorted((r for tid, r in roots.items() if r and tid in by_trace),
+                        key=lambda r: r["duration_ms"], reverse=True)[:slowest]
+        lines.append("")
+        lines.append(f"Самые медленные действия ({len(ranked)}):")
+        for r in ranked:
+            lines.append(f"  {r['name']} {r['duration_ms']:.0f} мс  trace_id={r['trace_id']}")
+            children = sorted((s for s in by_trace[r["trace_id"]] if s is not r),
+                              key=lambda s: s["start_time_unix_nano"])
+            for s in children:
+                offset = (s["start_time_unix_nano"] - r["start_time_unix_nano"]) / 1e6
+                lines.append(f"      +{offset:>7.0f} мс  {s['name']:<34} {s['duration_ms']:>8.0f} мс")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="p50/p95 по этапам из файла трасс")
+    ap.add_argument("file", nargs="?", default=TRACE_FILE or "traces.jsonl")
+    ap.add_argument("--root", help="только действия с этим именем (например ph3_comment)")
+    ap.add_argument("--slowest", type=int, default=0, help="показать N самых медленных действий по этапам")
+    args = ap.parse_args()
+    if not os.path.exists(args.file):
+        print(f"Файл трасс не найден: {args.file}")
+        sys.exit(1)
+    print(summarize(load(args.file), args.root, args.slowest))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import requests
 import json
 from collections import defaultdict
 
+import onedrive_graph
+
 # Функция для чтения structure.txt и создания дерева
 def parse_structure(file_path):
     tree = defaultdict(dict)
@@ -20,25 +22,25 @@ def parse_structure(file_path):
         else:
             current_path = current_path[:level]
             current_path.append(name)
-        # Строим дерево
-        if level == 0:
-            tree[name] = {}
-        elif level == 1:
-            tree[current_path[0]][name] = {}
-        elif level == 2:
-            tree[current_path[0]][current_path[1]][name] = {}
-        # Можно добавить больше уровней
+        # Строим дерево (любая глубина)
+        node = tree
+        for part in current_path[:-1]:
+            node = node.setdefault(part, {})
+        node.setdefault(name, {})
     return tree
 
-# Функция для создания папок в OneDrive (используй Microsoft Graph API)
+# Функция для создания папок в OneDrive (Microsoft Graph: $batch по уровням, без дублей — см. onedrive_graph.py)
 def create_onedrive_folders(tree, root_folder_id, token):
-    url = "https://graph.microsoft.com/v1.0/me/drive/items/{id}/children".format(id=root_folder_id)
-    headers = {"Authorization": "Bearer {0}".format(token), "Content-Type": "application/json"}
-    for folder, sub in tree.items():
-        data = {"name": folder, "folder": {}, "@microsoft.graph.conflictBehavior": "rename"}
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        sub_id = response.json()["id"]
-        create_onedrive_folders(sub, sub_id, token)  # Рекурсия для подуровней
+    def paths(node, prefix=()):
+        for folder, sub in node.items():
+            yield prefix + (folder,)
+            yield from paths(sub, prefix + (folder,))
+
+    graph = onedrive_graph.GraphFolders(token, root_id=root_folder_id)
+    errors = graph.ensure(paths(tree))
+    for key, err in errors:
+        print(f"✗ {key}: {err}")
+    return graph.ids
 
 # Функция для зеркала в Notion (API)
 def create_notion_structure(tree, database_id, token):